@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'seat_booking.settings')
+# Route the read-heavy endpoints to their async views (see seats/urls.py)
+os.environ.setdefault('ASGI_MODE', 'True')
 
 application = get_asgi_application()
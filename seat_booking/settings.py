@@ -1,6 +1,7 @@
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -25,13 +26,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'seats.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
+    'seats.static.StaticFilesMiddleware',  # WhiteNoise, async capable for the ASGI server
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'seats.auth.TokenAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -56,6 +59,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'seat_booking.wsgi.application'
 
+# Set by seat_booking/asgi.py: serve the read-heavy endpoints with their async views
+ASGI_MODE = os.getenv('ASGI_MODE', 'False') == 'True'
+
 # Database Configuration
 # Support DATABASE_URL for production (Heroku, Railway, etc.)
 import dj_database_url
@@ -67,10 +73,13 @@ if DATABASE_URL:
     DATABASES = {
         'default': dj_database_url.config(
             default=DATABASE_URL,
-            conn_max_age=600,
+            conn_max_age=0 if ASGI_MODE else 600,
             conn_health_checks=True,
         )
     }
+    if ASGI_MODE and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+        # Every ASGI request has its own connection, so they are pooled instead of kept open
+        DATABASES['default'].setdefault('OPTIONS', {})['pool'] = True
 elif os.getenv('USE_MYSQL', 'False') == 'True':
     # MySQL configuration (if needed)
     DATABASES = {
@@ -92,6 +101,31 @@ else:
         }
     }
 
+# Cache Configuration
+# Serialized seat maps are cached here. Use a shared cache (Redis) when running
+# several worker processes so they all benefit from each other's work.
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# Seat transitions: 'pessimistic' locks the seat rows (SELECT ... FOR UPDATE) for the
+# whole transition; 'optimistic' reads them unlocked and applies the change as a
+# compare-and-swap on Seat.version, failing the batch if any seat moved meanwhile.
+SEAT_CONCURRENCY = os.getenv('SEAT_CONCURRENCY', 'pessimistic')
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'en-us'
@@ -118,6 +152,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # CORS Configuration
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only allow all origins in development
 CORS_ALLOW_CREDENTIALS = True
+# Queued clients retry seat requests with their waiting room token
+CORS_ALLOW_HEADERS = (*default_headers, 'x-queue-token')
 
 # Production Security Settings
 if not DEBUG:
@@ -1,8 +1,15 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils import timezone
 from django.utils.html import format_html
-from django.urls import path
+from django.urls import path, reverse
 from django.shortcuts import render
+from .catalog import day_range
 from .models import Seat, Movie, ShowTime, Screen
+from .occupancy import reconcile
+from .seatmap import get_seatmap
+
+OVERVIEW_PAGE_SIZE = 50
 
 @admin.register(Movie)
 class MovieAdmin(admin.ModelAdmin):
@@ -10,42 +17,120 @@ class MovieAdmin(admin.ModelAdmin):
 
 @admin.register(Screen)
 class ScreenAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description')
+    list_display = ('name', 'description', 'capacity')
 
 @admin.register(ShowTime)
 class ShowTimeAdmin(admin.ModelAdmin):
-    list_display = ('movie', 'screen', 'start_time', 'end_time', 'base_price')
-    list_filter = ('movie', 'screen', 'start_time')
+    list_display = ('movie', 'screen', 'start_time', 'end_time', 'base_price', 'single_writer', 'seat_map')
+    list_filter = ('movie', 'screen', 'start_time', 'single_writer')
+    list_select_related = ('movie', 'screen')
+
+    @admin.display(description='Seat map')
+    def seat_map(self, obj):
+        return format_html('<a href="{}?show={}">Open</a>', reverse('admin:theatre-map'), obj.pk)
+
+
+def _selected_date(request):
+    try:
+        return timezone.datetime.strptime(request.GET.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return timezone.localdate()
 
 
 @admin.register(Seat)
 class SeatAdmin(admin.ModelAdmin):
     list_display = ('show_time', 'row_id', 'number', 'status', 'held_by')
-    list_filter = ('show_time', 'status', 'row_id')
+    list_filter = ('status', 'row_id')
     search_fields = ('show_time__movie__title', 'row_id', 'held_by')
-    
+    list_select_related = ('show_time__movie',)
+    # Counting millions of seats on every changelist view is not worth it
+    show_full_result_count = False
+
     change_list_template = "admin/seats_changelist.html"
 
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
             path('map/', self.admin_site.admin_view(self.theatre_map), name='theatre-map'),
+            path('overview/', self.admin_site.admin_view(self.schedule_overview), name='theatre-overview'),
         ]
         return custom_urls + urls
 
+    # Edits here bypass the seat engine: each saved or deleted seat bumps its show's
+    # version and drops the cached map (seatmap.touch), and the shows touched are recounted
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        reconcile(ShowTime.objects.filter(pk=obj.show_time_id))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        reconcile(ShowTime.objects.filter(pk=obj.show_time_id))
+
+    def delete_queryset(self, request, queryset):
+        show_ids = set(queryset.values_list('show_time_id', flat=True))
+        super().delete_queryset(request, queryset)
+        reconcile(ShowTime.objects.filter(pk__in=show_ids))
+
     def theatre_map(self, request):
-        seats = Seat.objects.all().order_by('row_id', 'number')
-        
-        # Group seats by row for the grid
-        rows = {}
-        for seat in seats:
-            if seat.row_id not in rows:
-                rows[seat.row_id] = []
-            rows[seat.row_id].append(seat)
-            
+        # One show at a time: the shows of the chosen day to pick from, and the
+        # picked show's seats from the shared seat map (layout plus sparse rows)
+        date = _selected_date(request)
+        start, end = day_range(date)
+        shows = ShowTime.objects.filter(start_time__gte=start, start_time__lt=end).order_by('start_time').values(
+            'id', 'start_time', 'movie__title', 'screen__name')
+        show = None
+        show_id = request.GET.get('show')
+        if show_id and show_id.isdigit():
+            show = ShowTime.objects.filter(pk=show_id).values(
+                'id', 'start_time', 'seat_version', 'seats_available', 'seats_held', 'seats_booked',
+                'movie__title', 'screen__name').first()
+
+        rows, stats = [], None
+        if show:
+            now = timezone.now().timestamp()
+            seatmap = get_seatmap(show['id'], show['seat_version'])
+            rows = list(seatmap.grid(now))
+            stats = seatmap.live_stats(
+                {'available': show['seats_available'], 'held': show['seats_held'], 'booked': show['seats_booked']}, now)
+
         context = {
             **self.admin_site.each_context(request),
             'title': 'Theatre Seat Map',
+            'date': date,
+            'shows': shows,
+            'show': show,
             'rows': rows,
+            'stats': stats,
         }
         return render(request, 'admin/theatre_map.html', context)
+
+    def schedule_overview(self, request):
+        # Occupancy of a day's shows, one page at a time, straight from the
+        # per-show counters: no Seat row is read whatever the size of the schedule
+        date = _selected_date(request)
+        start, end = day_range(date)
+        shows = ShowTime.objects.filter(start_time__gte=start, start_time__lt=end).order_by('start_time', 'id')
+        page = Paginator(shows.values(
+            'id', 'start_time', 'movie__title', 'screen__name', 'seats_available', 'seats_held', 'seats_booked',
+        ), OVERVIEW_PAGE_SIZE).get_page(request.GET.get('page'))
+
+        overview = []
+        for show in page:
+            capacity = show['seats_available'] + show['seats_held'] + show['seats_booked']
+            overview.append({
+                **show,
+                'capacity': capacity,
+                'booked': show['seats_booked'],
+                'held': show['seats_held'],
+                'available': show['seats_available'],
+                'occupancy': round(100 * show['seats_booked'] / capacity) if capacity else 0,
+            })
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Schedule Overview',
+            'date': date,
+            'page': page,
+            'overview': overview,
+        }
+        return render(request, 'admin/schedule_overview.html', context)
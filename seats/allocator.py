@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.utils import timezone
+
+from . import writer
+from .engine import SeatConflict, try_hold_block
+from .models import ShowTime
+from .seatmap import get_seatmap
+
+MAX_PARTY_SIZE = getattr(settings, 'BEST_AVAILABLE_MAX_PARTY', 10)
+# Seat map snapshots, and blocks per snapshot, tried before reporting a sell-out
+MAX_ROUNDS = 3
+BLOCKS_PER_ROUND = 4
+# Most wanted row as a fraction of the depth of the room (0 is the front row)
+PREFERRED_ROW = 0.6
+
+
+def _placement(first, last, size, centre):
+    # The placement of `size` seats inside [first, last] whose middle is closest to `centre`
+    if last - first + 1 < size:
+        return None
+    start = round(centre - (size - 1) / 2)
+    return min(max(start, first), last - size + 1)
+
+
+def candidate_blocks(seatmap, size, now, exclude=()):
+    """Best first list of (row_id, first_number) for `size` adjacent free seats.
+
+    Each free run contributes its placement nearest the middle of the row; rows
+    are ranked by distance of their front-to-back position from PREFERRED_ROW,
+    then by distance from the middle. Seats in `exclude` are treated as taken;
+    `now` is a UNIX timestamp.
+    """
+    rows = seatmap.rows
+    if not rows:
+        return []
+    preferred = (len(rows) - 1) * PREFERRED_ROW
+    index = {row_id: r for r, row_id in enumerate(rows)}
+    rank = seatmap.row_rank
+    scored = []
+    for row_id, first, last in seatmap.free_runs(now):
+        r = index[row_id]
+        lo = seatmap.numbers[seatmap.row_starts[r]]
+        hi = seatmap.numbers[seatmap.row_starts[r + 1] - 1]
+        centre = (lo + hi) / 2
+        # Split the run around seats already given up on in an earlier round
+        bounds = [first]
+        for number in range(first, last + 1):
+            if (row_id, number) in exclude:
+                bounds += [number - 1, number + 1]
+        bounds.append(last)
+        for run_first, run_last in zip(bounds[::2], bounds[1::2]):
+            start = _placement(run_first, run_last, size, centre)
+            if start is None:
+                continue
+            offset = abs(start + (size - 1) / 2 - centre)
+            scored.append(((abs(rank[r] - preferred), offset, rank[r], start), row_id, start))
+    scored.sort()
+    return [(row_id, start) for _, row_id, start in scored]
+
+
+def _claim(show_id, keys, username, now):
+    if writer.is_hot(show_id):
+        # Single-writer shows only change through their writer, which never waits on row locks either
+        try:
+            return writer.hold_seats(show_id, [{'row': row, 'number': number} for row, number in keys], username)
+        except SeatConflict:
+            return None
+    return try_hold_block(show_id, keys, username, now)
+
+
+def hold_best_available(show_id, size, username, now=None):
+    """Hold the best block of `size` adjacent free seats for `username`.
+
+    Blocks are picked from the in-memory seat map and claimed without waiting on
+    rows locked by other requests; a block lost to a concurrent request is
+    skipped for the next best one. Returns (seats, expires_at) or raises
+    SeatConflict once no block is left or the attempts are used up.
+    """
+    if not 1 <= size <= MAX_PARTY_SIZE:
+        raise ValueError(f'count must be between 1 and {MAX_PARTY_SIZE}')
+    now = now or timezone.now()
+    tried = set()
+    for _ in range(MAX_ROUNDS):
+        version = ShowTime.objects.values_list('seat_version', flat=True).get(pk=show_id)
+        blocks = candidate_blocks(get_seatmap(show_id, version), size, now.timestamp(), tried)
+        if not blocks:
+            break
+        for row_id, first in blocks[:BLOCKS_PER_ROUND]:
+            keys = [(row_id, number) for number in range(first, first + size)]
+            held = _claim(show_id, keys, username, now)
+            if held:
+                return held
+            tried.update(keys)
+    raise SeatConflict(f'No block of {size} adjacent seats is available', [])
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SeatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'seats'
+
+    def ready(self):
+        from . import auth, catalog, engine, occupancy, seatmap, writer  # noqa: F401  (registers signal receivers)
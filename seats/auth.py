@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+SALT = 'seats.api-token'
+TOKEN_MAX_AGE = getattr(settings, 'API_TOKEN_MAX_AGE', 7 * 24 * 3600)
+# Users resolved from tokens are kept this long, so password changes and
+# deactivations take effect within this delay in every process.
+USER_CACHE_TTL = getattr(settings, 'API_TOKEN_USER_CACHE_TTL', 60)
+USER_CACHE_SIZE = 10000
+
+_users = OrderedDict()
+_lock = threading.Lock()
+
+
+def issue_token(user):
+    """Signed token naming the user. It also carries the session auth hash, so
+    changing the password revokes every token issued before."""
+    return signing.dumps({'u': user.pk, 'h': user.get_session_auth_hash()}, salt=SALT, compress=True)
+
+
+def _fresh_user(user_id, now):
+    # (user,) from the cache, or None on a miss; the user itself may be None
+    with _lock:
+        entry = _users.get(user_id)
+        if entry is not None and now - entry[1] < USER_CACHE_TTL:
+            _users.move_to_end(user_id)
+            return entry[:1]
+    return None
+
+
+def _cached_user(user_id):
+    now = time.monotonic()
+    hit = _fresh_user(user_id, now)
+    if hit is not None:
+        return hit[0]
+    user = get_user_model().objects.filter(pk=user_id).first()
+    with _lock:
+        _users[user_id] = (user, now)
+        _users.move_to_end(user_id)
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+    return user
+
+
+def _token_payload(token):
+    try:
+        return signing.loads(token, salt=SALT, max_age=TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+def _valid_user(user, payload):
+    if user is None or not user.is_active or user.get_session_auth_hash() != payload['h']:
+        return None
+    return user
+
+
+def user_for_token(token):
+    """The active user a token belongs to, or None. No query while the user is cached."""
+    payload = _token_payload(token)
+    if payload is None:
+        return None
+    return _valid_user(_cached_user(payload['u']), payload)
+
+
+async def auser_for_token(token):
+    # Only a cache miss leaves the event loop
+    payload = _token_payload(token)
+    if payload is None:
+        return None
+    hit = _fresh_user(payload['u'], time.monotonic())
+    user = hit[0] if hit is not None else await sync_to_async(_cached_user)(payload['u'])
+    return _valid_user(user, payload)
+
+
+def forget_users():
+    with _lock:
+        _users.clear()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    with _lock:
+        _users.pop(instance.pk, None)
+
+
+class TokenAuthenticationMiddleware:
+    """Authenticate `Authorization: Bearer <token>` requests without the session.
+
+    Goes after AuthenticationMiddleware and replaces its lazy request.user (and
+    request.auser for async views), so neither the session nor the user table is
+    read for token requests. Requests without the header keep using the session.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.token(request)
+        if token is not None:
+            user = user_for_token(token)
+            if user is None:
+                return self.rejected()
+            self.authenticate(request, user)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        token = self.token(request)
+        if token is not None:
+            user = await auser_for_token(token)
+            if user is None:
+                return self.rejected()
+            self.authenticate(request, user)
+        return await self.get_response(request)
+
+    @staticmethod
+    def token(request):
+        header = request.headers.get('Authorization', '')
+        if header.startswith('Bearer '):
+            return header[len('Bearer '):].strip()
+        return None
+
+    @staticmethod
+    def rejected():
+        return JsonResponse({'error': 'Invalid or expired token'}, status=401)
+
+    @staticmethod
+    def authenticate(request, user):
+        async def auser():
+            return user
+
+        request.user = user
+        request.auser = auser
+        # Token requests come from API clients, not from a browser session
+        request._dont_enforce_csrf_checks = True
@@ -0,0 +1,236 @@
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .models import MAX_LAYOUT_ROWS, Movie, Screen, ShowTime, layout_row_names
+
+ENDPOINTS = ('seat_list', 'list_shows', 'hold_batch', 'book_batch', 'release_hold_batch', 'my_bookings')
+PROFILES = ('same-seat', 'same-show', 'spread')
+
+API = '/api/seats'
+USER_PREFIX = 'bench_user_'
+PASSWORD = 'bench-password'
+SEATS_PER_ROW = 20
+# The bench screen has one row per SEATS_PER_ROW seats a run needs
+MAX_SEATS = MAX_LAYOUT_ROWS * SEATS_PER_ROW
+
+
+def seats_needed(workers, iterations):
+    """Seats of a show one run may use: a fresh one per request (same-show profile)."""
+    return workers * iterations * len(ENDPOINTS)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def summarize(samples, wall_time):
+    """Latency/throughput summary of (seconds, status, queries) samples."""
+    latencies = sorted(s[0] * 1000 for s in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    queries = [s[2] for s in samples if s[2] is not None]
+    return {
+        'requests': len(samples),
+        'status': statuses,
+        'errors': sum(1 for _, status, _ in samples if status >= 500),
+        'throughput_rps': round(len(samples) / wall_time, 1) if wall_time else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3) if latencies else None,
+            'p95': round(percentile(latencies, 95), 3) if latencies else None,
+            'p99': round(percentile(latencies, 99), 3) if latencies else None,
+            'max': round(latencies[-1], 3) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        },
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+class InProcessClient:
+    """Drives the app through the test client; counts the queries of every request."""
+
+    def __init__(self, username):
+        self.client = Client()
+        self.client.force_login(User.objects.get(username=username))
+
+    def request(self, method, path, body=None):
+        with CaptureQueriesContext(connection) as ctx:
+            if method == 'GET':
+                response = self.client.get(path)
+            else:
+                response = self.client.post(path, data=json.dumps(body), content_type='application/json')
+        return response.status_code, len(ctx)
+
+
+class HttpClient:
+    """Drives a running server over HTTP. Query counts are not observable from outside."""
+
+    def __init__(self, base_url, username):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+        response = self.session.post(f'{self.base_url}{API}/login/',
+                                     json={'username': username, 'password': PASSWORD})
+        response.raise_for_status()
+
+    def request(self, method, path, body=None):
+        if method == 'GET':
+            response = self.session.get(f'{self.base_url}{path}')
+        else:
+            response = self.session.post(f'{self.base_url}{path}', json=body)
+        return response.status_code, None
+
+
+class Fixture:
+    """Dedicated users, screen and shows, sized so no run ever runs out of seats."""
+
+    def __init__(self, workers, iterations, shows):
+        self.workers = workers
+        self.iterations = iterations
+        self.show_count = shows
+        self.usernames = [f'{USER_PREFIX}{i}' for i in range(workers)]
+        self.show_ids = []
+        self.rows = []
+
+    def prepare(self):
+        self.cleanup()
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([User(username=name, password=password) for name in self.usernames])
+        rows = max(1, math.ceil(seats_needed(self.workers, self.iterations) / SEATS_PER_ROW))
+        self.rows = layout_row_names(rows)
+        screen = Screen.objects.create(
+            name='Bench Screen', layout=[{'row': row, 'seats': SEATS_PER_ROW} for row in self.rows]
+        )
+        movie = Movie.objects.create(title='Bench Movie', duration_mins=120)
+        start = timezone.now() + timedelta(days=1)
+        self.show_ids = [
+            ShowTime.objects.create(movie=movie, screen=screen, start_time=start + timedelta(hours=3 * i),
+                                    end_time=start + timedelta(hours=3 * i + 2)).id
+            for i in range(self.show_count)
+        ]
+
+    def cleanup(self):
+        ShowTime.objects.filter(screen__name='Bench Screen').delete()
+        Screen.objects.filter(name='Bench Screen').delete()
+        Movie.objects.filter(title='Bench Movie').delete()
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+    def seat(self, slot):
+        row, number = divmod(slot, SEATS_PER_ROW)
+        return {'row': self.rows[row], 'number': number + 1}
+
+
+def target(fixture, profile, run, worker, iteration):
+    """(show_id, seat) a request touches under a contention profile."""
+    if profile == 'same-seat':
+        return fixture.show_ids[0], fixture.seat(0)
+    # A slot never used by another worker, iteration or earlier endpoint run
+    slot = (run * fixture.iterations + iteration) * fixture.workers + worker
+    if profile == 'same-show':
+        return fixture.show_ids[0], fixture.seat(slot)
+    return fixture.show_ids[slot % len(fixture.show_ids)], fixture.seat(slot)
+
+
+def requests_for(endpoint, show_id, seat):
+    """(setup requests, measured request); setup requests are not timed."""
+    batch = {'show_id': show_id, 'seats': [seat]}
+    hold = ('POST', f'{API}/hold-batch/', batch)
+    if endpoint == 'seat_list':
+        return [], ('GET', f'{API}/?show_id={show_id}', None)
+    if endpoint == 'list_shows':
+        return [], ('GET', f'{API}/shows/', None)
+    if endpoint == 'hold_batch':
+        return [], hold
+    if endpoint == 'book_batch':
+        return [hold], ('POST', f'{API}/book-batch/', batch)
+    if endpoint == 'release_hold_batch':
+        return [hold], ('POST', f'{API}/release-hold-batch/', batch)
+    if endpoint == 'my_bookings':
+        return [], ('GET', f'{API}/my-bookings/', None)
+    raise ValueError(f'Unknown endpoint {endpoint!r}')
+
+
+def run_endpoint(endpoint, run, clients, fixture, profile):
+    samples = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(clients))
+
+    def work(worker):
+        client = clients[worker]
+        own = []
+        if len(clients) > 1:
+            barrier.wait()
+        for iteration in range(fixture.iterations):
+            show_id, seat = target(fixture, profile, run, worker, iteration)
+            setup, (method, path, body) = requests_for(endpoint, show_id, seat)
+            for request in setup:
+                client.request(*request)
+            started = time.perf_counter()
+            status, queries = client.request(method, path, body)
+            own.append((time.perf_counter() - started, status, queries))
+        with lock:
+            samples.extend(own)
+
+    started = time.perf_counter()
+    if len(clients) == 1:
+        work(0)
+    else:
+        with ThreadPoolExecutor(len(clients)) as pool:
+            list(pool.map(_closing(work), range(len(clients))))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def _closing(work):
+    # Worker threads open their own database connection; do not leak it
+    def wrapped(worker):
+        try:
+            return work(worker)
+        finally:
+            connection.close()
+    return wrapped
+
+
+def run(endpoints=ENDPOINTS, profile='same-show', workers=4, iterations=50, shows=4, base_url=None):
+    """Run every endpoint under one contention profile and return a JSON-serializable report."""
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown profile {profile!r}')
+    started_at = timezone.now()
+    fixture = Fixture(workers, iterations, shows)
+    fixture.prepare()
+    try:
+        if base_url:
+            clients = [HttpClient(base_url, name) for name in fixture.usernames]
+        else:
+            clients = [InProcessClient(name) for name in fixture.usernames]
+        results = {}
+        for run_index, endpoint in enumerate(ENDPOINTS):
+            if endpoint in endpoints:
+                results[endpoint] = run_endpoint(endpoint, run_index, clients, fixture, profile)
+    finally:
+        fixture.cleanup()
+    return {
+        'started_at': started_at.isoformat(),
+        'mode': 'http' if base_url else 'in-process',
+        'base_url': base_url,
+        'database': connection.vendor,
+        'profile': profile,
+        'workers': workers,
+        'iterations': iterations,
+        'shows': shows,
+        'endpoints': results,
+    }
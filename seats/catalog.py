@@ -0,0 +1,109 @@
+from datetime import datetime, time, timedelta
+from time import time_ns
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Movie, Screen, ShowTime
+
+# Upper bound on how stale a listing can be in a worker that did not see the
+# change (only matters with a per-process cache; Redis is invalidated directly).
+CATALOG_TIMEOUT = getattr(settings, 'SHOW_CATALOG_TIMEOUT', 60)
+GENERATION_KEY = 'shows:generation'
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def day_range(date):
+    """[start, end) of a calendar day in the current time zone, usable by an index on start_time."""
+    start = timezone.make_aware(datetime.combine(date, time.min))
+    return start, start + timedelta(days=1)
+
+
+def build_listing(date=None, now=None):
+    """Return [(end_time, show_dict), ...] for upcoming shows, optionally on one day."""
+    now = now or timezone.now()
+    shows = ShowTime.objects.filter(end_time__gt=now)
+    if date is not None:
+        start, end = day_range(date)
+        shows = shows.filter(start_time__gte=start, start_time__lt=end)
+    rows = shows.order_by('start_time').values(
+        'id', 'movie_id', 'movie__title', 'movie__poster', 'screen__name',
+        'start_time', 'end_time', 'base_price',
+    )
+
+    storage = Movie._meta.get_field('poster').storage
+    poster_urls = {}
+    listing = []
+    for row in rows:
+        movie_id = row['movie_id']
+        if movie_id not in poster_urls:
+            poster_urls[movie_id] = storage.url(row['movie__poster']) if row['movie__poster'] else None
+        listing.append((row['end_time'], {
+            'id': row['id'],
+            'movie': row['movie__title'],
+            'screen': row['screen__name'],
+            'start_time': row['start_time'].isoformat(),
+            'end_time': row['end_time'].isoformat(),
+            'price': str(row['base_price']),
+            'poster_url': poster_urls[movie_id],
+        }))
+    return listing
+
+
+def get_shows(date=None):
+    """Upcoming shows as API dicts, served from the cache until the catalog changes."""
+    now = timezone.now()
+    key = _listing_key(_generation(), date)
+    listing = cache.get(key)
+    if listing is None:
+        listing = build_listing(date, now)
+        cache.set(key, listing, CATALOG_TIMEOUT)
+    return _upcoming(listing, now)
+
+
+async def aget_shows(date=None):
+    now = timezone.now()
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        generation = await sync_to_async(_generation)()
+    key = _listing_key(generation, date)
+    listing = await cache.aget(key)
+    if listing is None:
+        listing = await sync_to_async(build_listing)(date, now)
+        await cache.aset(key, listing, CATALOG_TIMEOUT)
+    return _upcoming(listing, now)
+
+
+def _listing_key(generation, date):
+    return f"shows:{generation}:{date.isoformat() if date else 'all'}"
+
+
+def _upcoming(listing, now):
+    # Shows that ended since the listing was built drop out without a rebuild
+    return [show for end_time, show in listing if end_time > now]
+
+
+def invalidate():
+    # A fresh, never reused generation orphans every cached listing at once
+    cache.set(GENERATION_KEY, time_ns(), None)
+
+
+@receiver(post_save, sender=ShowTime)
+@receiver(post_delete, sender=ShowTime)
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+@receiver(post_save, sender=Screen)
+@receiver(post_delete, sender=Screen)
+def catalog_changed(sender, **kwargs):
+    invalidate()
@@ -0,0 +1,93 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import SeatChange
+
+CHANGE_FIELDS = ('version', 'row_id', 'number', 'status', 'kind', 'hold_expires_at')
+
+KINDS = {'HELD': 'held', 'AVAILABLE': 'released', 'BOOKED': 'booked'}
+
+
+def record(show_id, version, seats, status, hold_expires_at=None, kind=None):
+    """Append one log row per seat for the transition that produced `version`."""
+    kind = kind or KINDS[status]
+    SeatChange.objects.bulk_create([
+        SeatChange(
+            show_time_id=show_id,
+            version=version,
+            row_id=seat['row_id'] if isinstance(seat, dict) else seat.row_id,
+            number=seat['number'] if isinstance(seat, dict) else seat.number,
+            status=status,
+            kind=kind,
+            hold_expires_at=hold_expires_at,
+        )
+        for seat in seats
+    ])
+
+
+def _contiguous(changes, since, version):
+    # Every transition writes at least one row. A missing version means the log was
+    # compacted past it, or the seats changed outside a transition (seatmap.touch),
+    # and the caller needs a snapshot.
+    if len({change['version'] for change in changes}) != version - since:
+        return None
+    return changes
+
+
+def changes_since(show_id, since, version):
+    """Log rows after `since` up to `version`, oldest first, or None if they are no longer all kept."""
+    if since == version:
+        return []
+    if since > version:
+        return None
+    changes = list(
+        SeatChange.objects.filter(show_time_id=show_id, version__gt=since, version__lte=version)
+        .order_by('version', 'id')
+        .values(*CHANGE_FIELDS)
+    )
+    return _contiguous(changes, since, version)
+
+
+async def achanges_since(show_id, since, version):
+    if since == version:
+        return []
+    if since > version:
+        return None
+    changes = [
+        change async for change in
+        SeatChange.objects.filter(show_time_id=show_id, version__gt=since, version__lte=version)
+        .order_by('version', 'id')
+        .values(*CHANGE_FIELDS)
+    ]
+    return _contiguous(changes, since, version)
+
+
+def latest_per_seat(changes):
+    """Collapse a run of log rows to the final state of each seat, in seat order."""
+    latest = {}
+    for change in changes:
+        latest[(change['row_id'], change['number'])] = change
+    return [latest[key] for key in sorted(latest)]
+
+
+def group_by_version(changes):
+    """Yield (version, kind, status, hold_expires_at, seats) for each transition in the log rows."""
+    current = None
+    for change in changes:
+        if current is None or current[0] != change['version']:
+            if current is not None:
+                yield current
+            current = (change['version'], change['kind'], change['status'], change['hold_expires_at'], [])
+        current[4].append(change)
+    if current is not None:
+        yield current
+
+
+def compact(keep_versions, now=None):
+    """Drop log rows older than the last `keep_versions` versions of each show, and all rows of ended shows."""
+    now = now or timezone.now()
+    ended, _ = SeatChange.objects.filter(show_time__end_time__lt=now).delete()
+    trimmed, _ = SeatChange.objects.filter(
+        version__lte=F('show_time__seat_version') - keep_versions
+    ).delete()
+    return ended + trimmed
@@ -0,0 +1,398 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Seat, ShowTime, layout_rows
+from . import changelog, events, occupancy, seatmap
+
+HOLD_DURATION = timedelta(minutes=10)
+
+SEAT_FIELDS = ('id', 'row_id', 'number', 'status', 'held_by', 'hold_expires_at', 'version')
+
+
+class SeatConflict(Exception):
+    """Raised when a batch cannot be applied. `conflicts` lists every offending seat label."""
+
+    def __init__(self, message, conflicts):
+        super().__init__(message)
+        self.conflicts = conflicts
+
+
+def optimistic():
+    return getattr(settings, 'SEAT_CONCURRENCY', 'pessimistic') == 'optimistic'
+
+
+def seat_label(key):
+    return f"{key[0]}{key[1]}"
+
+
+def normalize_seats(seats_data):
+    # Turn [{'row': 'A', 'number': 1}, ...] into ordered, de-duplicated (row, number) keys
+    keys = []
+    for item in seats_data:
+        row = item.get('row')
+        number = item.get('number')
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            pass
+        key = (row, number)
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def seats_q(keys):
+    # One predicate per row instead of one per seat keeps the statement small for group bookings
+    by_row = {}
+    for row, number in keys:
+        by_row.setdefault(row, []).append(number)
+    q = Q()
+    for row, numbers in by_row.items():
+        q |= Q(row_id=row, number__in=numbers)
+    return q
+
+
+def show_layout(show_id):
+    """{row_id: seat count} of the screen a show plays on ({} for an unknown show)."""
+    layouts = list(ShowTime.objects.filter(pk=show_id).values_list('screen__layout', flat=True)[:1])
+    return layout_rows(layouts[0]) if layouts else {}
+
+
+def in_layout(rows, key):
+    row, number = key
+    return isinstance(number, int) and 1 <= number <= rows.get(row, 0)
+
+
+def materialize(show_id, keys):
+    """Make sure the layout seats among `keys` have Seat rows, in one INSERT.
+
+    Untouched layout seats have no row until somebody holds them. Keys outside
+    the layout are skipped and later reported as not found.
+
+    Seats are inserted in (row, number) order. An INSERT ... ON CONFLICT DO
+    NOTHING waits for another transaction's uncommitted insert of the same key,
+    so two overlapping batches inserting in request order could deadlock here
+    before lock_seats() gets to lock anything.
+    """
+    show = ShowTime.objects.filter(pk=show_id).values_list('screen__layout', 'start_time').first()
+    if show is None:
+        return
+    rows = layout_rows(show[0])
+    seats = [
+        Seat(show_time_id=show_id, row_id=key[0], number=key[1], show_start_time=show[1])
+        for key in sorted(key for key in keys if in_layout(rows, key))
+    ]
+    if seats:
+        # Concurrent holds may create the same seats; the unique constraint keeps one of each
+        Seat.objects.bulk_create(seats, ignore_conflicts=True)
+
+
+def lock_seats(show_id, keys):
+    """Lock and fetch every requested seat of a show in a single statement.
+
+    Rows are locked in primary key order so that two overlapping batches can
+    never deadlock on each other. In optimistic mode they are read without a
+    lock and the later update checks their version instead. Layout seats that
+    have no row yet are returned as AVAILABLE with a None id.
+    """
+    if not keys:
+        return {}
+    seats = Seat.objects.all() if optimistic() else Seat.objects.select_for_update()
+    rows = (
+        seats
+        .filter(show_time_id=show_id)
+        .filter(seats_q(keys))
+        .order_by('id')
+        .values(*SEAT_FIELDS)
+    )
+    found = {(r['row_id'], r['number']): r for r in rows}
+    missing = [key for key in keys if key not in found]
+    if missing:
+        layout = show_layout(show_id)
+        for key in missing:
+            if in_layout(layout, key):
+                found[key] = {
+                    'id': None, 'row_id': key[0], 'number': key[1],
+                    'status': 'AVAILABLE', 'held_by': None, 'hold_expires_at': None, 'version': 0,
+                }
+    return found
+
+
+def _raise_first(show_id, keys, found, check):
+    # Walk the request in order so the error message matches the old per-seat loop,
+    # but collect every failing seat so the client knows exactly what to re-pick.
+    first_error = None
+    conflicts = []
+    for key in keys:
+        seat = found.get(key)
+        if seat is None:
+            error = f"Seat {seat_label(key)} not found for show {show_id}"
+        else:
+            error = check(key, seat)
+        if error:
+            conflicts.append(seat_label(key))
+            first_error = first_error or error
+    if first_error:
+        raise SeatConflict(first_error, conflicts)
+
+
+def holdable_q(username, now):
+    return (
+        Q(status='AVAILABLE')
+        | Q(status='HELD', hold_expires_at__lt=now)
+        | Q(status='HELD', held_by=username)
+    )
+
+
+def _is_holdable(seat, username, now):
+    if seat['status'] == 'AVAILABLE':
+        return True
+    if seat['status'] != 'HELD':
+        return False
+    expired = seat['hold_expires_at'] and seat['hold_expires_at'] < now
+    return bool(expired) or seat['held_by'] == username
+
+
+def unchanged_q(seats):
+    """Target the given seat rows, and in optimistic mode only while they are still
+    at the version that was read (compare-and-swap)."""
+    if not optimistic():
+        return Q(id__in=[s['id'] for s in seats])
+    q = Q()
+    for seat in seats:
+        q |= Q(id=seat['id'], version=seat['version'])
+    return q
+
+
+def _unapplied(ids, **state):
+    # Only reached when the conditional update lost a race the locks did not prevent
+    # (e.g. backends without SELECT ... FOR UPDATE); find out which seats were missed.
+    applied = set(Seat.objects.filter(id__in=ids, **state).values_list('id', flat=True))
+    return [i for i in ids if i not in applied]
+
+
+def record_transition(show_id, seats, status, hold_expires_at=None, reason=None, previous=None):
+    """Bump the show's seat version and occupancy counters, append to the change log
+    and publish the change once the transaction commits.
+
+    Must be called inside the transaction that changed `seats` (rows or dicts with
+    row_id and number). `previous` lists the statuses the seats had before; it
+    defaults to their `status`, for seats read before the update. `reason`
+    overrides the event type pushed to seat streams (e.g. 'expired' instead of
+    'released'). Returns the new version.
+    """
+    seats = list(seats)
+    if previous is None:
+        previous = [s['status'] if isinstance(s, dict) else s.status for s in seats]
+    ShowTime.objects.filter(pk=show_id).update(
+        seat_version=F('seat_version') + 1, **occupancy.deltas(previous, status)
+    )
+    version = ShowTime.objects.values_list('seat_version', flat=True).get(pk=show_id)
+    changelog.record(show_id, version, seats, status, hold_expires_at, reason)
+
+    def publish():
+        seatmap.invalidate_payload(show_id)
+        seatmap.apply_change(show_id, version, seats, status, hold_expires_at)
+        events.publish(show_id, events.make_event(version, seats, status, reason))
+
+    transaction.on_commit(publish)
+    return version
+
+
+@transaction.atomic
+def hold_seats(show_id, seats_data, username, now=None):
+    """Hold every requested seat for `username`, or none of them.
+
+    Returns the locked seat rows and the shared expiry timestamp.
+    """
+    now = now or timezone.now()
+    keys = normalize_seats(seats_data)
+    materialize(show_id, keys)
+    found = lock_seats(show_id, keys)
+
+    def check(key, seat):
+        if not _is_holdable(seat, username, now):
+            return f"Seat {seat_label(key)} is already taken by someone else"
+
+    _raise_first(show_id, keys, found, check)
+
+    expires_at = now + HOLD_DURATION
+    seats = [found[key] for key in keys]
+    ids = [s['id'] for s in seats]
+    updated = Seat.objects.filter(unchanged_q(seats)).filter(holdable_q(username, now)).update(
+        status='HELD', held_by=username, hold_expires_at=expires_at, version=F('version') + 1
+    )
+    if updated != len(ids):
+        # The atomic block rolls back the seats that did get updated
+        missed = _unapplied(ids, status='HELD', held_by=username, hold_expires_at=expires_at)
+        labels = [seat_label((s['row_id'], s['number'])) for s in seats if s['id'] in missed]
+        raise SeatConflict(f"Seat {labels[0]} is already taken by someone else", labels)
+    record_transition(show_id, seats, 'HELD', expires_at)
+    return seats, expires_at
+
+
+def try_hold_block(show_id, keys, username, now=None):
+    """Hold all of `keys` for `username` if none of them is locked or taken, else nothing.
+
+    Rows locked by a concurrent transaction are skipped instead of waited on, so a
+    busy block is given up immediately. Returns the held seats and expiry, or None.
+    Must not run inside another transaction: the locks of a rejected block have to
+    go away with it, and the block's new rows have to be committed before the claim.
+    """
+    now = now or timezone.now()
+    # Layout seats get their rows in a short transaction of their own, so the claim
+    # below only meets row locks, which it skips, and never waits on an INSERT
+    missing = set(keys) - set(
+        Seat.objects.filter(show_time_id=show_id).filter(seats_q(keys)).values_list('row_id', 'number'))
+    if missing:
+        with transaction.atomic():
+            materialize(show_id, missing)
+    with transaction.atomic():
+        return _claim_block(show_id, keys, username, now)
+
+
+def _claim_block(show_id, keys, username, now):
+    seats = Seat.objects.all() if optimistic() else Seat.objects.select_for_update(skip_locked=True)
+    rows = list(
+        seats
+        .filter(show_time_id=show_id)
+        .filter(seats_q(keys))
+        .order_by('id')
+        .values(*SEAT_FIELDS)
+    )
+    if len(rows) != len(keys) or not all(_is_holdable(seat, username, now) for seat in rows):
+        return None
+    expires_at = now + HOLD_DURATION
+    ids = [s['id'] for s in rows]
+    updated = Seat.objects.filter(unchanged_q(rows)).filter(holdable_q(username, now)).update(
+        status='HELD', held_by=username, hold_expires_at=expires_at, version=F('version') + 1
+    )
+    if updated != len(ids):
+        transaction.set_rollback(True)
+        return None
+    seats = sorted(rows, key=lambda s: (s['row_id'], s['number']))
+    record_transition(show_id, seats, 'HELD', expires_at)
+    return seats, expires_at
+
+
+@transaction.atomic
+def book_seats(show_id, seats_data, username, now=None):
+    """Turn the caller's live holds into bookings, all-or-nothing.
+
+    Returns the booked seat rows (each with its `price`) and the total price.
+    """
+    now = now or timezone.now()
+    keys = normalize_seats(seats_data)
+    found = lock_seats(show_id, keys)
+
+    def check(key, seat):
+        if seat['status'] != 'HELD' or seat['held_by'] != username:
+            return f"Seat {seat_label(key)} is not held by you"
+        if seat['hold_expires_at'] and seat['hold_expires_at'] < now:
+            return f"Hold for seat {seat_label(key)} has expired"
+
+    _raise_first(show_id, keys, found, check)
+
+    seats = [found[key] for key in keys]
+    ids = [s['id'] for s in seats]
+    updated = (
+        Seat.objects.filter(unchanged_q(seats)).filter(status='HELD', held_by=username)
+        .filter(Q(hold_expires_at__isnull=True) | Q(hold_expires_at__gte=now))
+        .update(status='BOOKED', hold_expires_at=None, version=F('version') + 1)
+    )
+    if updated != len(ids):
+        missed = _unapplied(ids, status='BOOKED', held_by=username)
+        labels = [seat_label((s['row_id'], s['number'])) for s in seats if s['id'] in missed]
+        raise SeatConflict(f"Seat {labels[0]} is not held by you", labels)
+    record_transition(show_id, seats, 'BOOKED')
+
+    base_price = Decimal(str(ShowTime.objects.values_list('base_price', flat=True).get(pk=show_id)))
+    for seat in seats:
+        seat['price'] = base_price
+    return seats, base_price * len(seats)
+
+
+@transaction.atomic
+def release_seats(show_id, seats_data, username):
+    """Release the caller's holds on the given seats. Seats not held by them are ignored.
+
+    Releases and expiries only ever touch seats the caller or the clock owns, so
+    they keep the row locks in both concurrency modes.
+    """
+    keys = normalize_seats(seats_data)
+    if not keys:
+        return 0
+    seats = list(
+        Seat.objects.select_for_update()
+        .filter(show_time_id=show_id, status='HELD', held_by=username)
+        .filter(seats_q(keys))
+        .values(*SEAT_FIELDS)
+    )
+    if not seats:
+        return 0
+    released = Seat.objects.filter(
+        id__in=[s['id'] for s in seats], status='HELD', held_by=username
+    ).update(status='AVAILABLE', held_by=None, hold_expires_at=None, version=F('version') + 1)
+    record_transition(show_id, seats, 'AVAILABLE')
+    return released
+
+
+def expire_holds(now=None, batch_size=500):
+    """Release every hold that lapsed before `now`, `batch_size` seats per transaction.
+
+    Returns the number of seats released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            Seat.objects.filter(status='HELD', hold_expires_at__lt=now)
+            .order_by('hold_expires_at')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += expire_seats(ids, now)
+        if len(ids) < batch_size:
+            return released
+
+
+@transaction.atomic
+def expire_seats(seat_ids, now=None):
+    """Release the given seats if their hold lapsed before `now`; others are left alone.
+
+    Bumps the version of each affected show. Returns the number of seats released.
+    """
+    now = now or timezone.now()
+    expired = list(
+        Seat.objects.select_for_update()
+        .filter(id__in=seat_ids, status='HELD', hold_expires_at__lt=now)
+        .order_by('id')
+        .values(*SEAT_FIELDS, 'show_time_id')
+    )
+    by_show = {}
+    for seat in expired:
+        by_show.setdefault(seat['show_time_id'], []).append(seat)
+    released = 0
+    for show_id, seats in by_show.items():
+        released += Seat.objects.filter(
+            id__in=[s['id'] for s in seats], status='HELD', hold_expires_at__lt=now
+        ).update(status='AVAILABLE', held_by=None, hold_expires_at=None, version=F('version') + 1)
+        record_transition(show_id, seats, 'AVAILABLE', reason='expired')
+    return released
+
+
+@receiver(post_save, sender=ShowTime)
+def sync_show_start_time(sender, instance, created, **kwargs):
+    # Seats carry a copy of the start time for my_bookings; follow a rescheduled show
+    if not created:
+        Seat.objects.filter(show_time=instance).exclude(
+            show_start_time=instance.start_time
+        ).update(show_start_time=instance.start_time)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+
+from . import changelog
+from .models import ShowTime
+
+# How often each process checks for seat changes made elsewhere (other workers,
+# cleanup_holds) and how often idle streams send a keep-alive comment.
+POLL_INTERVAL = getattr(settings, 'SEAT_STREAM_POLL_INTERVAL', 1.0)
+HEARTBEAT_INTERVAL = getattr(settings, 'SEAT_STREAM_HEARTBEAT', 15.0)
+QUEUE_SIZE = 256
+
+EVENT_TYPES = {'HELD': 'held', 'AVAILABLE': 'released', 'BOOKED': 'booked'}
+
+_subscribers = {}
+_watchers = {}
+_last_version = {}
+_lock = threading.Lock()
+
+
+class Subscription:
+    """One browser connection listening to one show, bound to the event loop that serves it."""
+
+    def __init__(self, show_id, loop):
+        self.show_id = show_id
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, event):
+        # Called from whichever thread committed the transition
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            pass  # loop already closed, the stream is going away
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is better served by reloading the whole map
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync', 'version': event['version']})
+
+    def close(self):
+        with _lock:
+            subs = _subscribers.get(self.show_id)
+            if subs is not None:
+                subs.discard(self)
+                if not subs:
+                    del _subscribers[self.show_id]
+
+
+def make_event(version, seats, status, reason=None):
+    seats = [
+        {'row': s['row_id'], 'number': s['number']} if isinstance(s, dict)
+        else {'row': s.row_id, 'number': s.number}
+        for s in seats
+    ]
+    return {
+        'type': reason or EVENT_TYPES[status],
+        'version': version,
+        'status': status,
+        'seats': seats,
+    }
+
+
+def publish(show_id, event):
+    show_id = int(show_id)
+    with _lock:
+        if event['version'] > _last_version.get(show_id, 0):
+            _last_version[show_id] = event['version']
+        subs = list(_subscribers.get(show_id, ()))
+    for sub in subs:
+        sub.push(event)
+
+
+def subscribe(show_id):
+    """Register a stream for a show. Must be called from the event loop serving it."""
+    show_id = int(show_id)
+    loop = asyncio.get_running_loop()
+    sub = Subscription(show_id, loop)
+    with _lock:
+        _subscribers.setdefault(show_id, set()).add(sub)
+        watcher = _watchers.get(show_id)
+        if watcher is None or watcher.done():
+            _watchers[show_id] = loop.create_task(_watch(show_id))
+    return sub
+
+
+async def current_version(show_id):
+    version = await ShowTime.objects.filter(pk=show_id).values_list('seat_version', flat=True).afirst()
+    return version or 0
+
+
+async def replay(show_id, since, version):
+    """Rebuild the events between two versions from the change log, or a single
+    'resync' if the log no longer covers them."""
+    changes = await changelog.achanges_since(show_id, since, version)
+    if changes is None:
+        return [{'type': 'resync', 'version': version}]
+    return [
+        make_event(v, seats, status, kind)
+        for v, kind, status, _, seats in changelog.group_by_version(changes)
+    ]
+
+
+async def _watch(show_id):
+    # One poller per show and process, however many browsers are connected: it replays
+    # version bumps that did not originate here (other workers, cleanup_holds) from the
+    # change log to every subscriber.
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        with _lock:
+            if not _subscribers.get(show_id):
+                _watchers.pop(show_id, None)
+                return
+        latest = await current_version(show_id)
+        with _lock:
+            seen = _last_version.get(show_id, 0)
+        if latest > seen:
+            for event in await replay(show_id, seen, latest):
+                publish(show_id, event)
+
+
+def format_sse(event):
+    return f"id: {event['version']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream(show_id, last_version=None):
+    """Async iterator of SSE frames for one show, starting with a 'hello' carrying the version."""
+    sub = subscribe(show_id)
+    try:
+        version = await current_version(show_id)
+        with _lock:
+            if version > _last_version.get(sub.show_id, 0):
+                _last_version[sub.show_id] = version
+        if last_version is not None and last_version != version:
+            # Reconnect: send what was missed while the client was away
+            for event in await replay(sub.show_id, last_version, version):
+                yield format_sse(event)
+        else:
+            yield format_sse({'type': 'hello', 'version': version})
+
+        idle = 0.0
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                idle += POLL_INTERVAL
+                if idle >= HEARTBEAT_INTERVAL:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+                continue
+            idle = 0.0
+            if event['version'] <= version:
+                continue
+            if event['type'] != 'resync' and event['version'] != version + 1:
+                # Some transitions were not seen by this process; let the client reload
+                event = {'type': 'resync', 'version': event['version']}
+            version = event['version']
+            yield format_sse(event)
+    finally:
+        sub.close()
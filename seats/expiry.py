@@ -0,0 +1,96 @@
+import heapq
+import time
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .engine import expire_seats
+from .models import Seat
+
+# New holds are found by scanning past the latest expiry already scheduled. The
+# overlap absorbs clock skew between app servers that stamped the holds.
+CLOCK_SKEW = timedelta(seconds=30)
+
+
+class HoldExpiryScheduler:
+    """Deadline heap of live holds that releases each one as soon as it lapses.
+
+    The heap may hold stale entries (seat re-held, booked or released since);
+    expire_seats only touches seats that are still HELD with a lapsed expiry,
+    so those entries are harmless and simply dropped when they come due.
+    """
+
+    def __init__(self, batch_size=500, poll_interval=5.0):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.heap = []
+        self.scheduled = {}
+        self.high_water = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _schedule(self, rows):
+        added = 0
+        for seat_id, expires_at in rows:
+            if self.scheduled.get(seat_id) == expires_at:
+                continue
+            self.scheduled[seat_id] = expires_at
+            heapq.heappush(self.heap, (expires_at, seat_id))
+            added += 1
+            if self.high_water is None or expires_at > self.high_water:
+                self.high_water = expires_at
+        return added
+
+    def recover(self):
+        """Load every live hold. Served by the partial index on HELD seats only."""
+        rows = (
+            Seat.objects.filter(status='HELD', hold_expires_at__isnull=False)
+            .values_list('id', 'hold_expires_at')
+            .iterator(chunk_size=5000)
+        )
+        return self._schedule(rows)
+
+    def pick_up_new_holds(self):
+        if self.high_water is None:
+            return self.recover()
+        rows = (
+            Seat.objects.filter(status='HELD', hold_expires_at__gt=self.high_water - CLOCK_SKEW)
+            .values_list('id', 'hold_expires_at')
+            .iterator(chunk_size=5000)
+        )
+        return self._schedule(rows)
+
+    def release_due(self, now=None):
+        """Release lapsed holds in batches of at most `batch_size`. Returns seats released."""
+        now = now or timezone.now()
+        released = 0
+        while self.heap and self.heap[0][0] < now:
+            batch = []
+            while self.heap and self.heap[0][0] < now and len(batch) < self.batch_size:
+                expires_at, seat_id = heapq.heappop(self.heap)
+                if self.scheduled.get(seat_id) == expires_at:
+                    del self.scheduled[seat_id]
+                batch.append(seat_id)
+            released += expire_seats(batch, now)
+        return released
+
+    def seconds_until_next(self, now=None):
+        """How long to sleep: until the next deadline, but never past the next poll for new holds."""
+        now = now or timezone.now()
+        if not self.heap:
+            return self.poll_interval
+        wait = (self.heap[0][0] - now).total_seconds()
+        return max(0.0, min(wait, self.poll_interval))
+
+    def run_forever(self, on_release=None):
+        self.recover()
+        next_poll = time.monotonic() + self.poll_interval
+        while True:
+            released = self.release_due()
+            if released and on_release:
+                on_release(released)
+            if time.monotonic() >= next_poll:
+                self.pick_up_new_holds()
+                next_poll = time.monotonic() + self.poll_interval
+            time.sleep(self.seconds_until_next())
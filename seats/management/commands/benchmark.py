@@ -0,0 +1,96 @@
+import json
+import logging
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from seats import benchmark
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Measures p50/p95/p99 latency, throughput and queries per request of the booking API as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=benchmark.PROFILES, default='same-show',
+                            help='same-seat: everyone fights over one seat; same-show: distinct seats of one show; '
+                                 'spread: distinct seats across --shows shows (default: same-show)')
+        parser.add_argument('--endpoint', action='append', choices=benchmark.ENDPOINTS,
+                            help='Endpoint to measure, may be repeated (default: all)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent clients (default: 4)')
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per client and endpoint (default: 50)')
+        parser.add_argument('--shows', type=int, default=4, help='Shows created for the run (default: 4)')
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--url', help='Benchmark a running server sharing this database, e.g. http://127.0.0.1:8000')
+        target.add_argument('--spawn', action='store_true',
+                            help='Start a local server on a free port for the run (default: in-process test client)')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--allow-database-writes', action='store_true',
+                            help='Run against the database in DATABASE_URL. The run creates, then deletes, '
+                                 'bench_user_* users and a "Bench Screen" with its shows')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['iterations'] < 1 or options['shows'] < 1:
+            raise CommandError('--workers, --iterations and --shows must be positive')
+        seats = benchmark.seats_needed(options['workers'], options['iterations'])
+        if seats > benchmark.MAX_SEATS:
+            raise CommandError(f'--workers x --iterations needs {seats} seats per show, '
+                               f'the bench screen holds at most {benchmark.MAX_SEATS}')
+        if settings.DATABASE_URL and not options['allow_database_writes']:
+            # Possibly production: never write benchmark data there by accident
+            raise CommandError('DATABASE_URL is set; pass --allow-database-writes to benchmark against it, '
+                               'or unset it to use a throwaway local database')
+        # Conflicts are an expected outcome under contention, not worth a log line each
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        base_url = options['url']
+        server = None
+        if options['spawn']:
+            server, base_url = self.spawn()
+        try:
+            report = benchmark.run(
+                endpoints=options['endpoint'] or benchmark.ENDPOINTS,
+                profile=options['profile'],
+                workers=options['workers'],
+                iterations=options['iterations'],
+                shows=options['shows'],
+                base_url=base_url,
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        body = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(body + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(body)
+
+    def spawn(self):
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                return server, f'http://127.0.0.1:{port}'
+            except OSError:
+                if server.poll() is not None:
+                    raise CommandError('The benchmark server exited during startup')
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError('The benchmark server did not start within 30 seconds')
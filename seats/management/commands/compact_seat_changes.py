@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from seats.changelog import compact
+
+class Command(BaseCommand):
+    help = 'Trims the seat change log, keeping the most recent versions of each running show'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep', type=int, default=10000,
+                            help='Number of most recent seat map versions to keep per show (default: 10000)')
+
+    def handle(self, *args, **options):
+        deleted = compact(options['keep'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {deleted} seat change log rows.'))
@@ -0,0 +1,34 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from seats import tickets
+from seats.models import Seat, ShowTime
+
+class Command(BaseCommand):
+    help = 'Exports the signed tickets of every booked seat of a show as JSON lines, for offline gate scanners'
+
+    def add_arguments(self, parser):
+        parser.add_argument('show_id', type=int)
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+
+    def handle(self, *args, **options):
+        show_id = options['show_id']
+        price = ShowTime.objects.filter(pk=show_id).values_list('base_price', flat=True).first()
+        if price is None:
+            raise CommandError(f'Show {show_id} does not exist')
+
+        seats = (
+            Seat.objects.filter(show_time_id=show_id, status='BOOKED')
+            .order_by('row_id', 'number')
+            .values_list('id', 'row_id', 'number', 'held_by')
+        )
+        out = open(options['output'], 'w') if options['output'] else self.stdout
+        count = 0
+        try:
+            for seat_id, row_id, number, held_by in seats.iterator(chunk_size=2000):
+                token = tickets.issue(seat_id, show_id, row_id, number, price, held_by)
+                out.write(json.dumps({'seat': f'{row_id}{number}', 'token': token}) + '\n')
+                count += 1
+        finally:
+            if options['output']:
+                out.close()
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} tickets for show {show_id}.'))
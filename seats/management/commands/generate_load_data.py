@@ -0,0 +1,203 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from seats import catalog, occupancy, seatmap
+from seats.models import Movie, Screen, Seat, SeatChange, ShowTime, layout_row_names, layout_seats
+
+PREFIX = 'Load'
+USER_PREFIX = 'load_user_'
+MOVIES = 20
+LONGEST_MOVIE = 180
+# Shows of a screen run from 10:00 and end by midnight, in equal slots long
+# enough for the longest movie plus a turnaround
+OPENING_HOUR = 10
+OPEN_MINUTES = (24 - OPENING_HOUR) * 60
+MIN_SLOT = LONGEST_MOVIE + 10
+MAX_SHOWS_PER_DAY = (OPEN_MINUTES - LONGEST_MOVIE) // MIN_SLOT + 1
+
+
+class Command(BaseCommand):
+    help = 'Generates a deterministic, parameterized dataset (screens, shows, users, sold/held seats) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--screens', type=int, default=10)
+        parser.add_argument('--seats-per-screen', type=int, default=200)
+        parser.add_argument('--seats-per-row', type=int, default=20)
+        parser.add_argument('--shows-per-day', type=int, default=4,
+                            help=f'Shows per screen and day, at most {MAX_SHOWS_PER_DAY} (default: 4)')
+        parser.add_argument('--days', type=int, default=7)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--sold', type=float, default=0.3, help='Fraction of seats booked')
+        parser.add_argument('--held', type=float, default=0.05, help='Fraction of seats under a live hold')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--start-date', help='First show day, YYYY-MM-DD (default: tomorrow)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT (default: 5000)')
+        parser.add_argument('--materialize', action='store_true',
+                            help='Also store a row for every AVAILABLE seat, as a fully populated Seat table would')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated data first')
+
+    def handle(self, *args, **options):
+        if min(options['sold'], options['held']) < 0 or options['sold'] + options['held'] > 1:
+            raise CommandError('--sold and --held must be fractions adding up to at most 1')
+        if not 1 <= options['shows_per_day'] <= MAX_SHOWS_PER_DAY:
+            raise CommandError(f'--shows-per-day must be between 1 and {MAX_SHOWS_PER_DAY}: '
+                               f'{MIN_SLOT}-minute shows from {OPENING_HOUR}:00 have to end by midnight')
+        rng = random.Random(options['seed'])
+        started = time.monotonic()
+
+        if options['clear']:
+            self.clear()
+
+        users = self.create_users(options['users'])
+        movies = self.create_movies(rng)
+        screens = self.create_screens(options['screens'], options['seats_per_screen'], options['seats_per_row'])
+        shows = self.create_shows(rng, screens, movies, options)
+        seats = self.create_seats(rng, shows, screens, users, options)
+
+        # Bulk inserts skip the signals that keep these caches and counters in step
+        catalog.invalidate()
+        seatmap.forget()
+        if shows:
+            occupancy.reconcile(ShowTime.objects.filter(id__gte=shows[0][0], id__lte=shows[-1][0]))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {len(users)} users, {len(screens)} screens, {len(shows)} shows and '
+            f'{seats} seat rows in {elapsed:.1f}s (seed {options["seed"]}).'
+        ))
+
+    def clear(self):
+        screens = Screen.objects.filter(name__startswith=f'{PREFIX} Screen ')
+        shows = ShowTime.objects.filter(screen__in=screens)
+        # Seats and log rows first, as plain DELETEs, so the cascade does not load them
+        # (nor send a seat signal per row: the shows go away anyway)
+        SeatChange.objects.filter(show_time__in=shows).delete()
+        seats = Seat.objects.filter(show_time__in=shows)
+        seats._raw_delete(seats.db)
+        shows.delete()
+        screens.delete()
+        Movie.objects.filter(title__startswith=f'{PREFIX} Movie ').delete()
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+        self.stdout.write('Cleared previously generated data.')
+
+    def create_users(self, count):
+        # Hashing is deliberately slow; every generated user shares one hash of "password"
+        password = make_password('password')
+        User.objects.bulk_create(
+            [User(username=f'{USER_PREFIX}{i}', password=password) for i in range(count)],
+            batch_size=1000, ignore_conflicts=True,
+        )
+        return [f'{USER_PREFIX}{i}' for i in range(count)]
+
+    def create_movies(self, rng):
+        movies = []
+        for i in range(MOVIES):
+            # Drawn even when the movie exists so the rest of the sequence does not shift
+            duration = rng.randrange(90, LONGEST_MOVIE + 1)
+            movie, _ = Movie.objects.update_or_create(
+                title=f'{PREFIX} Movie {i}', defaults={'duration_mins': duration}
+            )
+            movies.append(movie)
+        return movies
+
+    def create_screens(self, count, seats, per_row):
+        if seats < 1 or per_row < 1:
+            raise CommandError('--seats-per-screen and --seats-per-row must be positive')
+        full, rest = divmod(seats, per_row)
+        try:
+            names = layout_row_names(full + (1 if rest else 0))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        layout = [{'row': name, 'seats': per_row} for name in names[:full]]
+        if rest:
+            layout.append({'row': names[-1], 'seats': rest})
+        screens = []
+        for i in range(count):
+            screen, _ = Screen.objects.update_or_create(
+                name=f'{PREFIX} Screen {i}', defaults={'layout': layout}
+            )
+            screens.append(screen)
+        return screens
+
+    def create_shows(self, rng, screens, movies, options):
+        if options['start_date']:
+            first_day = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+        else:
+            first_day = timezone.localdate() + timedelta(days=1)
+        per_day = options['shows_per_day']
+        # Equal slots over the opening hours; handle() keeps them at least MIN_SLOT long
+        slot = timedelta(minutes=OPEN_MINUTES // per_day)
+        shows = []
+        for day in range(options['days']):
+            opening = timezone.make_aware(datetime.combine(first_day + timedelta(days=day), datetime.min.time()))
+            opening += timedelta(hours=OPENING_HOUR)
+            for screen in screens:
+                for n in range(per_day):
+                    movie = rng.choice(movies)
+                    start = opening + slot * n
+                    shows.append(ShowTime(
+                        movie=movie, screen=screen, start_time=start,
+                        end_time=start + timedelta(minutes=movie.duration_mins),
+                        base_price=Decimal(rng.choice(['100.00', '150.00', '200.00'])),
+                    ))
+        last_id = ShowTime.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        ShowTime.objects.bulk_create(shows, batch_size=options['batch_size'])
+        # Not every backend returns primary keys from a bulk insert; read them back instead
+        created = list(
+            ShowTime.objects.filter(id__gt=last_id, screen__in=screens)
+            .order_by('id').values_list('id', 'screen_id', 'start_time')
+        )
+        self.stdout.write(f'Created {len(created)} shows.')
+        return created
+
+    def create_seats(self, rng, shows, screens, users, options):
+        layouts = {screen.id: list(layout_seats(screen.layout)) for screen in screens}
+        sold, held = options['sold'], options['held']
+        materialize = options['materialize']
+        batch_size = options['batch_size']
+        now = timezone.now()
+        users = users or [f'{USER_PREFIX}0']
+
+        total = 0
+        batch = []
+        started = time.monotonic()
+
+        def flush():
+            nonlocal total
+            with transaction.atomic():
+                Seat.objects.bulk_create(batch, batch_size=batch_size)
+            total += len(batch)
+            batch.clear()
+            rate = total / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(f'Inserted {total} seat rows ({rate:.0f} rows/s)')
+
+        for show_id, screen_id, start_time in shows:
+            for row_id, number in layouts[screen_id]:
+                roll = rng.random()
+                if roll < sold:
+                    seat = Seat(show_time_id=show_id, row_id=row_id, number=number,
+                                show_start_time=start_time, status='BOOKED', held_by=rng.choice(users))
+                elif roll < sold + held:
+                    # Expiries are relative to now, so they are the only part not fixed by the seed
+                    seat = Seat(show_time_id=show_id, row_id=row_id, number=number,
+                                show_start_time=start_time, status='HELD', held_by=rng.choice(users),
+                                hold_expires_at=now + timedelta(seconds=rng.randrange(60, 600)))
+                elif materialize:
+                    seat = Seat(show_time_id=show_id, row_id=row_id, number=number,
+                                show_start_time=start_time)
+                else:
+                    continue
+                batch.append(seat)
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+        return total
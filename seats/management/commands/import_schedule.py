@@ -0,0 +1,156 @@
+import csv
+import json
+import sys
+import time
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from seats import catalog
+from seats.models import Movie, Screen, ShowTime, default_layout, layout_rows
+
+
+def parse_layout(value):
+    """Accept a layout as a JSON list or as "A:10,B:12"; none gives the standard grid."""
+    if not value:
+        return default_layout()
+    if isinstance(value, list):
+        return value
+    value = value.strip()
+    if value.startswith('['):
+        return json.loads(value)
+    layout = []
+    for part in value.split(','):
+        row, seats = part.split(':')
+        layout.append({'row': row.strip(), 'seats': int(seats)})
+    return layout
+
+
+def parse_time(value, field):
+    parsed = parse_datetime(value or '')
+    if parsed is None:
+        raise ValueError(f"invalid {field} {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Streams a CSV or JSONL schedule (movie, screen, start_time, ...) into showtimes in chunked transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Schedule file, or - for stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Showtimes inserted per transaction (default: 1000)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.json')) else 'csv')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        self.movies = dict(Movie.objects.values_list('title', 'id'))
+        self.screens = dict(Screen.objects.values_list('name', 'id'))
+        # New shows start with every seat available; bulk_create skips the signal that counts them
+        self.capacities = {
+            pk: sum(layout_rows(layout).values()) for pk, layout in Screen.objects.values_list('id', 'layout')
+        }
+        # A show without a screen gets the default grid
+        self.capacities[None] = sum(layout_rows(None).values())
+        self.created = {'movies': 0, 'screens': 0}
+        self.durations = dict(Movie.objects.values_list('id', 'duration_mins'))
+
+        handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            records = self.read(handle, fmt)
+            imported = 0
+            started = time.monotonic()
+            while True:
+                # Only one chunk of parsed rows is ever held in memory
+                chunk = list(islice(records, batch_size))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    shows = [self.build_show(line, record) for line, record in chunk]
+                    ShowTime.objects.bulk_create(shows, batch_size=batch_size)
+                imported += len(shows)
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'Imported {imported} shows ({imported / max(elapsed, 1e-6):.0f} shows/s)')
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+            # bulk_create skips the signals that normally invalidate the listing
+            catalog.invalidate()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} shows, {self.created['movies']} new movies and "
+            f"{self.created['screens']} new screens in {elapsed:.2f}s."
+        ))
+
+    def read(self, handle, fmt):
+        # Yields (line number, dict); nothing is read ahead of the current chunk
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for line, text in enumerate(handle, 1):
+            if text.strip():
+                try:
+                    yield line, json.loads(text)
+                except ValueError as exc:
+                    raise CommandError(f'Line {line}: {exc}')
+
+    def build_show(self, line, record):
+        try:
+            start_time = parse_time(record.get('start_time'), 'start_time')
+            movie_id = self.movie_id(record)
+            if record.get('end_time'):
+                end_time = parse_time(record['end_time'], 'end_time')
+            else:
+                end_time = start_time + timedelta(minutes=self.durations[movie_id])
+            screen_id = self.screen_id(record)
+            show = ShowTime(
+                movie_id=movie_id,
+                screen_id=screen_id,
+                start_time=start_time,
+                end_time=end_time,
+                seats_available=self.capacities[screen_id],
+            )
+            if record.get('price') not in (None, ''):
+                show.base_price = Decimal(str(record['price']))
+        except (KeyError, ValueError, InvalidOperation) as exc:
+            raise CommandError(f'Line {line}: {exc} (earlier chunks were committed)')
+        return show
+
+    def movie_id(self, record):
+        title = record['movie']
+        if title not in self.movies:
+            duration = record.get('duration_mins')
+            if not duration:
+                raise ValueError(f"new movie {title!r} needs duration_mins")
+            movie = Movie.objects.create(title=title, duration_mins=int(duration))
+            self.movies[title] = movie.id
+            self.durations[movie.id] = movie.duration_mins
+            self.created['movies'] += 1
+        return self.movies[title]
+
+    def screen_id(self, record):
+        name = record.get('screen')
+        if not name:
+            return None
+        if name not in self.screens:
+            screen = Screen.objects.create(name=name, layout=parse_layout(record.get('layout')))
+            self.screens[name] = screen.id
+            self.capacities[screen.id] = screen.capacity
+            self.created['screens'] += 1
+        return self.screens[name]
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from seats.models import ShowTime
+from seats.occupancy import reconcile
+
+class Command(BaseCommand):
+    help = 'Recounts the available/held/booked counters of each show from its seats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show', type=int, action='append', dest='shows',
+                            help='Only this show (repeatable; default: every show)')
+
+    def handle(self, *args, **options):
+        shows = ShowTime.objects.filter(id__in=options['shows']) if options['shows'] else None
+        fixed = reconcile(shows)
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'Corrected the occupancy counters of {fixed} shows.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Occupancy counters are consistent.'))
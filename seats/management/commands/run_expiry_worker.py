@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from seats.expiry import HoldExpiryScheduler
+
+class Command(BaseCommand):
+    help = 'Runs continuously, releasing each seat hold the moment it expires'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Maximum number of seats released per transaction (default: 500)')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds between scans for newly placed holds (default: 5)')
+
+    def handle(self, *args, **options):
+        scheduler = HoldExpiryScheduler(
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+        )
+        self.stdout.write(self.style.SUCCESS('Expiry worker started.'))
+
+        def report(count):
+            self.stdout.write(f'Released {count} expired holds ({len(scheduler)} still scheduled).')
+
+        try:
+            scheduler.run_forever(on_release=report)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('Expiry worker stopped.'))
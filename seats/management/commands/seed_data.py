@@ -19,8 +19,14 @@ class Command(BaseCommand):
         self.stdout.write("Cleared all existing data and recreated demo user.")
 
         # 1. Create Screens
-        s1 = Screen.objects.create(name="Screen 1 (Main Hall)", description="50 seats large hall")
-        s2 = Screen.objects.create(name="Screen 2 (Indie Hall)", description="30 seats cozy hall")
+        s1 = Screen.objects.create(
+            name="Screen 1 (Main Hall)", description="50 seats large hall",
+            layout=[{"row": row, "seats": 10} for row in "ABCDE"],
+        )
+        s2 = Screen.objects.create(
+            name="Screen 2 (Indie Hall)", description="30 seats cozy hall",
+            layout=[{"row": row, "seats": 10} for row in "ABC"],
+        )
 
         # 2. Create Movies
         m1 = Movie.objects.create(title="Avatar: The Way of Water", duration_mins=192, poster="posters/avatar.png")
@@ -29,29 +35,12 @@ class Command(BaseCommand):
 
         # 3. Create ShowTimes
         shows = [
-            ShowTime(movie=m1, screen=s1, start_time=timezone.now() + timedelta(hours=2), end_time=timezone.now() + timedelta(hours=5)),
-            ShowTime(movie=m1, screen=s2, start_time=timezone.now() + timedelta(hours=6), end_time=timezone.now() + timedelta(hours=9)),
-            ShowTime(movie=m2, screen=s2, start_time=timezone.now() + timedelta(hours=3), end_time=timezone.now() + timedelta(hours=6)),
-            ShowTime(movie=m3, screen=s1, start_time=timezone.now() + timedelta(hours=1), end_time=timezone.now() + timedelta(hours=3)),
+            ShowTime(movie=m1, screen=s1, start_time=timezone.now() + timedelta(hours=2), end_time=timezone.now() + timedelta(hours=5), seats_available=s1.capacity),
+            ShowTime(movie=m1, screen=s2, start_time=timezone.now() + timedelta(hours=6), end_time=timezone.now() + timedelta(hours=9), seats_available=s2.capacity),
+            ShowTime(movie=m2, screen=s2, start_time=timezone.now() + timedelta(hours=3), end_time=timezone.now() + timedelta(hours=6), seats_available=s2.capacity),
+            ShowTime(movie=m3, screen=s1, start_time=timezone.now() + timedelta(hours=1), end_time=timezone.now() + timedelta(hours=3), seats_available=s1.capacity),
         ]
         ShowTime.objects.bulk_create(shows)
-        all_shows = ShowTime.objects.all()
-
-        total_seats = 0
-        for show in all_shows:
-            seats = []
-            if "Screen 1" in show.screen.name:
-                rows = ['A', 'B', 'C', 'D', 'E']
-                seats_per_row = 10
-            else:
-                rows = ['A', 'B', 'C']
-                seats_per_row = 10
-
-            for row in rows:
-                for num in range(1, seats_per_row + 1):
-                    seats.append(Seat(show_time=show, row_id=row, number=num))
-            
-            Seat.objects.bulk_create(seats)
-            total_seats += len(seats)
-            
-        self.stdout.write(self.style.SUCCESS(f"Successfully seeded {total_seats} seats across {all_shows.count()} shows."))
+        # Seats come from the screen layouts; rows are only created when a seat is held
+        total_seats = sum(show.screen.capacity for show in shows)
+        self.stdout.write(self.style.SUCCESS(f"Successfully seeded {total_seats} seats across {len(shows)} shows."))
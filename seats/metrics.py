@@ -0,0 +1,195 @@
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+from django.http import StreamingHttpResponse
+
+from . import waiting_room
+
+# Histogram upper bounds: request latency in seconds, response bodies in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class ViewStats:
+    __slots__ = ('statuses', 'latency', 'latency_sum', 'sizes', 'size_sum',
+                 'queries', 'query_time', 'lock_wait', 'conflicts')
+
+    def __init__(self):
+        self.statuses = {}
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.sizes = [0] * (len(SIZE_BUCKETS) + 1)
+        self.size_sum = 0
+        self.queries = 0
+        self.query_time = 0.0
+        self.lock_wait = 0.0
+        self.conflicts = 0
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+class QueryTimer:
+    """Execute wrapper counting a request's queries and their time.
+
+    Time spent in SELECT ... FOR UPDATE statements is mostly waiting for other
+    transactions to release the rows, so it is also kept apart as lock wait.
+    Databases without row locks (SQLite) never report any.
+    """
+
+    __slots__ = ('count', 'duration', 'lock_wait')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.lock_wait = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if 'FOR UPDATE' in sql:
+                self.lock_wait += elapsed
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    return getattr(match.func, '__name__', type(match.func).__name__)
+
+
+def record(view, status, elapsed, size, timer, conflict=False):
+    with _lock:
+        stats = _views.get(view)
+        if stats is None:
+            stats = _views[view] = ViewStats()
+        status_class = f'{status // 100}xx'
+        stats.statuses[status_class] = stats.statuses.get(status_class, 0) + 1
+        stats.latency[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+        stats.latency_sum += elapsed
+        if size is not None:
+            stats.sizes[bisect_left(SIZE_BUCKETS, size)] += 1
+            stats.size_sum += size
+        stats.queries += timer.count
+        stats.query_time += timer.duration
+        stats.lock_wait += timer.lock_wait
+        if conflict:
+            stats.conflicts += 1
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+class MetricsMiddleware:
+    """Per-view latency, queries, lock wait, response size and seat conflicts.
+
+    Goes first in MIDDLEWARE so the latency covers the whole stack. Only
+    requests resolved to a view are counted, which keeps the label set to the
+    views of the project. Costs a timer and a locked counter update per request.
+    Works in both server modes; under ASGI the connection, and so the query
+    timer, belongs to the request's context.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - start, timer)
+        return response
+
+    @staticmethod
+    def observe(request, response, elapsed, timer):
+        view = view_name(request)
+        if view is not None:
+            # Streams have no size; their latency is the time to the first byte
+            size = None if isinstance(response, StreamingHttpResponse) else len(response.content)
+            conflict = response.status_code == 409 or getattr(response, 'seat_conflict', False)
+            record(view, response.status_code, elapsed, size, timer, conflict)
+
+
+def _histogram(lines, name, labels, buckets, counts, total):
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    cumulative += counts[-1]
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+    lines.append(f'{name}_sum{{{labels}}} {total}')
+    lines.append(f'{name}_count{{{labels}}} {cumulative}')
+
+
+def render():
+    """Everything recorded by this process in the Prometheus text format."""
+    with _lock:
+        snapshot = {
+            view: (dict(s.statuses), list(s.latency), s.latency_sum, list(s.sizes), s.size_sum,
+                   s.queries, s.query_time, s.lock_wait, s.conflicts)
+            for view, s in sorted(_views.items())
+        }
+    families = {
+        'seat_http_requests_total': ('counter', 'Requests per view and status class.', []),
+        'seat_http_request_duration_seconds': ('histogram', 'Request latency per view.', []),
+        'seat_http_response_size_bytes': ('histogram', 'Response body size per view.', []),
+        'seat_db_queries_total': ('counter', 'Database queries run per view.', []),
+        'seat_db_query_duration_seconds_total': ('counter', 'Time spent in database queries per view.', []),
+        'seat_db_lock_wait_seconds_total': ('counter', 'Time spent in SELECT ... FOR UPDATE per view.', []),
+        'seat_conflicts_total': ('counter', 'Hold and book requests refused over taken seats.', []),
+        'seat_waiting_room_admitted': ('gauge', 'Clients picking seats per show.', []),
+        'seat_waiting_room_queued': ('gauge', 'Clients queued per show.', []),
+    }
+    for view, (statuses, latency, latency_sum, sizes, size_sum,
+               queries, query_time, lock_wait, conflicts) in snapshot.items():
+        labels = f'view="{view}"'
+        for status_class, count in sorted(statuses.items()):
+            families['seat_http_requests_total'][2].append(
+                f'seat_http_requests_total{{{labels},status="{status_class}"}} {count}')
+        _histogram(families['seat_http_request_duration_seconds'][2], 'seat_http_request_duration_seconds',
+                   labels, LATENCY_BUCKETS, latency, latency_sum)
+        _histogram(families['seat_http_response_size_bytes'][2], 'seat_http_response_size_bytes',
+                   labels, SIZE_BUCKETS, sizes, size_sum)
+        families['seat_db_queries_total'][2].append(f'seat_db_queries_total{{{labels}}} {queries}')
+        families['seat_db_query_duration_seconds_total'][2].append(
+            f'seat_db_query_duration_seconds_total{{{labels}}} {query_time}')
+        families['seat_db_lock_wait_seconds_total'][2].append(
+            f'seat_db_lock_wait_seconds_total{{{labels}}} {lock_wait}')
+        families['seat_conflicts_total'][2].append(f'seat_conflicts_total{{{labels}}} {conflicts}')
+    for show_id, room in sorted(waiting_room.metrics().items()):
+        families['seat_waiting_room_admitted'][2].append(f'seat_waiting_room_admitted{{show="{show_id}"}} {room["admitted"]}')
+        families['seat_waiting_room_queued'][2].append(f'seat_waiting_room_queued{{show="{show_id}"}} {room["queued"]}')
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
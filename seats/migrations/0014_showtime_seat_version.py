@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0013_movie_poster'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='seat_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
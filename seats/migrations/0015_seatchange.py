@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0014_showtime_seat_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField()),
+                ('row_id', models.CharField(max_length=2)),
+                ('number', models.IntegerField()),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Available'), ('HELD', 'Held'), ('BOOKED', 'Booked')], max_length=20)),
+                ('kind', models.CharField(choices=[('held', 'Held'), ('released', 'Released'), ('booked', 'Booked'), ('expired', 'Hold expired')], max_length=10)),
+                ('hold_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('show_time', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_changes', to='seats.showtime')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['show_time', 'version'], name='seats_seatc_show_ti_32d48d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0015_seatchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(condition=models.Q(('status', 'HELD')), fields=['hold_expires_at', 'show_time'], name='seat_active_hold_idx'),
+        ),
+    ]
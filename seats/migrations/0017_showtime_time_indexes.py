@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0016_seat_active_hold_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['start_time'], name='seats_showt_start_t_754a99_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['end_time'], name='seats_showt_end_tim_8c6389_idx'),
+        ),
+    ]
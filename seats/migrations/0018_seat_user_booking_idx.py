@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0017_showtime_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(condition=models.Q(('status', 'BOOKED')), fields=['held_by', 'show_time'], name='seat_user_booking_idx'),
+        ),
+    ]
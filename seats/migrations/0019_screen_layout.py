@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:34
+
+from django.db import migrations, models
+from django.db.models import Max
+
+from seats.models import default_layout
+
+
+def infer_layouts(apps, schema_editor):
+    # Existing shows were created with a full grid of Seat rows; recover each
+    # screen's plan from the largest seat number seen per row. A screen without
+    # any keeps the standard grid its shows were given.
+    Screen = apps.get_model('seats', 'Screen')
+    Seat = apps.get_model('seats', 'Seat')
+    for screen in Screen.objects.all():
+        rows = (
+            Seat.objects.filter(show_time__screen=screen)
+            .values('row_id')
+            .annotate(seats=Max('number'))
+            .order_by('row_id')
+        )
+        screen.layout = [{'row': r['row_id'], 'seats': r['seats']} for r in rows] or default_layout()
+        screen.save(update_fields=['layout'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0018_seat_user_booking_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='screen',
+            name='layout',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(infer_layouts, migrations.RunPython.noop),
+    ]
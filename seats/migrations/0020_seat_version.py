@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0019_screen_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seat',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0020_seat_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='single_writer',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:02
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_occupancy(apps, schema_editor):
+    # Same recount as seats.occupancy.reconcile, on the historical models
+    ShowTime = apps.get_model('seats', 'ShowTime')
+    Seat = apps.get_model('seats', 'Seat')
+    for show in ShowTime.objects.select_related('screen').iterator():
+        rows = {entry['row']: int(entry['seats']) for entry in (show.screen.layout if show.screen else None) or []}
+        inside = Q()
+        for row_id, count in rows.items():
+            inside |= Q(row_id=row_id, number__gte=1, number__lte=count)
+        stored = Seat.objects.filter(show_time=show).aggregate(
+            held=Count('id', filter=Q(status='HELD')),
+            booked=Count('id', filter=Q(status='BOOKED')),
+            outside=Count('id', filter=~inside) if inside else Count('id'),
+        )
+        show.seats_held = stored['held']
+        show.seats_booked = stored['booked']
+        show.seats_available = sum(rows.values()) + stored['outside'] - stored['held'] - stored['booked']
+        show.save(update_fields=['seats_available', 'seats_held', 'seats_booked'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0021_showtime_single_writer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_available',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_booked',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='showtime',
+            name='seats_held',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:28
+
+import seats.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0022_showtime_occupancy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='screen',
+            name='layout',
+            field=models.JSONField(blank=True, default=seats.models.default_layout),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_start_times(apps, schema_editor):
+    ShowTime = apps.get_model('seats', 'ShowTime')
+    Seat = apps.get_model('seats', 'Seat')
+    Seat.objects.update(show_start_time=Subquery(
+        ShowTime.objects.filter(pk=OuterRef('show_time_id')).values('start_time')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0023_screen_default_layout'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='seat',
+            name='seat_user_booking_idx',
+        ),
+        migrations.AddField(
+            model_name='seat',
+            name='show_start_time',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_start_times, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='seat',
+            index=models.Index(condition=models.Q(('status', 'BOOKED')), fields=['held_by', 'show_start_time', 'id'], name='seat_user_booking_idx'),
+        ),
+    ]
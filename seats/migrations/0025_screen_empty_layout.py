@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:10
+
+from django.db import migrations
+
+from seats.models import default_layout
+
+
+def restore_default_layouts(apps, schema_editor):
+    # 0019 left screens that had no seat rows with an empty layout, so their
+    # shows had no seats at all. Without rows there is nothing to infer from:
+    # give them the standard grid, which every seat of their shows is free in.
+    Screen = apps.get_model('seats', 'Screen')
+    Seat = apps.get_model('seats', 'Seat')
+    ShowTime = apps.get_model('seats', 'ShowTime')
+    layout = default_layout()
+    capacity = sum(row['seats'] for row in layout)
+    for screen in Screen.objects.filter(layout=[]):
+        if Seat.objects.filter(show_time__screen=screen).exists():
+            continue
+        screen.layout = layout
+        screen.save(update_fields=['layout'])
+        ShowTime.objects.filter(screen=screen).update(
+            seats_available=capacity, seats_held=0, seats_booked=0,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('seats', '0024_seat_show_start_time'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_default_layouts, migrations.RunPython.noop),
+    ]
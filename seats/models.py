@@ -1,8 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
-from django.dispatch import receiver
 
 class Movie(models.Model):
     title = models.CharField(max_length=200)
@@ -14,13 +12,57 @@ class Movie(models.Model):
         return self.title
 
 
+def default_layout():
+    """The standard 50-seat grid (rows A-E, 10 seats each) every screen starts with."""
+    return [{'row': row, 'seats': 10} for row in 'ABCDE']
+
+
+def layout_rows(layout):
+    """{row_id: seat count} for a screen layout given as [{"row": "A", "seats": 10}, ...].
+
+    None, the layout of a show without a screen, is the default grid.
+    """
+    if layout is None:
+        layout = default_layout()
+    return {entry['row']: int(entry['seats']) for entry in layout}
+
+
+# A..Z and AA..ZZ
+MAX_LAYOUT_ROWS = 26 + 26 * 26
+
+
+def layout_row_names(count):
+    """A..Z, then AA, AB, ... for generated layouts (row_id holds two characters)."""
+    if count > MAX_LAYOUT_ROWS:
+        raise ValueError(f'At most {MAX_LAYOUT_ROWS} rows per screen are supported')
+    letters = [chr(c) for c in range(ord('A'), ord('Z') + 1)]
+    names = letters + [first + second for first in letters for second in letters]
+    return names[:count]
+
+
+def layout_seats(layout):
+    """Every (row_id, number) of a screen layout."""
+    for row_id, count in layout_rows(layout).items():
+        for number in range(1, count + 1):
+            yield row_id, number
+
+
 class Screen(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    # Seating plan, e.g. [{"row": "A", "seats": 10}, {"row": "B", "seats": 12}].
+    # A show only gets Seat rows for seats that were held or booked; every other
+    # seat of the layout is implicitly AVAILABLE. New screens get the standard
+    # grid; a screen whose layout is emptied uses explicit Seat rows only.
+    layout = models.JSONField(default=default_layout, blank=True)
 
     def __str__(self):
         return self.name
 
+    @property
+    def capacity(self):
+        return sum(layout_rows(self.layout).values())
+
 class ShowTime(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='shows')
     screen = models.ForeignKey(Screen, on_delete=models.CASCADE, related_name='shows', null=True)
@@ -29,10 +71,40 @@ class ShowTime(models.Model):
     # Note: price is now per show, though we could keep a default per show.
     # The user wanted 100 rs for all, so we'll set it here.
     base_price = models.DecimalField(max_digits=10, decimal_places=2, default=100.00)
+    # Bumped in the same transaction as every seat transition of this show.
+    # Used as the seat map ETag, so it must only ever go up.
+    seat_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Hot on-sale: hold/book/release requests for this show are funnelled through
+    # one in-process writer that applies them in order and commits them in batches.
+    single_writer = models.BooleanField(default=False)
+    # Occupancy, moved in the same UPDATE as seat_version by every seat transition
+    # (seats/occupancy.py). A lapsed hold counts as held until it is expired.
+    seats_available = models.IntegerField(default=0, editable=False)
+    seats_held = models.IntegerField(default=0, editable=False)
+    seats_booked = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_time']),
+            models.Index(fields=['end_time']),
+        ]
+
+    # Only ever written with UPDATE (seat engine, occupancy.reconcile, seatmap.touch)
+    COUNTER_FIELDS = ('seat_version', 'seats_available', 'seats_held', 'seats_booked')
 
     def __str__(self):
         return f"{self.movie.title} at {self.start_time.strftime('%Y-%m-%d %H:%M')}"
 
+    def save(self, *args, **kwargs):
+        # An instance read before a transition (e.g. an admin form) must not write
+        # an older version or count back
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 class Seat(models.Model):
     STATUS_CHOICES = [
         ('AVAILABLE', 'Available'),
@@ -46,19 +118,55 @@ class Seat(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='AVAILABLE')
     held_by = models.CharField(max_length=100, null=True, blank=True)
     hold_expires_at = models.DateTimeField(null=True, blank=True)
+    # Incremented by every transition; optimistic mode compares it in the UPDATE
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # Copy of show_time.start_time, so a user's bookings can be paged in show order
+    # from an index on this table alone (kept in sync by sync_show_start_time)
+    show_start_time = models.DateTimeField(null=True, editable=False)
 
     class Meta:
         unique_together = ('show_time', 'row_id', 'number')
         indexes = [
             models.Index(fields=['show_time', 'row_id', 'number']),
+            # Only live holds are indexed, so the expiry worker's scans stay small
+            # no matter how many seats have been booked.
+            models.Index(
+                fields=['hold_expires_at', 'show_time'],
+                condition=models.Q(status='HELD'),
+                name='seat_active_hold_idx',
+            ),
+            # Per-user booking history (my_bookings), in the order it is paged in
+            models.Index(
+                fields=['held_by', 'show_start_time', 'id'],
+                condition=models.Q(status='BOOKED'),
+                name='seat_user_booking_idx',
+            ),
         ]
 
-@receiver(post_save, sender=ShowTime)
-def create_seats_for_show(sender, instance, created, **kwargs):
-    if created:
-        # Auto-generate a standard 50-seat grid (Rows A-E, 10 seats each)
-        seats = []
-        for row in ['A', 'B', 'C', 'D', 'E']:
-            for num in range(1, 11):
-                seats.append(Seat(show_time=instance, row_id=row, number=num))
-        Seat.objects.bulk_create(seats)
+    def save(self, *args, **kwargs):
+        if self.show_start_time is None and self.show_time_id:
+            self.show_start_time = ShowTime.objects.values_list('start_time', flat=True).get(pk=self.show_time_id)
+        super().save(*args, **kwargs)
+
+class SeatChange(models.Model):
+    """Append-only log of seat transitions, one row per seat per ShowTime.seat_version bump."""
+    KIND_CHOICES = [
+        ('held', 'Held'),
+        ('released', 'Released'),
+        ('booked', 'Booked'),
+        ('expired', 'Hold expired'),
+    ]
+
+    show_time = models.ForeignKey(ShowTime, on_delete=models.CASCADE, related_name='seat_changes')
+    version = models.PositiveBigIntegerField()
+    row_id = models.CharField(max_length=2)
+    number = models.IntegerField()
+    status = models.CharField(max_length=20, choices=Seat.STATUS_CHOICES)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['show_time', 'version']),
+        ]
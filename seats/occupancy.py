@@ -0,0 +1,101 @@
+from collections import Counter
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Screen, Seat, ShowTime, layout_rows
+
+FIELDS = {'AVAILABLE': 'seats_available', 'HELD': 'seats_held', 'BOOKED': 'seats_booked'}
+# Shows recounted per query by reconcile()
+RECONCILE_BATCH = 500
+
+
+def deltas(previous, status):
+    """ShowTime.update() arguments moving seats from their `previous` statuses to `status`."""
+    moved = Counter(s for s in previous if s != status)
+    if not moved:
+        return {}
+    changes = {FIELDS[status]: F(FIELDS[status]) + sum(moved.values())}
+    for old, count in moved.items():
+        changes[FIELDS[old]] = F(FIELDS[old]) - count
+    return changes
+
+
+def _layout_q(layout):
+    q = Q()
+    for row_id, count in layout_rows(layout).items():
+        q |= Q(row_id=row_id, number__gte=1, number__lte=count)
+    return q
+
+
+def counts(show_ids, layout):
+    """{show_id: (available, held, booked)} recounted from the Seat table.
+
+    The seats of a show are those of its screen layout plus any stored row
+    outside it; layout seats without a row are available.
+    """
+    inside = _layout_q(layout)
+    outside = Count('id', filter=~inside) if inside else Count('id')
+    stored = {
+        row['show_time_id']: row
+        for row in Seat.objects.filter(show_time_id__in=show_ids)
+        .values('show_time_id')
+        .annotate(
+            held=Count('id', filter=Q(status='HELD')),
+            booked=Count('id', filter=Q(status='BOOKED')),
+            outside=outside,
+        )
+        .order_by()
+    }
+    capacity = sum(layout_rows(layout).values())
+    result = {}
+    for show_id in show_ids:
+        row = stored.get(show_id, {'held': 0, 'booked': 0, 'outside': 0})
+        result[show_id] = (capacity + row['outside'] - row['held'] - row['booked'], row['held'], row['booked'])
+    return result
+
+
+def reconcile(shows=None):
+    """Recount the occupancy counters of `shows` (a ShowTime queryset, default all).
+
+    Each batch locks its shows first: a seat transition updates the counters in
+    the show row, so it is either counted here or applied on top of the result.
+    Returns the number of shows whose counters were wrong.
+    """
+    shows = ShowTime.objects.all() if shows is None else shows
+    rows = shows.order_by('screen_id', 'id').values_list('id', 'screen_id', 'screen__layout').iterator(chunk_size=2000)
+    fixed = 0
+    for _, group in groupby(rows, key=lambda row: row[1]):
+        group = list(group)
+        layout = group[0][2]
+        for start in range(0, len(group), RECONCILE_BATCH):
+            ids = [row[0] for row in group[start:start + RECONCILE_BATCH]]
+            with transaction.atomic():
+                current = {
+                    row[0]: row[1:]
+                    for row in ShowTime.objects.select_for_update().filter(id__in=ids)
+                    .values_list('id', 'seats_available', 'seats_held', 'seats_booked')
+                }
+                wrong = []
+                for show_id, values in counts(ids, layout).items():
+                    if show_id in current and current[show_id] != values:
+                        wrong.append(ShowTime(pk=show_id, seats_available=values[0],
+                                              seats_held=values[1], seats_booked=values[2]))
+                ShowTime.objects.bulk_update(wrong, ['seats_available', 'seats_held', 'seats_booked'])
+            fixed += len(wrong)
+    return fixed
+
+
+@receiver(post_save, sender=ShowTime)
+def show_saved(sender, instance, **kwargs):
+    # New shows start with the whole layout available; a new screen changes it
+    reconcile(ShowTime.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Screen)
+def screen_saved(sender, instance, created, **kwargs):
+    if not created:
+        reconcile(ShowTime.objects.filter(screen=instance))
@@ -0,0 +1,483 @@
+import json
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Screen, Seat, ShowTime, layout_rows, layout_seats
+
+# Status codes packed one byte per seat
+AVAILABLE, HELD, BOOKED = 0, 1, 2
+STATUS_CODES = {'AVAILABLE': AVAILABLE, 'HELD': HELD, 'BOOKED': BOOKED}
+STATUS_NAMES = ('AVAILABLE', 'HELD', 'BOOKED')
+# Compact seat map representation, see SeatMap.to_binary()
+BINARY_MEDIA_TYPE = 'application/vnd.seatmap'
+RLE_MAX_RUN = 64
+_SHIFTS = [bytes((code << (2 * k)) & 0xFF for code in range(256)) for k in range(4)]
+_RUNS = re.compile(rb'(.)\1*', re.DOTALL)
+
+MAX_MAPS = getattr(settings, 'SEATMAP_MAX_MAPS', 256)
+PAYLOAD_TIMEOUT = getattr(settings, 'SEATMAP_PAYLOAD_TIMEOUT', 600)
+
+
+class SeatMap:
+    """Array-backed seat state for one show.
+
+    Seats are kept sorted by (row, number). Each row owns a contiguous slice
+    [row_starts[i], row_starts[i + 1]) of the parallel arrays, so a seat is
+    located with one bisect and no per-seat Python objects are kept around.
+    """
+
+    __slots__ = ('show_id', 'screen', 'version', 'rows', 'row_starts', 'row_rank',
+                 'ids', 'numbers', 'status', 'expires', 'free', 'free_until')
+
+    def __init__(self, show_id, screen="Main", version=0):
+        self.show_id = show_id
+        self.screen = screen
+        # ShowTime.seat_version this map reflects (its content may be slightly newer)
+        self.version = version
+        self.rows = []
+        self.row_starts = array('l', [0])
+        self.ids = array('q')
+        self.numbers = array('l')
+        self.status = bytearray()
+        # Hold expiry as a UNIX timestamp, 0.0 when the seat has no hold
+        self.expires = array('d')
+        # Front-to-back position of each row (rows are stored sorted, 'AA' before 'B')
+        self.row_rank = []
+        # Per-row free-interval index, see free_runs(); None until first used
+        self.free = None
+        self.free_until = 0.0
+
+    @classmethod
+    def from_rows(cls, show_id, screen, rows, version=0):
+        """Build from (id, row_id, number, status, hold_expires_at) tuples sorted by row and number."""
+        seatmap = cls(show_id, screen, version)
+        current_row = None
+        for seat_id, row_id, number, status, hold_expires_at in rows:
+            if row_id != current_row:
+                if current_row is not None:
+                    seatmap.row_starts.append(len(seatmap.ids))
+                seatmap.rows.append(row_id)
+                current_row = row_id
+            seatmap.ids.append(seat_id)
+            seatmap.numbers.append(number)
+            seatmap.status.append(STATUS_CODES[status])
+            seatmap.expires.append(hold_expires_at.timestamp() if hold_expires_at else 0.0)
+        if seatmap.rows:
+            seatmap.row_starts.append(len(seatmap.ids))
+        seatmap.row_rank = list(range(len(seatmap.rows)))
+        return seatmap
+
+    @classmethod
+    def load(cls, show_id, version=0):
+        """Build from the screen layout plus the show's sparse Seat rows.
+
+        Layout seats without a row are AVAILABLE and get id 0 (serialized as null).
+        Rows outside the layout (or all rows, for screens without one) are kept as is.
+        """
+        screen, layout = (
+            ShowTime.objects.filter(pk=show_id)
+            .values_list('screen__name', 'screen__layout')
+            .first()
+        ) or (None, [])
+        stored = {
+            (row_id, number): (seat_id, row_id, number, status, hold_expires_at)
+            for seat_id, row_id, number, status, hold_expires_at in
+            Seat.objects.filter(show_time_id=show_id)
+            .values_list('id', 'row_id', 'number', 'status', 'hold_expires_at')
+            .iterator(chunk_size=2000)
+        }
+        keys = set(stored)
+        keys.update(layout_seats(layout))
+        rows = (
+            stored.get(key) or (0, key[0], key[1], 'AVAILABLE', None)
+            for key in sorted(keys)
+        )
+        seatmap = cls.from_rows(show_id, screen or "Main", rows, version)
+        # Rows rank in layout order; rows outside the layout come after them
+        order = {row_id: r for r, row_id in enumerate(layout_rows(layout))}
+        ranked = sorted(range(len(seatmap.rows)), key=lambda r: (order.get(seatmap.rows[r], len(order)), seatmap.rows[r]))
+        for rank, r in enumerate(ranked):
+            seatmap.row_rank[r] = rank
+        return seatmap
+
+    def __len__(self):
+        return len(self.ids)
+
+    def locate(self, row_id, number):
+        """Return the array position of a seat, or None if the show has no such seat."""
+        try:
+            r = self.rows.index(row_id)
+        except ValueError:
+            return None
+        lo, hi = self.row_starts[r], self.row_starts[r + 1]
+        i = bisect_left(self.numbers, number, lo, hi)
+        if i < hi and self.numbers[i] == number:
+            return i
+        return None
+
+    def set(self, row_id, number, status, hold_expires_at=None, seat_id=None):
+        i = self.locate(row_id, number)
+        if i is None:
+            return False
+        if seat_id:
+            # A layout seat that just got its row
+            self.ids[i] = seat_id
+        self.status[i] = STATUS_CODES[status]
+        self.expires[i] = hold_expires_at.timestamp() if hold_expires_at else 0.0
+        if self.free is not None:
+            # Only the seat's row of the free-interval index changes
+            r = bisect_right(self.row_starts, i) - 1
+            self.free[r] = self._free_row(r, time.time())
+            if hold_expires_at and (not self.free_until or self.expires[i] < self.free_until):
+                self.free_until = self.expires[i]
+        return True
+
+    def grid(self, now):
+        """Yield (row_id, [(number, status), ...]) for display; a lapsed hold shows as AVAILABLE."""
+        numbers, status, expires = self.numbers, self.status, self.expires
+        for r, row_id in enumerate(self.rows):
+            seats = []
+            for i in range(self.row_starts[r], self.row_starts[r + 1]):
+                code = status[i]
+                if code == HELD and 0 < expires[i] < now:
+                    code = AVAILABLE
+                seats.append((numbers[i], STATUS_NAMES[code]))
+            yield row_id, seats
+
+    def live_stats(self, stats, now):
+        """The show's occupancy counters with lapsed holds moved to available.
+
+        The counters keep a lapsed hold as held until the expiry worker frees it;
+        the map already lists such a seat as available, so the stats follow it.
+        """
+        status, expires = self.status, self.expires
+        lapsed = 0
+        i = status.find(HELD)
+        while i != -1:
+            if 0 < expires[i] < now:
+                lapsed += 1
+            i = status.find(HELD, i + 1)
+        if not lapsed:
+            return stats
+        return {'available': stats['available'] + lapsed, 'held': stats['held'] - lapsed, 'booked': stats['booked']}
+
+    def next_expiry(self, now):
+        """Earliest hold expiry still in the future, or 0.0 if no live hold exists.
+
+        Until that instant the serialized map cannot change without a version bump.
+        """
+        upcoming = [e for e, code in zip(self.expires, self.status) if code == HELD and e >= now]
+        return min(upcoming) if upcoming else 0.0
+
+    def _free_row(self, r, now):
+        # [(first_number, last_number), ...] of the maximal runs of adjacent free seats of row r
+        numbers, status, expires = self.numbers, self.status, self.expires
+        runs = []
+        start = None
+        hi = self.row_starts[r + 1]
+        for i in range(self.row_starts[r], hi):
+            code = status[i]
+            free = code == AVAILABLE or (code == HELD and 0 < expires[i] < now)
+            if free and start is not None and numbers[i] == numbers[i - 1] + 1:
+                continue
+            if start is not None:
+                runs.append((numbers[start], numbers[i - 1]))
+            start = i if free else None
+        if start is not None:
+            runs.append((numbers[start], numbers[hi - 1]))
+        return runs
+
+    def free_runs(self, now):
+        """Yield (row_id, first_number, last_number) for every maximal run of adjacent
+        free seats. A lapsed hold counts as free, as in grid().
+
+        Runs come from a per-row free-interval index built on first use. set()
+        recomputes only the row it touches; the whole index is rebuilt only once a
+        live hold lapses, which frees seats without any set().
+        """
+        if self.free is None or (self.free_until and now >= self.free_until):
+            self.free = [self._free_row(r, now) for r in range(len(self.rows))]
+            self.free_until = self.next_expiry(now)
+        for r, runs in enumerate(self.free):
+            row_id = self.rows[r]
+            for first, last in runs:
+                yield row_id, first, last
+
+    def to_json(self, now, stats):
+        """Serialize straight to the seat_list JSON body, without per-seat dicts.
+
+        `stats` are the show's occupancy counters at this map's version; lapsed
+        holds are counted as available, like the seats themselves (live_stats).
+        """
+        parts = []
+        ids, numbers, status, expires = self.ids, self.numbers, self.status, self.expires
+        for r, row_id in enumerate(self.rows):
+            row_json = json.dumps(row_id)
+            for i in range(self.row_starts[r], self.row_starts[r + 1]):
+                code = status[i]
+                expired = code == HELD and 0 < expires[i] < now
+                parts.append(
+                    '{"id": %s, "row": %s, "number": %d, "status": "%s", "is_held_expired": %s}'
+                    % (ids[i] or 'null', row_json, numbers[i], STATUS_NAMES[code], 'true' if expired else 'false')
+                )
+        return '{"show_id": %d, "screen": %s, "version": %d, "delta": false, "stats": %s, "seats": [%s]}' % (
+            self.show_id, json.dumps(self.screen), self.version, json.dumps(self.live_stats(stats, now)), ', '.join(parts)
+        )
+
+    def to_binary(self, now, stats):
+        """Serialize to the compact seat map, a few bytes per row instead of ~90 per seat.
+
+        A 4-byte big-endian length, a JSON descriptor (show, version, `stats`, seat
+        count, encoding and each row as [row_id, [[first, last], ...]] number
+        runs), then the seat statuses in (row, number) order as 0 available,
+        1 held, 2 booked. A lapsed hold is sent as available and seat ids are
+        left out. Statuses are packed 2 bits per seat (low bits first) or, when
+        shorter, run-length encoded one byte per run: status << 6 | (length - 1).
+        """
+        codes = bytearray(self.status)
+        status, expires = self.status, self.expires
+        i = status.find(HELD)
+        while i != -1:
+            if 0 < expires[i] < now:
+                codes[i] = AVAILABLE
+            i = status.find(HELD, i + 1)
+
+        count = len(codes)
+        padded = bytes(codes) + bytes(-count % 4)
+        packed = 0
+        # Seats i, i+4, i+8... share a bit position; OR-ing the shifted slices as integers packs them bytewise
+        for k in range(4):
+            packed |= int.from_bytes(padded[k::4].translate(_SHIFTS[k]), 'big')
+        packed = packed.to_bytes(len(padded) // 4, 'big')
+        encoding, body = 'packed', packed
+        # Each status change starts a run; XOR-ing the codes with themselves one seat later
+        # counts them, so runs are only encoded when there are few enough
+        runs = 0
+        if count:
+            changed = int.from_bytes(codes[1:], 'big') ^ int.from_bytes(codes[:-1], 'big')
+            runs = count - changed.to_bytes(count - 1, 'big').count(0)
+        if runs < len(packed):
+            rle = bytearray()
+            for run in _RUNS.finditer(codes):
+                code, length = codes[run.start()], run.end() - run.start()
+                while length > 0:
+                    chunk = min(length, RLE_MAX_RUN)
+                    rle.append(code << 6 | (chunk - 1))
+                    length -= chunk
+            if len(rle) < len(packed):
+                encoding, body = 'rle', rle
+
+        rows = []
+        numbers = self.numbers
+        for r, row_id in enumerate(self.rows):
+            lo, hi = self.row_starts[r], self.row_starts[r + 1]
+            if numbers[hi - 1] - numbers[lo] == hi - lo - 1:
+                runs = [[numbers[lo], numbers[hi - 1]]]
+            else:
+                runs = []
+                for i in range(lo, hi):
+                    if runs and numbers[i] == runs[-1][1] + 1:
+                        runs[-1][1] = numbers[i]
+                    else:
+                        runs.append([numbers[i], numbers[i]])
+            rows.append([row_id, runs])
+        descriptor = json.dumps({
+            'show_id': self.show_id, 'screen': self.screen, 'version': self.version,
+            'stats': self.live_stats(stats, now), 'count': count, 'encoding': encoding, 'rows': rows,
+        }, separators=(',', ':')).encode()
+        return len(descriptor).to_bytes(4, 'big') + descriptor + bytes(body)
+
+    def delta_to_json(self, since, version, changes, now, stats):
+        """Serialize only the seats changed after `since`, from change log rows."""
+        parts = []
+        for change in changes:
+            expires = change['hold_expires_at'].timestamp() if change['hold_expires_at'] else 0.0
+            expired = change['status'] == 'HELD' and 0 < expires < now
+            parts.append(
+                '{"row": %s, "number": %d, "status": "%s", "is_held_expired": %s}'
+                % (json.dumps(change['row_id']), change['number'], change['status'], 'true' if expired else 'false')
+            )
+        return '{"show_id": %d, "screen": %s, "version": %d, "since": %d, "delta": true, "stats": %s, "seats": [%s]}' % (
+            self.show_id, json.dumps(self.screen), version, since, json.dumps(self.live_stats(stats, now)),
+            ', '.join(parts)
+        )
+
+
+_maps = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cached_seatmap(key, version):
+    with _lock:
+        seatmap = _maps.get(key)
+        if seatmap is not None and seatmap.version >= version:
+            _maps.move_to_end(key)
+            return seatmap
+    return None
+
+
+def get_seatmap(show_id, version):
+    """Return the SeatMap of a show at `version`, building it in one pass on a miss."""
+    key = int(show_id)
+    seatmap = _cached_seatmap(key, version)
+    if seatmap is not None:
+        return seatmap
+    seatmap = SeatMap.load(key, version)
+    with _lock:
+        _maps[key] = seatmap
+        _maps.move_to_end(key)
+        while len(_maps) > MAX_MAPS:
+            _maps.popitem(last=False)
+    return seatmap
+
+
+async def aget_seatmap(show_id, version):
+    # A cached map is returned without leaving the event loop; only a rebuild runs in a thread
+    seatmap = _cached_seatmap(int(show_id), version)
+    if seatmap is not None:
+        return seatmap
+    return await sync_to_async(get_seatmap)(show_id, version)
+
+
+def apply_change(show_id, version, seats, status, hold_expires_at=None):
+    """Update a cached map in place after a committed transition that produced `version`.
+
+    `seats` is an iterable of objects or dicts carrying row_id and number. The map
+    is only patched if it is exactly one version behind; otherwise another
+    transition slipped in between and the map is dropped to be rebuilt.
+    """
+    key = int(show_id)
+    with _lock:
+        seatmap = _maps.get(key)
+        if seatmap is None or seatmap.version >= version:
+            return
+        if seatmap.version != version - 1:
+            _maps.pop(key, None)
+            return
+        for seat in seats:
+            if isinstance(seat, dict):
+                seat_id, row_id, number = seat.get('id'), seat['row_id'], seat['number']
+            else:
+                seat_id, row_id, number = seat.id, seat.row_id, seat.number
+            if not seatmap.set(row_id, number, status, hold_expires_at, seat_id):
+                # Seat unknown to the cached map (e.g. added since the build): rebuild next time
+                _maps.pop(key, None)
+                return
+        seatmap.version = version
+
+
+def payload_key(show_id, binary=False):
+    return f'seatmap:payload:{int(show_id)}' + (':bin' if binary else '')
+
+
+def get_payload(show_id, version, now, stats, binary=False):
+    """Serialized seat_list body for a show as (bytes, next_expiry), cached per show.
+
+    One entry per show and representation (JSON or to_binary()) is kept in the
+    Django cache and is valid while the show is still at the same version and no
+    live hold has lapsed since it was built. `stats` are the show's occupancy
+    counters, read with `version`: both only change together.
+    """
+    key = payload_key(show_id, binary)
+    payload = _fresh_payload(cache.get(key), version, now)
+    if payload is None:
+        payload = _build_payload(get_seatmap(show_id, version), now, stats, binary)
+        cache.set(key, (version, *payload), PAYLOAD_TIMEOUT)
+    return payload
+
+
+async def aget_payload(show_id, version, now, stats, binary=False):
+    key = payload_key(show_id, binary)
+    payload = _fresh_payload(await cache.aget(key), version, now)
+    if payload is None:
+        payload = _build_payload(await aget_seatmap(show_id, version), now, stats, binary)
+        await cache.aset(key, (version, *payload), PAYLOAD_TIMEOUT)
+    return payload
+
+
+def _fresh_payload(entry, version, now):
+    if entry is not None:
+        cached_version, body, next_expiry = entry
+        if cached_version == version and (not next_expiry or now < next_expiry):
+            return body, next_expiry
+    return None
+
+
+def _build_payload(seatmap, now, stats, binary=False):
+    body = seatmap.to_binary(now, stats) if binary else seatmap.to_json(now, stats).encode()
+    return body, seatmap.next_expiry(now)
+
+
+def invalidate_payload(show_id):
+    cache.delete_many([payload_key(show_id), payload_key(show_id, binary=True)])
+
+
+def forget(show_id=None):
+    with _lock:
+        if show_id is None:
+            _maps.clear()
+        else:
+            _maps.pop(int(show_id), None)
+
+
+def touch(show_ids):
+    """Bump the seat version of shows whose seats changed outside record_transition.
+
+    Cached maps, payloads and ETags are all checked against the version, so none
+    of them is served for the old state. The bump writes no change log row:
+    delta and stream clients get a snapshot or a resync instead.
+    """
+    show_ids = list(show_ids)
+    ShowTime.objects.filter(pk__in=show_ids).update(seat_version=F('seat_version') + 1)
+
+    def drop():
+        for show_id in show_ids:
+            forget(show_id)
+            invalidate_payload(show_id)
+
+    transaction.on_commit(drop)
+
+
+@receiver(post_save, sender=Seat)
+@receiver(post_delete, sender=Seat)
+def seat_edited(sender, instance, **kwargs):
+    # The engine writes seats with UPDATE and bulk INSERT, so only edits made
+    # elsewhere (admin, shell) get here
+    touch([instance.show_time_id])
+
+
+@receiver(post_save, sender=ShowTime)
+def show_saved(sender, instance, created, **kwargs):
+    # Primary keys can be reused (e.g. SQLite after a delete) and the screen of a
+    # show can change, never serve a map built for something else
+    forget(instance.pk)
+    invalidate_payload(instance.pk)
+    if not created:
+        touch([instance.pk])
+        # A later save() of this instance must not write the old version back
+        instance.refresh_from_db(fields=['seat_version'])
+
+
+@receiver(post_delete, sender=ShowTime)
+def forget_show(sender, instance, **kwargs):
+    forget(instance.pk)
+    invalidate_payload(instance.pk)
+
+
+@receiver(post_save, sender=Screen)
+def screen_saved(sender, instance, created, **kwargs):
+    # Layout edits change every show of the screen without any seat transition
+    if not created:
+        touch(instance.shows.values_list('id', flat=True))
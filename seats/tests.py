@@ -1,16 +1,46 @@
-from django.test import TestCase, Client
+from django.test import AsyncClient, TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.urls import path
 from django.utils import timezone
+from asgiref.sync import async_to_sync, sync_to_async
+from concurrent.futures import Future
 from datetime import timedelta
-from .models import Movie, Screen, ShowTime, Seat
+from io import StringIO
+from unittest import mock
+from .models import Movie, Screen, ShowTime, Seat, layout_row_names, layout_seats
+from .allocator import hold_best_available
+from .auth import forget_users, issue_token
+from .engine import SeatConflict, book_seats, expire_holds, hold_seats, normalize_seats
+from .expiry import HoldExpiryScheduler
+from .management.commands.generate_load_data import MAX_SHOWS_PER_DAY
+from .metrics import QueryTimer
+from .occupancy import reconcile
+from .seatmap import STATUS_NAMES, SeatMap, get_seatmap, payload_key
+from .writer import Command, ShowWriter
+from . import benchmark, engine, metrics, seatmap, views, waiting_room, writer
+from .views import _bookings_query
+from decimal import Decimal
 import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
 
 class SeatBookingTests(TestCase):
     def setUp(self):
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='password123')
         self.movie = Movie.objects.create(title="Test Movie", duration_mins=120)
-        self.screen = Screen.objects.create(name="Screen 1")
+        self.screen = Screen.objects.create(name="Screen 1", layout=[{'row': 'A', 'seats': 1}])
         self.show = ShowTime.objects.create(
             movie=self.movie, 
             screen=self.screen, 
@@ -60,3 +90,1400 @@ class SeatBookingTests(TestCase):
         response = self.client.post('/api/seats/hold/', data=json.dumps(hold_data), content_type='application/json')
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['message'], 'Seat held successfully (previous hold expired)')
+
+
+class ShowTestCase(TestCase):
+    def setUp(self):
+        # Invalidation runs on commit, which a TestCase never reaches: start every test
+        # without seat maps or payloads cached by an earlier one under a reused show id
+        cache.clear()
+        seatmap.forget()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.movie = Movie.objects.create(title="Test Movie", duration_mins=120)
+        self.screen = Screen.objects.create(
+            name="Screen 1", layout=[{'row': row, 'seats': 10} for row in 'ABCDE']
+        )
+        self.show = ShowTime.objects.create(
+            movie=self.movie,
+            screen=self.screen,
+            start_time=timezone.now() + timedelta(hours=1),
+            end_time=timezone.now() + timedelta(hours=3)
+        )
+        self.client.login(username='testuser', password='password123')
+
+    def set_seat(self, row, number, show=None, **state):
+        # Seats are only stored once touched; give a layout seat the given state directly
+        Seat.objects.update_or_create(
+            show_time=show or self.show, row_id=row, number=number, defaults=state
+        )
+        # A direct edit, as in the admin: recount the show's occupancy
+        reconcile(ShowTime.objects.filter(pk=(show or self.show).pk))
+
+    def post(self, url, seats, **extra):
+        # A batch request for (row, number) pairs of this show
+        payload = {'show_id': self.show.id, 'seats': [{'row': r, 'number': n} for r, n in seats], **extra}
+        return self.client.post(url, data=json.dumps(payload), content_type='application/json')
+
+
+class BatchEngineTests(ShowTestCase):
+    def test_query_count_does_not_grow_with_batch_size(self):
+        """A 10-seat hold/book must cost the same number of statements as a 1-seat one."""
+
+        counts = []
+        for seats in ([('A', 1)], [('B', n) for n in range(1, 11)]):
+            seats_data = [{'row': r, 'number': n} for r, n in seats]
+            with CaptureQueriesContext(connection) as hold_ctx:
+                hold_seats(self.show.id, seats_data, 'testuser')
+            with CaptureQueriesContext(connection) as book_ctx:
+                book_seats(self.show.id, seats_data, 'testuser')
+            counts.append((len(hold_ctx), len(book_ctx)))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Seat.objects.filter(show_time=self.show, status='BOOKED').count(), 11)
+
+    def test_batch_hold_is_all_or_nothing_and_reports_conflicts(self):
+        for number in (2, 4):
+            self.set_seat('A', number, status='HELD', held_by='otheruser',
+                          hold_expires_at=timezone.now() + timedelta(minutes=5))
+        response = self.post('/api/seats/hold-batch/', [('A', 1), ('A', 2), ('A', 3), ('A', 4)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Seat A2 is already taken by someone else')
+        self.assertEqual(response.json()['conflicts'], ['A2', 'A4'])
+        self.assertFalse(Seat.objects.filter(show_time=self.show, row_id='A', number=1, status='HELD').exists())
+
+    def test_book_batch_requires_own_live_hold(self):
+        self.post('/api/seats/hold-batch/', [('C', 1), ('C', 2)])
+        response = self.post('/api/seats/book-batch/', [('C', 1), ('C', 3)])
+        self.assertEqual(response.json()['error'], 'Seat C3 is not held by you')
+
+        response = self.post('/api/seats/book-batch/', [('C', 1), ('C', 2)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_paid'], '200.00')
+
+
+class LazySeatTests(ShowTestCase):
+    def test_show_creation_stores_no_seats(self):
+        self.assertEqual(self.screen.capacity, 50)
+        self.assertFalse(Seat.objects.filter(show_time=self.show).exists())
+        data = self.client.get(f'/api/seats/?show_id={self.show.id}').json()
+        self.assertEqual(data['stats'], {'available': 50, 'held': 0, 'booked': 0})
+        self.assertIsNone(data['seats'][0]['id'])
+
+    def test_only_touched_seats_are_materialized(self):
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'B', 'number': 3}, {'row': 'F', 'number': 1}]}
+        response = self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.json()['error'], f'Seat F1 not found for show {self.show.id}')
+
+        payload['seats'].pop()
+        self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        single = {'show_id': self.show.id, 'row': 'C', 'number': 7}
+        self.client.post('/api/seats/hold/', data=json.dumps(single), content_type='application/json')
+        self.assertEqual(
+            sorted(Seat.objects.filter(show_time=self.show).values_list('row_id', 'number', 'status')),
+            [('B', 3, 'HELD'), ('C', 7, 'HELD')]
+        )
+
+        single['number'] = 8
+        response = self.client.post('/api/seats/book/', data=json.dumps(single), content_type='application/json')
+        self.assertEqual(response.json()['error'], 'You must hold the seat before booking')
+        self.assertEqual(Seat.objects.filter(show_time=self.show).count(), 2)
+
+    def test_seats_are_materialized_in_key_order(self):
+        # Overlapping batches sent in different orders must insert (and so wait on) keys in one order
+        with mock.patch.object(Seat.objects, 'bulk_create', wraps=Seat.objects.bulk_create) as bulk_create:
+            hold_seats(self.show.id, [{'row': r, 'number': n} for r, n in (('C', 2), ('A', 5), ('C', 1), ('B', 9))],
+                       'testuser')
+        inserted = [(seat.row_id, seat.number) for seat in bulk_create.call_args.args[0]]
+        self.assertEqual(inserted, [('A', 5), ('B', 9), ('C', 1), ('C', 2)])
+
+    def test_screens_and_shows_without_a_layout_get_the_standard_grid(self):
+        hall = Screen.objects.create(name="Hall 2")
+        shows = [
+            ShowTime.objects.create(movie=self.movie, screen=screen, start_time=self.show.start_time,
+                                    end_time=self.show.end_time)
+            for screen in (hall, None)
+        ]
+        self.assertEqual(hall.capacity, 50)
+        for show in shows:
+            data = self.client.get(f'/api/seats/?show_id={show.id}').json()
+            self.assertEqual(data['stats'], {'available': 50, 'held': 0, 'booked': 0})
+            payload = {'show_id': show.id, 'seats': [{'row': 'E', 'number': 10}]}
+            response = self.client.post('/api/seats/hold-batch/', data=json.dumps(payload),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            show.refresh_from_db()
+            self.assertEqual((show.seats_available, show.seats_held), (49, 1))
+
+
+class SeatMapTests(ShowTestCase):
+    def test_seat_list_matches_seat_table(self):
+        self.set_seat('A', 1, status='BOOKED', held_by='x')
+        self.set_seat('A', 2, status='HELD', held_by='x', hold_expires_at=timezone.now() - timedelta(minutes=1))
+        data = self.client.get(f'/api/seats/?show_id={self.show.id}').json()
+        self.assertEqual(data['screen'], 'Screen 1')
+        # The counters still hold A2, but the stats list its lapsed hold as available
+        self.assertEqual(data['stats'], {'available': 49, 'held': 0, 'booked': 1})
+        self.show.refresh_from_db()
+        self.assertEqual((self.show.seats_available, self.show.seats_held), (48, 1))
+        self.assertEqual(len(data['seats']), 50)
+        self.assertEqual(data['seats'][0]['status'], 'BOOKED')
+        self.assertTrue(data['seats'][1]['is_held_expired'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            expire_holds()
+        data = self.client.get(f'/api/seats/?show_id={self.show.id}').json()
+        self.assertEqual(data['stats'], {'available': 49, 'held': 0, 'booked': 1})
+        self.assertEqual([s['number'] for s in data['seats'][:10]], list(range(1, 11)))
+
+    def test_map_is_updated_in_place_on_hold(self):
+        self.client.get(f'/api/seats/?show_id={self.show.id}')
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'B', 'number': 5}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        # Only the version lookup: the cached map was patched in place
+        with self.assertNumQueries(1):
+            data = self.client.get(f'/api/seats/?show_id={self.show.id}').json()
+        self.assertEqual(data['stats']['held'], 1)
+        self.assertEqual(data['seats'][14]['status'], 'HELD')
+
+
+class ConditionalSeatListTests(ShowTestCase):
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(f'/api/seats/?show_id={self.show.id}', **headers)
+
+    def test_unchanged_map_is_answered_with_304_without_touching_seats(self):
+        etag = self.get()['ETag']
+        with self.assertNumQueries(1):
+            response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_transitions_change_the_etag(self):
+        etag = self.get()['ETag']
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'A', 'number': 3}]}
+        self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stats']['held'], 1)
+
+        etag = response['ETag']
+        self.client.post('/api/seats/release-hold-batch/', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_edits_outside_the_engine_change_the_etag(self):
+        response = self.get()
+        version = response.json()['version']
+        # Saved directly, as the admin or a shell would
+        with self.captureOnCommitCallbacks(execute=True):
+            Seat.objects.create(show_time=self.show, row_id='A', number=1, status='BOOKED', held_by='x')
+        response = self.get(response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['seats'][0]['status'], 'BOOKED')
+        # The change log has no row for that version: a delta client gets a snapshot
+        delta = self.client.get(f'/api/seats/?show_id={self.show.id}&since={version}').json()
+        self.assertFalse(delta['delta'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.screen.layout = [{'row': 'A', 'seats': 4}]
+            self.screen.save()
+        response = self.get(response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['seats']), 4)
+
+        other = Screen.objects.create(name='Screen 2', layout=[{'row': 'Z', 'seats': 2}])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.show.screen = other
+            self.show.save()
+            self.show.save()  # a second save keeps the bumped version
+        response = self.get(response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['screen'], 'Screen 2')
+        self.assertEqual(response.json()['version'], ShowTime.objects.get(pk=self.show.pk).seat_version)
+
+    def test_etag_lapses_with_the_earliest_hold(self):
+        self.set_seat('A', 1, status='HELD', held_by='x',
+                      hold_expires_at=timezone.now() + timedelta(milliseconds=50))
+        etag = self.get()['ETag']
+        time.sleep(0.1)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['seats'][0]['is_held_expired'])
+
+    def test_cleanup_holds_bumps_version(self):
+        self.set_seat('A', 1, status='HELD', held_by='x', hold_expires_at=timezone.now() - timedelta(minutes=1))
+        self.show.refresh_from_db()
+        version = self.show.seat_version
+        call_command('cleanup_holds', stdout=StringIO())
+        self.show.refresh_from_db()
+        self.assertEqual(self.show.seat_version, version + 1)
+        self.assertEqual(Seat.objects.get(show_time=self.show, row_id='A', number=1).status, 'AVAILABLE')
+
+
+class SeatStreamTests(ShowTestCase):
+    def test_stream_requires_asgi(self):
+        response = self.client.get(f'/api/seats/stream/?show_id={self.show.id}')
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_rejects_a_bad_show_id(self):
+        for query in ('', '?show_id=abc', '?show_id=-1'):
+            response = await AsyncClient().get(f'/api/seats/stream/{query}')
+            self.assertEqual(response.status_code, 400)
+
+    async def test_stream_pushes_committed_transitions(self):
+        response = await AsyncClient().get(f'/api/seats/stream/?show_id={self.show.id}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = response.streaming_content
+        self.assertIn('event: hello', (await anext(frames)).decode())
+
+        def hold():
+            with self.captureOnCommitCallbacks(execute=True):
+                hold_seats(self.show.id, [{'row': 'D', 'number': 4}], 'testuser')
+        await sync_to_async(hold)()
+
+        frame = (await anext(frames)).decode()
+        self.assertIn('event: held', frame)
+        data = json.loads(frame.split('data: ', 1)[1])
+        self.assertEqual(data['seats'], [{'row': 'D', 'number': 4}])
+        self.assertEqual(data['version'], 1)
+        await frames.aclose()
+
+
+class SeatDeltaTests(ShowTestCase):
+    def get(self, since):
+        return self.client.get(f'/api/seats/?show_id={self.show.id}&since={since}').json()
+
+    def test_delta_returns_only_changed_seats(self):
+        version = self.client.get(f'/api/seats/?show_id={self.show.id}').json()['version']
+        self.post('/api/seats/hold-batch/', [('A', 1), ('A', 2)])
+        self.post('/api/seats/book-batch/', [('A', 1)])
+
+        data = self.get(version)
+        self.assertTrue(data['delta'])
+        self.assertEqual(data['version'], version + 2)
+        self.assertEqual(
+            [(s['row'], s['number'], s['status']) for s in data['seats']],
+            [('A', 1, 'BOOKED'), ('A', 2, 'HELD')]
+        )
+        self.assertEqual(data['stats'], {'available': 48, 'held': 1, 'booked': 1})
+        self.assertEqual(self.get(data['version'])['seats'], [])
+
+    def test_compacted_log_falls_back_to_snapshot(self):
+        self.post('/api/seats/hold-batch/', [('A', 1)])
+        self.post('/api/seats/hold-batch/', [('A', 2)])
+        call_command('compact_seat_changes', keep=1, stdout=StringIO())
+
+        self.assertTrue(self.get(1)['delta'])
+        data = self.get(0)
+        self.assertFalse(data['delta'])
+        self.assertEqual(len(data['seats']), 50)
+
+
+class HoldExpirySchedulerTests(ShowTestCase):
+    def hold(self, number, expires_in):
+        self.set_seat('A', number, status='HELD', held_by='x', hold_expires_at=timezone.now() + expires_in)
+
+    def test_releases_holds_in_deadline_order(self):
+        self.hold(1, timedelta(minutes=1))
+        self.hold(2, timedelta(minutes=5))
+        scheduler = HoldExpiryScheduler(batch_size=1, poll_interval=5)
+        self.assertEqual(scheduler.recover(), 2)
+        self.assertEqual(scheduler.seconds_until_next(), 5)
+
+        released = scheduler.release_due(timezone.now() + timedelta(minutes=2))
+        self.assertEqual(released, 1)
+        self.assertEqual(Seat.objects.get(show_time=self.show, row_id='A', number=1).status, 'AVAILABLE')
+        self.assertEqual(Seat.objects.get(show_time=self.show, row_id='A', number=2).status, 'HELD')
+        self.assertEqual(len(scheduler), 1)
+
+    def test_stale_deadlines_do_not_release_extended_holds(self):
+        self.hold(1, timedelta(minutes=1))
+        scheduler = HoldExpiryScheduler()
+        scheduler.recover()
+        self.hold(1, timedelta(minutes=10))
+        self.assertEqual(scheduler.pick_up_new_holds(), 1)
+
+        self.assertEqual(scheduler.release_due(timezone.now() + timedelta(minutes=2)), 0)
+        self.assertEqual(scheduler.release_due(timezone.now() + timedelta(minutes=11)), 1)
+
+
+class SeatPayloadCacheTests(ShowTestCase):
+    def get(self):
+        return self.client.get(f'/api/seats/?show_id={self.show.id}')
+
+    def test_repeated_reads_are_served_from_the_cache(self):
+        first = self.get().content
+        seatmap.forget()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get().content, first)
+
+    def test_transitions_invalidate_the_cached_payload(self):
+        self.get()
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'E', 'number': 10}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        self.assertIsNone(cache.get(payload_key(self.show.id)))
+        self.assertEqual(self.get().json()['stats']['held'], 1)
+
+
+def decode_seat_map(body):
+    """[(row, number, status)] and the descriptor of a compact seat map (SeatMap.to_binary)."""
+    length = int.from_bytes(body[:4], 'big')
+    header = json.loads(body[4:4 + length])
+    data = body[4 + length:]
+    if header['encoding'] == 'rle':
+        codes = [byte >> 6 for byte in data for _ in range((byte & 63) + 1)]
+    else:
+        codes = [(data[i >> 2] >> ((i & 3) * 2)) & 3 for i in range(header['count'])]
+    numbers = [(row, n) for row, runs in header['rows'] for first, last in runs for n in range(first, last + 1)]
+    return [(row, n, STATUS_NAMES[code]) for (row, n), code in zip(numbers, codes, strict=True)], header
+
+
+class CompactSeatMapTests(ShowTestCase):
+    def get(self, accept=None, etag=None, show=None, query=''):
+        headers = {}
+        if accept:
+            headers['HTTP_ACCEPT'] = accept
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get(f'/api/seats/?show_id={(show or self.show).id}{query}', **headers)
+
+    def as_json(self, response):
+        return [(s['row'], s['number'], 'AVAILABLE' if s['is_held_expired'] else s['status'])
+                for s in response.json()['seats']]
+
+    def test_json_stays_the_default(self):
+        for accept in (None, '*/*', 'application/json', 'application/vnd.seatmap;q=0, application/json'):
+            response = self.get(accept)
+            self.assertEqual(response['Content-Type'], 'application/json', accept)
+            self.assertIn('Accept', response['Vary'])
+
+    def test_compact_map_decodes_to_the_json_one(self):
+        self.set_seat('A', 1, status='BOOKED', held_by='x')
+        self.set_seat('A', 2, status='HELD', held_by='x', hold_expires_at=timezone.now() - timedelta(minutes=1))
+        self.set_seat('C', 7, status='HELD', held_by='x', hold_expires_at=timezone.now() + timedelta(minutes=5))
+        # A stored seat outside the layout splits its row into two number runs
+        self.set_seat('E', 14, status='BOOKED', held_by='x')
+        response = self.get('application/vnd.seatmap, application/json;q=0.9')
+        self.assertEqual(response['Content-Type'], 'application/vnd.seatmap')
+        seats, header = decode_seat_map(response.content)
+        self.assertEqual(seats, self.as_json(self.get()))
+        # The lapsed hold on A2 is counted as available, like the seat itself
+        self.assertEqual(header['stats'], {'available': 48, 'held': 1, 'booked': 2})
+        self.assertEqual(header['rows'][-1], ['E', [[1, 10], [14, 14]]])
+        # Long runs of free seats: run-length encoded
+        self.assertEqual(header['encoding'], 'rle')
+
+        for number in range(1, 11, 2):
+            for row in 'ABCDE':
+                self.set_seat(row, number, status='BOOKED', held_by='x')
+        ShowTime.objects.filter(pk=self.show.pk).update(seat_version=F('seat_version') + 1)
+        seats, header = decode_seat_map(self.get('application/vnd.seatmap').content)
+        self.assertEqual(header['encoding'], 'packed')
+        self.assertEqual(seats, self.as_json(self.get()))
+
+    def test_arena_map_is_an_order_of_magnitude_smaller(self):
+        rng = random.Random(1)
+        screen = Screen.objects.create(name="Arena", layout=[{'row': f'R{r:02d}', 'seats': 50} for r in range(40)])
+        show = ShowTime.objects.create(movie=self.movie, screen=screen, start_time=timezone.now() + timedelta(hours=1),
+                                       end_time=timezone.now() + timedelta(hours=3))
+        Seat.objects.bulk_create(
+            Seat(show_time=show, row_id=f'R{r:02d}', number=n, status=rng.choice(['HELD', 'BOOKED']), held_by='x',
+                 hold_expires_at=timezone.now() + timedelta(minutes=5))
+            for r in range(40) for n in range(1, 51) if rng.random() < 0.5
+        )
+        full = self.get(show=show)
+        compact = self.get('application/vnd.seatmap', show=show)
+        self.assertEqual(decode_seat_map(compact.content)[0], self.as_json(full))
+        self.assertLess(len(compact.content) * 10, len(full.content))
+
+    def test_each_representation_has_its_own_etag(self):
+        binary = 'application/vnd.seatmap'
+        json_etag, binary_etag = self.get()['ETag'], self.get(binary)['ETag']
+        self.assertNotEqual(json_etag, binary_etag)
+        self.assertEqual(self.get(binary, binary_etag).status_code, 304)
+        self.assertEqual(self.get(binary, json_etag).status_code, 200)
+        self.assertEqual(self.get(etag=binary_etag).status_code, 200)
+
+        # Deltas are JSON whatever the client accepts
+        delta = self.get(binary, query='&since=0')
+        self.assertEqual(delta['Content-Type'], 'application/json')
+
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'B', 'number': 2}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        response = self.get(binary, binary_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode_seat_map(response.content)[1]['stats']['held'], 1)
+
+
+class ShowCatalogTests(ShowTestCase):
+    def test_listing_is_cached_until_the_catalog_changes(self):
+        shows = self.client.get('/api/seats/shows/').json()['shows']
+        self.assertEqual([s['movie'] for s in shows], ['Test Movie'])
+        with self.assertNumQueries(0):
+            self.client.get('/api/seats/shows/')
+
+        self.movie.title = 'Renamed'
+        self.movie.save()
+        shows = self.client.get('/api/seats/shows/').json()['shows']
+        self.assertEqual(shows[0]['movie'], 'Renamed')
+
+    def test_date_filter_uses_a_start_time_range(self):
+        tomorrow = (self.show.start_time + timedelta(days=1)).date()
+        today = self.show.start_time.date()
+        self.assertEqual(len(self.client.get(f'/api/seats/shows/?date={today}').json()['shows']), 1)
+        self.assertEqual(self.client.get(f'/api/seats/shows/?date={tomorrow}').json()['shows'], [])
+
+
+class MyBookingsTests(ShowTestCase):
+    def setUp(self):
+        super().setUp()
+        later = ShowTime.objects.create(
+            movie=self.movie,
+            screen=self.screen,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=2)
+        )
+        for show in (self.show, later):
+            for number in (1, 2, 3):
+                self.set_seat('A', number, show=show, status='BOOKED', held_by='testuser')
+
+    def test_pages_follow_the_cursor_with_constant_queries(self):
+        seen = []
+        cursor = ''
+        while True:
+            with self.assertNumQueries(3):  # session, user, bookings page
+                data = self.client.get(f'/api/seats/my-bookings/?limit=4&cursor={cursor}').json()
+            seen += [(b['movie'], b['start_time'], b['row'], b['number']) for b in data['bookings']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+        self.assertGreater(seen[0][1], seen[-1][1])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/seats/my-bookings/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_pages_are_read_in_index_order(self):
+        later = ShowTime.objects.latest('start_time')
+        for after in (None, (later.start_time, Seat.objects.latest('id').id)):
+            sql, params = _bookings_query('testuser', 4, after).query.sql_with_params()
+            (_, plan), = explain_seat_queries([(sql, params)])
+            self.assertIn('seat_user_booking_idx', plan)
+            # Neither a scan of the user's bookings nor a sort of them
+            self.assertNotIn('TEMP B-TREE', plan)
+            self.assertNotRegex(plan, ScalingTests.SEQ_SCAN)
+
+    def test_rescheduled_shows_move_their_bookings(self):
+        later = ShowTime.objects.latest('start_time')
+        later.start_time = self.show.start_time - timedelta(days=1)
+        later.save()
+        self.assertEqual(Seat.objects.filter(show_time=later, show_start_time=later.start_time).count(), 3)
+        bookings = self.client.get('/api/seats/my-bookings/').json()['bookings']
+        self.assertEqual(bookings[-1]['start_time'][:19], later.start_time.isoformat()[:19])
+
+
+class SignedTicketTests(ShowTestCase):
+    def book(self, seats):
+        payload = {'show_id': self.show.id, 'seats': [{'row': r, 'number': n} for r, n in seats]}
+        self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        return self.client.post('/api/seats/book-batch/', data=json.dumps(payload), content_type='application/json')
+
+    def test_booking_issues_tokens_verified_without_the_database(self):
+        token = self.book([('B', 2)]).json()['tickets'][0]['token']
+        with self.assertNumQueries(0):
+            response = Client().get('/api/seats/tickets/verify/', {'token': token, 'show_id': self.show.id})
+        self.assertTrue(response.json()['valid'])
+        self.assertEqual(response.json()['ticket']['seat'], 'B2')
+        self.assertEqual(response.json()['ticket']['price'], '100.00')
+
+        response = Client().get('/api/seats/tickets/verify/', {'token': token[:-2] + 'xx'})
+        self.assertEqual(response.status_code, 400)
+        response = Client().get('/api/seats/tickets/verify/', {'token': token, 'show_id': self.show.id + 1})
+        self.assertFalse(response.json()['valid'])
+
+    def test_single_seat_booking_issues_a_token(self):
+        seat = {'show_id': self.show.id, 'row': 'B', 'number': 5}
+        self.client.post('/api/seats/hold/', data=json.dumps(seat), content_type='application/json')
+        response = self.client.post('/api/seats/book/', data=json.dumps(seat), content_type='application/json')
+        ticket = response.json()['ticket']
+        self.assertEqual(ticket['id'], Seat.objects.get(show_time=self.show, row_id='B', number=5).id)
+        self.assertEqual(ticket['seat'], 'B5')
+        verified = Client().get('/api/seats/tickets/verify/', {'token': ticket['token'], 'show_id': self.show.id})
+        self.assertTrue(verified.json()['valid'])
+        self.assertEqual(verified.json()['ticket']['price'], '100.00')
+
+    def test_get_ticket_is_a_single_query(self):
+        seat_id = self.book([('B', 3)]).json()['tickets'][0]['id']
+        # A bearer token's user is cached, so only the ticket itself is read
+        bearer = {'HTTP_AUTHORIZATION': f'Bearer {issue_token(self.user)}'}
+        Client().get(f'/api/seats/booking/{seat_id}/ticket/', **bearer)
+        with self.assertNumQueries(1):
+            ticket = Client().get(f'/api/seats/booking/{seat_id}/ticket/', **bearer).json()['ticket']
+        self.assertEqual(ticket['seat'], 'B3')
+        self.assertTrue(ticket['token'])
+
+    def test_only_the_holder_and_staff_get_the_gate_token(self):
+        seat_id = self.book([('B', 4)]).json()['tickets'][0]['id']
+        url = f'/api/seats/booking/{seat_id}/ticket/'
+        anonymous = Client().get(url).json()['ticket']
+        self.assertEqual(anonymous['seat'], 'B4')
+        self.assertNotIn('token', anonymous)
+
+        other = Client()
+        other.force_login(User.objects.create_user(username='other', password='x'))
+        self.assertNotIn('token', other.get(url).json()['ticket'])
+
+        staff = Client()
+        staff.force_login(User.objects.create_user(username='staff', password='x', is_staff=True))
+        self.assertIn('token', staff.get(url).json()['ticket'])
+
+
+class ScheduleImportTests(ShowTestCase):
+    def run_import(self, content, suffix, **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f:
+            f.write(content)
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command('import_schedule', f.name, stdout=out, **options)
+        return out.getvalue()
+
+    def test_csv_import_in_chunks_creates_no_seats(self):
+        start = timezone.now() + timedelta(days=2)
+        lines = ['movie,duration_mins,screen,layout,start_time,price']
+        for i in range(5):
+            lines.append(f'"Dune",150,Hall 9,"A:8,B:8",{(start + timedelta(hours=3 * i)).isoformat()},250')
+        lines.append(f'Test Movie,,Screen 1,,{start.isoformat()},')
+        out = self.run_import('\n'.join(lines) + '\n', '.csv', batch_size=2)
+
+        self.assertIn('Imported 6 shows, 1 new movies and 1 new screens', out)
+        self.assertEqual(out.count('shows/s'), 3)
+        dune = ShowTime.objects.filter(movie__title='Dune')
+        self.assertEqual(dune.count(), 5)
+        self.assertEqual(dune.first().screen.capacity, 16)
+        self.assertEqual(str(dune.first().base_price), '250.00')
+        self.assertEqual(dune.first().end_time - dune.first().start_time, timedelta(minutes=150))
+        self.assertEqual(Seat.objects.count(), 0)
+        titles = [s['movie'] for s in self.client.get('/api/seats/shows/').json()['shows']]
+        self.assertEqual(titles.count('Dune'), 5)
+
+        # No layout given for a new screen: the standard grid
+        self.run_import(f'movie,screen,start_time\nDune,Hall 10,{start.isoformat()}\n', '.csv')
+        self.assertEqual(Screen.objects.get(name='Hall 10').capacity, 50)
+
+    def test_shows_without_a_screen_start_with_the_default_grid_available(self):
+        self.run_import('movie,start_time\nTest Movie,2030-01-01T18:00:00\n', '.csv')
+        show = ShowTime.objects.get(screen=None)
+        self.assertEqual((show.seats_available, show.seats_held, show.seats_booked), (50, 0, 0))
+        self.assertEqual(reconcile(), 0)
+        data = self.client.get(f'/api/seats/?show_id={show.id}').json()
+        self.assertEqual(data['stats'], {'available': 50, 'held': 0, 'booked': 0})
+        self.assertEqual(len(data['seats']), 50)
+
+    def test_bad_jsonl_row_names_the_line(self):
+        rows = [
+            {'movie': 'Test Movie', 'start_time': '2030-01-01T18:00:00'},
+            {'movie': 'Unknown', 'start_time': '2030-01-01T21:00:00'},
+        ]
+        with self.assertRaisesMessage(CommandError, 'Line 2: new movie'):
+            self.run_import('\n'.join(json.dumps(r) for r in rows), '.jsonl')
+        self.assertEqual(ShowTime.objects.count(), 1)
+
+
+class LoadDataGeneratorTests(TestCase):
+    def generate(self, **options):
+        params = dict(screens=2, seats_per_screen=25, seats_per_row=10, shows_per_day=2, days=2,
+                      users=5, sold=0.4, held=0.1, seed=7, clear=True)
+        params.update(options)
+        call_command('generate_load_data', stdout=StringIO(), **params)
+        return sorted(Seat.objects.values_list(
+            'show_time__screen__name', 'show_time__start_time', 'row_id', 'number', 'status', 'held_by'
+        ))
+
+    def test_same_seed_gives_same_dataset(self):
+        first = self.generate()
+        self.assertEqual(ShowTime.objects.count(), 8)
+        self.assertEqual(Screen.objects.get(name='Load Screen 0').capacity, 25)
+        self.assertEqual(User.objects.filter(username__startswith='load_user_').count(), 5)
+        self.assertTrue(first)
+        self.assertTrue(all(status in ('BOOKED', 'HELD') for *_, status, _ in first))
+        # Counters are recounted after the bulk insert
+        self.assertEqual(reconcile(), 0)
+        self.assertEqual(sum(ShowTime.objects.values_list('seats_booked', flat=True)),
+                         sum(1 for *_, status, _ in first if status == 'BOOKED'))
+
+        self.assertEqual(self.generate(), first)
+        self.assertNotEqual(self.generate(seed=8), first)
+
+    def test_materialize_stores_every_seat(self):
+        self.generate(materialize=True)
+        self.assertEqual(Seat.objects.count(), 8 * 25)
+
+    def test_shows_end_by_midnight(self):
+        self.generate(shows_per_day=MAX_SHOWS_PER_DAY)
+        for start, end in ShowTime.objects.values_list('start_time', 'end_time'):
+            self.assertEqual(timezone.localtime(end).date(), timezone.localtime(start).date())
+        with self.assertRaisesMessage(CommandError, '--shows-per-day'):
+            self.generate(shows_per_day=MAX_SHOWS_PER_DAY + 1)
+
+
+class BenchmarkTests(TestCase):
+    def test_percentiles_use_nearest_rank(self):
+        samples = list(range(1, 101))
+        self.assertEqual([benchmark.percentile(samples, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertIsNone(benchmark.percentile([], 50))
+
+    def test_in_process_run_reports_every_endpoint_and_cleans_up(self):
+        report = benchmark.run(profile='spread', workers=1, iterations=3, shows=2)
+        json.dumps(report)
+        self.assertEqual(list(report['endpoints']), list(benchmark.ENDPOINTS))
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['requests'], 3, name)
+            self.assertEqual(result['status'], {'200': 3}, name)
+            self.assertIsNotNone(result['latency_ms']['p99'], name)
+            self.assertGreater(result['queries_per_request'], 0, name)
+        self.assertFalse(ShowTime.objects.exists())
+        self.assertFalse(User.objects.filter(username__startswith='bench_user_').exists())
+
+    def test_command_refuses_oversized_runs_and_shared_databases(self):
+        with self.assertRaisesMessage(CommandError, 'seats per show'):
+            call_command('benchmark', workers=100, iterations=100)
+        with override_settings(DATABASE_URL='postgres://db.example.com/seats'):
+            with self.assertRaisesMessage(CommandError, '--allow-database-writes'):
+                call_command('benchmark', workers=1, iterations=1)
+        self.assertFalse(User.objects.filter(username__startswith='bench_user_').exists())
+
+
+class BestAvailableTests(ShowTestCase):
+    def hold_best(self, count):
+        payload = {'show_id': self.show.id, 'count': count}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/seats/hold-best/', data=json.dumps(payload), content_type='application/json')
+
+    def test_free_runs_split_on_taken_seats(self):
+        self.set_seat('C', 4, status='BOOKED', held_by='x')
+        self.set_seat('C', 5, status='HELD', held_by='x', hold_expires_at=timezone.now() - timedelta(minutes=1))
+        runs = [run for run in SeatMap.load(self.show.id).free_runs(timezone.now().timestamp()) if run[0] == 'C']
+        self.assertEqual(runs, [('C', 1, 3), ('C', 5, 10)])
+
+    def test_holds_a_centred_block_in_the_preferred_row(self):
+        response = self.hold_best(4)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(s['row'], s['number']) for s in response.json()['seats']],
+            [('C', 4), ('C', 5), ('C', 6), ('C', 7)]
+        )
+        # The next party gets the next best block instead of a conflict
+        response = self.hold_best(4)
+        self.assertEqual([s['row'] for s in response.json()['seats']], ['D'] * 4)
+        self.assertEqual(Seat.objects.filter(show_time=self.show, status='HELD').count(), 8)
+
+    def test_skips_blocks_lost_since_the_snapshot(self):
+        get_seatmap(self.show.id, 0)
+        # Taken behind the cached map's back: no version bump, so the map still shows it free
+        self.set_seat('C', 5, status='BOOKED', held_by='x')
+        seats, _ = hold_best_available(self.show.id, 2, 'testuser')
+        self.assertNotIn(('C', 5), [(s['row_id'], s['number']) for s in seats])
+        self.assertEqual(len(seats), 2)
+
+    def test_reports_when_no_block_fits(self):
+        response = self.hold_best(11)
+        self.assertEqual(response.status_code, 400)
+        for number in range(1, 11, 2):
+            for row in 'ABCDE':
+                self.set_seat(row, number, status='BOOKED', held_by='x')
+        response = self.hold_best(2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'No block of 2 adjacent seats is available')
+
+    def test_rows_rank_in_layout_order(self):
+        # Stored sorted, 'AA'..'AD' would come before 'B'; the preferred row is counted front to back
+        self.screen.layout = [{'row': row, 'seats': 10} for row in layout_row_names(30)]
+        self.screen.save()
+        response = self.hold_best(2)
+        self.assertEqual([s['row'] for s in response.json()['seats']], ['R', 'R'])
+
+    def test_free_interval_index_is_updated_row_by_row(self):
+        seat_map = SeatMap.load(self.show.id)
+        now = timezone.now()
+        list(seat_map.free_runs(now.timestamp()))
+        with mock.patch.object(SeatMap, '_free_row', autospec=True, side_effect=SeatMap._free_row) as free_row:
+            seat_map.set('B', 5, 'HELD', now + timedelta(minutes=10))
+            runs = [run for run in seat_map.free_runs(now.timestamp()) if run[0] == 'B']
+        self.assertEqual(free_row.call_count, 1)
+        self.assertEqual(runs, [('B', 1, 4), ('B', 6, 10)])
+        # Once the hold lapses its seat is free again, with no set() to tell the index
+        later = (now + timedelta(minutes=11)).timestamp()
+        self.assertEqual([run for run in seat_map.free_runs(later) if run[0] == 'B'], [('B', 1, 10)])
+
+    def test_new_rows_are_committed_before_the_claim(self):
+        def lose_claim(*args):
+            transaction.set_rollback(True)
+
+        with mock.patch.object(engine, '_claim_block', side_effect=lose_claim):
+            self.assertIsNone(engine.try_hold_block(self.show.id, [('A', 1), ('A', 2)], 'testuser'))
+        # The claim's rollback does not undo the INSERT it would otherwise have waited on
+        self.assertEqual(Seat.objects.filter(show_time=self.show, status='AVAILABLE').count(), 2)
+
+
+@override_settings(SEAT_CONCURRENCY='optimistic')
+class OptimisticConcurrencyTests(ShowTestCase):
+    def test_transitions_bump_the_seat_version(self):
+        self.post('/api/seats/hold-batch/', [('A', 1)])
+        self.post('/api/seats/book-batch/', [('A', 1)])
+        seat = Seat.objects.get(show_time=self.show, row_id='A', number=1)
+        self.assertEqual((seat.status, seat.version), ('BOOKED', 2))
+
+    def test_seat_changed_after_the_read_fails_the_whole_batch(self):
+        read = engine.lock_seats
+
+        def read_then_lose_race(show_id, keys):
+            found = read(show_id, keys)
+            # Another request holds A2 between our read and our update
+            Seat.objects.filter(show_time=self.show, row_id='A', number=2).update(
+                status='HELD', held_by='otheruser', version=F('version') + 1,
+                hold_expires_at=timezone.now() + timedelta(minutes=5),
+            )
+            return found
+
+        with mock.patch.object(engine, 'lock_seats', read_then_lose_race):
+            response = self.post('/api/seats/hold-batch/', [('A', 1), ('A', 2)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['conflicts'], ['A2'])
+        # Nothing of the batch is kept (the simulated race shares our transaction, so it goes too)
+        self.assertFalse(Seat.objects.filter(show_time=self.show, held_by='testuser').exists())
+
+    def test_no_double_booking_from_stale_reads(self):
+        User.objects.create_user(username='otheruser', password='x')
+        hold_seats(self.show.id, [{'row': 'B', 'number': 1}], 'testuser')
+        with self.assertRaises(SeatConflict):
+            hold_seats(self.show.id, [{'row': 'B', 'number': 1}], 'otheruser')
+        book_seats(self.show.id, [{'row': 'B', 'number': 1}], 'testuser')
+        with self.assertRaises(SeatConflict):
+            book_seats(self.show.id, [{'row': 'B', 'number': 1}], 'otheruser')
+        self.assertEqual(Seat.objects.filter(show_time=self.show, status='BOOKED').count(), 1)
+
+
+class SingleWriterTests(ShowTestCase):
+    def command(self, kind, seats, username='testuser'):
+        return Command(kind, normalize_seats([{'row': r, 'number': n} for r, n in seats]), username)
+
+    def test_batch_is_applied_in_order_and_committed_together(self):
+        show_writer = ShowWriter(self.show.id)
+        batch = [
+            self.command('hold', [('A', 1), ('A', 2)]),
+            self.command('hold', [('A', 2), ('A', 3)], 'otheruser'),
+            self.command('book', [('A', 1), ('A', 2)]),
+            self.command('hold', [('A', 3)], 'otheruser'),
+            self.command('release', [('A', 3)], 'otheruser'),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            show_writer.process(batch)
+
+        seats, expires_at = batch[0].future.result(0)
+        self.assertEqual([s['number'] for s in seats], [1, 2])
+        self.assertEqual(batch[1].future.exception(0).conflicts, ['A2'])
+        self.assertEqual(batch[2].future.result(0)[1], Decimal('200.00'))
+        self.assertEqual(batch[4].future.result(0), 1)
+        self.assertEqual(
+            sorted(Seat.objects.filter(show_time=self.show).values_list('row_id', 'number', 'status')),
+            [('A', 1, 'BOOKED'), ('A', 2, 'BOOKED'), ('A', 3, 'AVAILABLE')]
+        )
+        self.show.refresh_from_db()
+        self.assertEqual(self.show.seat_version, 4)
+        self.assertEqual(show_writer.version, 4)
+
+    def test_writes_made_elsewhere_are_respected(self):
+        show_writer = ShowWriter(self.show.id)
+        show_writer.process([self.command('hold', [('B', 1)])])
+        # Booked behind the writer's back, without a version bump
+        Seat.objects.filter(show_time=self.show, row_id='B', number=1).update(status='BOOKED', held_by='x')
+        late = self.command('book', [('B', 1)])
+        show_writer.process([late])
+        self.assertIsInstance(late.future.exception(0), SeatConflict)
+        self.assertFalse(show_writer.loaded)
+        self.assertEqual(Seat.objects.get(show_time=self.show, row_id='B', number=1).held_by, 'x')
+
+    def test_views_route_hot_shows_to_the_writer(self):
+        self.show.single_writer = True
+        self.show.save()
+        done = Future()
+        done.set_result(([{'row_id': 'C', 'number': 1}], timezone.now()))
+        with mock.patch.object(writer, 'submit', return_value=done) as submit:
+            payload = {'show_id': self.show.id, 'seats': [{'row': 'C', 'number': 1}]}
+            response = self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        submit.assert_called_once_with(self.show.id, 'hold', payload['seats'], 'testuser')
+
+        booked = Future()
+        booked.set_result(([{'id': 1, 'row_id': 'C', 'number': 1, 'price': Decimal('100.00')}], Decimal('100.00')))
+        # Single-seat and best-available requests too: the writer is the show's only writer
+        for url, payload, kind, result in (
+            ('/api/seats/hold/', {'show_id': self.show.id, 'row': 'C', 'number': 1}, 'hold', done),
+            ('/api/seats/book/', {'show_id': self.show.id, 'row': 'C', 'number': 1}, 'book', booked),
+            ('/api/seats/hold-best/', {'show_id': self.show.id, 'count': 1}, 'hold', done),
+        ):
+            with mock.patch.object(writer, 'submit', return_value=result) as submit:
+                response = self.client.post(url, data=json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(submit.call_args.args[1], kind)
+        self.assertFalse(Seat.objects.filter(show_time=self.show).exists())
+
+    def test_timed_out_commands_are_withdrawn(self):
+        self.show.single_writer = True
+        self.show.save()
+        submitted = []
+
+        def submit_without_writer(show_id, kind, seats_data, username):
+            command = self.command(kind, [(s['row'], s['number']) for s in seats_data], username)
+            submitted.append(command)
+            return command.future
+
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'D', 'number': 4}]}
+        with mock.patch.object(writer, 'submit', submit_without_writer), \
+                mock.patch.object(writer, 'RESULT_TIMEOUT', 0.01):
+            response = self.client.post('/api/seats/hold-batch/', data=json.dumps(payload),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(submitted[0].future.cancelled())
+
+        # The writer reaching the command later skips it, so the retry the client was told to make is safe
+        writer.ShowWriter(self.show.id).process(submitted)
+        self.assertFalse(Seat.objects.filter(show_time=self.show, row_id='D', number=4).exists())
+        version = self.show.seat_version
+        self.show.refresh_from_db()
+        self.assertEqual(self.show.seat_version, version)
+
+    def test_started_commands_are_waited_for_past_the_timeout(self):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        threading.Timer(0.05, future.set_result, ['applied']).start()
+        with mock.patch.object(writer, 'RESULT_TIMEOUT', 0.01):
+            self.assertEqual(writer.wait(future), 'applied')
+
+
+class WaitingRoomTests(ShowTestCase):
+    def setUp(self):
+        super().setUp()
+        waiting_room.reset()
+        self.addCleanup(waiting_room.reset)
+        for name, value in (('CAPACITY', 2), ('ADMIT_RATE', 1.0)):
+            patcher = mock.patch.object(waiting_room, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_clients_beyond_capacity_are_queued_and_admitted_at_the_rate(self):
+        show = self.show.id
+        self.assertIsNone(waiting_room.check(show, 'a', now=0))
+        self.assertIsNone(waiting_room.check(show, 'b', now=0))
+        c = waiting_room.check(show, 'c', now=0)
+        d = waiting_room.check(show, 'd', now=0)
+        self.assertEqual((c['position'], d['position']), (1, 2))
+        self.assertEqual(waiting_room.check(show, 'c', now=1)['queue_token'], c['queue_token'])
+        # Other shows are unaffected
+        self.assertIsNone(waiting_room.check(show + 1, 'c', now=1))
+
+        waiting_room.leave(show, 'a')
+        waiting_room.leave(show, 'b')
+        self.assertIsNone(waiting_room.check(show, 'c', c['queue_token'], now=2))
+        # One admission per second: d waits for the next token
+        self.assertEqual(waiting_room.check(show, 'd', d['queue_token'], now=2)['position'], 1)
+        self.assertIsNone(waiting_room.check(show, 'd', d['queue_token'], now=3))
+        self.assertEqual(waiting_room.metrics()[show], {
+            'admitted': 2, 'queued': 0, 'admitted_total': 4, 'queued_total': 2, 'abandoned_total': 0,
+        })
+
+    def test_idle_clients_give_up_their_place(self):
+        show = self.show.id
+        waiting_room.check(show, 'a', now=0)
+        waiting_room.check(show, 'b', now=0)
+        waiting_room.check(show, 'gone', now=0)
+        token = waiting_room.check(show, 'c', now=0)['queue_token']
+        later = waiting_room.ADMITTED_IDLE + 1
+        for now in range(0, int(later), 10):
+            waiting_room.check(show, 'c', token, now=now)
+        self.assertIsNone(waiting_room.check(show, 'c', token, now=later))
+        self.assertEqual(waiting_room.metrics()[show]['abandoned_total'], 1)
+
+    def test_admission_needs_the_queue_token(self):
+        show = self.show.id
+        waiting_room.check(show, 'a', now=0)
+        waiting_room.check(show, 'b', now=0)
+        token = waiting_room.check(show, 'c', now=0)['queue_token']
+        waiting_room.leave(show, 'a')
+        # The freed slot is reserved for c, but only their token takes it
+        for wrong in (None, 'guess'):
+            self.assertEqual(waiting_room.check(show, 'c', wrong, now=1)['position'], 0)
+        self.assertIsNotNone(waiting_room.check(show, 'd', now=1))
+        self.assertIsNone(waiting_room.check(show, 'c', token, now=2))
+
+        # A reservation nobody claims lapses and goes to the next in line
+        waiting_room.leave(show, 'c')
+        token = waiting_room.check(show, 'e', now=3)['queue_token']
+        self.assertEqual(waiting_room.check(show, 'e', token, now=4)['position'], 1)
+        later = 3 + waiting_room.QUEUED_IDLE
+        self.assertIsNone(waiting_room.check(show, 'e', token, now=later))
+        self.assertEqual(waiting_room.metrics()[show]['abandoned_total'], 1)
+
+    def test_idle_rooms_are_dropped(self):
+        waiting_room.check(self.show.id, 'a', now=0)
+        later = max(waiting_room.ADMITTED_IDLE, waiting_room.QUEUED_IDLE)
+        waiting_room.check(self.show.id + 1, 'a', now=later)
+        self.assertEqual(list(waiting_room.metrics()), [self.show.id + 1])
+
+    def test_hold_is_refused_with_a_queue_position(self):
+        waiting_room.check(self.show.id, 'a')
+        waiting_room.check(self.show.id, 'b')
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'A', 'number': 1}]}
+        response = self.client.post('/api/seats/hold-batch/', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()['position'], 1)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Seat.objects.exists())
+        self.assertFalse(self.client.get(f'/api/seats/queue/?show_id={self.show.id}').json()['admitted'])
+
+        token = response.json()['queue_token']
+        waiting_room.leave(self.show.id, 'a')
+        self.assertEqual(self.client.post('/api/seats/hold-batch/', data=json.dumps(payload),
+                                          content_type='application/json').status_code, 429)
+        response = self.client.post('/api/seats/hold-batch/', data=json.dumps(payload),
+                                    content_type='application/json', HTTP_X_QUEUE_TOKEN=token)
+        self.assertEqual(response.status_code, 200)
+
+    def test_single_seat_booking_frees_the_slot(self):
+        seat = {'show_id': self.show.id, 'row': 'A', 'number': 1}
+        self.client.post('/api/seats/hold/', data=json.dumps(seat), content_type='application/json')
+        waiting_room.check(self.show.id, 'b')
+        token = waiting_room.check(self.show.id, 'c')['queue_token']
+        response = self.client.post('/api/seats/book/', data=json.dumps(seat), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(waiting_room.check(self.show.id, 'c', token))
+
+
+class TokenAuthTests(ShowTestCase):
+    def setUp(self):
+        super().setUp()
+        forget_users()
+        response = Client().post('/api/seats/token/', data=json.dumps(
+            {'username': 'testuser', 'password': 'password123'}), content_type='application/json')
+        self.token = response.json()['token']
+
+    def hold(self, client, number, **headers):
+        payload = {'show_id': self.show.id, 'seats': [{'row': 'A', 'number': number}]}
+        return client.post('/api/seats/hold-batch/', data=json.dumps(payload),
+                           content_type='application/json', **headers)
+
+    def test_token_requests_skip_session_and_user_queries(self):
+        bearer = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        self.hold(Client(), 1, **bearer)  # resolves and caches the user
+
+        with CaptureQueriesContext(connection) as session_ctx:
+            self.assertEqual(self.hold(self.client, 2).status_code, 200)
+        with CaptureQueriesContext(connection) as token_ctx:
+            self.assertEqual(self.hold(Client(), 3, **bearer).status_code, 200)
+        self.assertEqual(len(token_ctx), len(session_ctx) - 2)
+        self.assertFalse(any('auth_user' in q['sql'] or 'django_session' in q['sql'] for q in token_ctx))
+        self.assertEqual(Seat.objects.get(show_time=self.show, row_id='A', number=3).held_by, 'testuser')
+
+    def test_bad_tokens_and_password_changes_are_rejected(self):
+        response = self.hold(Client(), 1, HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(response.status_code, 401)
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.hold(Client(), 1, HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(
+            Client().post('/api/seats/token/', data=json.dumps({'username': 'testuser', 'password': 'x'}),
+                          content_type='application/json').status_code, 401)
+
+
+class PerformanceMetricsTests(ShowTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        waiting_room.reset()
+
+    def sample(self, text, name):
+        for line in text.splitlines():
+            if line.startswith(name + ' '):
+                return float(line.split()[-1])
+        self.fail(f'{name} missing from metrics')
+
+    def test_records_latency_queries_sizes_and_conflicts_per_view(self):
+        self.set_seat('A', 1, status='BOOKED', held_by='someone')
+        self.client.get(f'/api/seats/?show_id={self.show.id}')
+        response = self.client.post('/api/seats/hold-batch/', data=json.dumps(
+            {'show_id': self.show.id, 'seats': [{'row': 'A', 'number': 1}]}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/seats/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        text = response.content.decode()
+        self.assertIn('# TYPE seat_http_request_duration_seconds histogram', text)
+        self.assertEqual(self.sample(text, 'seat_http_requests_total{view="seat_list",status="2xx"}'), 1)
+        self.assertEqual(self.sample(text, 'seat_http_request_duration_seconds_count{view="seat_list"}'), 1)
+        self.assertEqual(self.sample(text, 'seat_http_request_duration_seconds_bucket{view="seat_list",le="+Inf"}'), 1)
+        self.assertGreater(self.sample(text, 'seat_http_response_size_bytes_sum{view="seat_list"}'), 0)
+        self.assertGreater(self.sample(text, 'seat_db_queries_total{view="hold_multiple_seats"}'), 0)
+        self.assertEqual(self.sample(text, 'seat_conflicts_total{view="hold_multiple_seats"}'), 1)
+        self.assertEqual(self.sample(text, 'seat_conflicts_total{view="seat_list"}'), 0)
+        self.assertIn(f'seat_waiting_room_admitted{{show="{self.show.id}"}} 1', text)
+
+    def test_metrics_are_staff_only(self):
+        self.assertEqual(self.client.get('/api/seats/metrics/').status_code, 403)
+
+    def test_time_in_select_for_update_counts_as_lock_wait(self):
+        timer = QueryTimer()
+        timer(lambda *args: None, 'SELECT "id" FROM "seats_seat" FOR UPDATE', (), False, {})
+        timer(lambda *args: None, 'SELECT 1', (), False, {})
+        self.assertEqual(timer.count, 2)
+        self.assertGreater(timer.lock_wait, 0)
+        self.assertGreaterEqual(timer.duration, timer.lock_wait)
+
+
+def explain_seat_queries(statements):
+    """Query plans of the statements that read or write the seat table.
+
+    Returns [(sql, plan_text)]. On PostgreSQL sequential scans are disabled
+    first, so the planner only picks one when no index can serve the query
+    (on a tiny test table it would otherwise prefer one anyway).
+    """
+    plans = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for sql, params in statements:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = '\n'.join(str(row[-1]) for row in cursor.fetchall())
+            else:
+                cursor.execute('EXPLAIN ' + sql, params)
+                plan = '\n'.join(str(row[0]) for row in cursor.fetchall())
+            plans.append((sql, plan))
+    return plans
+
+
+class ScalingTests(ShowTestCase):
+    """Hot endpoints must cost the same number of queries at every data size,
+    and none of their statements may scan the whole seat table."""
+
+    SHOW_SIZES = (1, 100, 1000)
+    BOOKING_COUNTS = (1, 50, 500)
+    # PostgreSQL prints child nodes of a join or sort indented under "->"
+    SEQ_SCAN = re.compile(r'^\s*(->\s+)?(SCAN|Seq Scan on) "?seats_seat"?\b', re.MULTILINE)
+
+    def make_show(self, size, booked=0, user='someone'):
+        rows = layout_row_names((size + 39) // 40)
+        screen = Screen.objects.create(
+            name=f'Scale {size}',
+            layout=[{'row': row, 'seats': min(40, size - 40 * r)} for r, row in enumerate(rows)],
+        )
+        show = ShowTime.objects.create(
+            movie=self.movie, screen=screen,
+            start_time=timezone.now() + timedelta(hours=1), end_time=timezone.now() + timedelta(hours=3),
+        )
+        keys = [(seat['row_id'], seat['number']) for seat in self.all_seats(show)]
+        Seat.objects.bulk_create([
+            Seat(show_time=show, row_id=row, number=number, status='BOOKED', held_by=user,
+                 show_start_time=show.start_time)
+            for row, number in keys[:booked]
+        ])
+        return show
+
+    def all_seats(self, show):
+        return [{'row_id': row, 'number': number} for row, number in layout_seats(show.screen.layout)]
+
+    def run_queries(self, request):
+        """(number of queries, statements on the seat table) run by `request()`."""
+        statements = []
+
+        def recorder(execute, sql, params, many, context):
+            if not many and 'seats_seat' in sql and sql.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with CaptureQueriesContext(connection) as ctx, connection.execute_wrapper(recorder):
+            response = request()
+        self.assertLess(response.status_code, 300, response.content[:200])
+        # bulk_create splits large inserts by the backend's parameter limit (999 on
+        # SQLite); consecutive batches of one insert count as a single statement
+        count, previous = 0, None
+        for query in ctx.captured_queries:
+            head = query['sql'].split(' VALUES ', 1)[0] if query['sql'].startswith('INSERT') else None
+            count += head is None or head != previous
+            previous = head
+        return count, statements
+
+    def assert_scales(self, name, runs):
+        """`runs` maps a data size to (query count, seat statements) for the same request."""
+        counts = {size: count for size, (count, _) in runs.items()}
+        self.assertEqual(len(set(counts.values())), 1, f'{name}: query count grows with data size {counts}')
+        for sql, plan in explain_seat_queries([s for _, statements in runs.values() for s in statements]):
+            self.assertIsNone(self.SEQ_SCAN.search(plan), f'{name}: full scan of the seat table\n{sql}\n{plan}')
+
+    def post(self, url, show, seats):
+        payload = {'show_id': show.id, 'seats': [{'row': s['row_id'], 'number': s['number']} for s in seats]}
+        return lambda: self.client.post(url, data=json.dumps(payload), content_type='application/json')
+
+    def test_seat_list(self):
+        runs = {}
+        for size in self.SHOW_SIZES:
+            show = self.make_show(size, booked=size // 2)
+            runs[size] = self.run_queries(lambda: self.client.get(f'/api/seats/?show_id={show.id}'))
+        self.assert_scales('seat_list', runs)
+
+    def test_hold_book_and_release_whole_show(self):
+        holds, books, releases = {}, {}, {}
+        for size in self.SHOW_SIZES:
+            show = self.make_show(size)
+            seats = self.all_seats(show)
+            holds[size] = self.run_queries(self.post('/api/seats/hold-batch/', show, seats))
+            books[size] = self.run_queries(self.post('/api/seats/book-batch/', show, seats))
+            self.assertEqual(Seat.objects.filter(show_time=show, status='BOOKED').count(), size)
+
+            show = self.make_show(size)
+            seats = self.all_seats(show)
+            self.post('/api/seats/hold-batch/', show, seats)()
+            releases[size] = self.run_queries(self.post('/api/seats/release-hold-batch/', show, seats))
+            self.assertFalse(Seat.objects.filter(show_time=show, status='HELD').exists())
+        self.assert_scales('hold_multiple_seats', holds)
+        self.assert_scales('book_multiple_seats', books)
+        self.assert_scales('release_batch_holds', releases)
+
+    def test_hold_best_available(self):
+        runs = {}
+        for size in self.SHOW_SIZES:
+            show = self.make_show(size, booked=size // 2)
+            runs[size] = self.run_queries(lambda: self.client.post(
+                '/api/seats/hold-best/', data=json.dumps({'show_id': show.id, 'count': 1}),
+                content_type='application/json'))
+        self.assert_scales('hold_best_seats', runs)
+
+    def test_my_bookings_and_tickets(self):
+        bookings, tickets_ = {}, {}
+        for count in self.BOOKING_COUNTS:
+            Seat.objects.filter(held_by='testuser').delete()
+            show = self.make_show(count, booked=count, user='testuser')
+            seat = Seat.objects.filter(show_time=show).latest('id')
+            bookings[count] = self.run_queries(lambda: self.client.get('/api/seats/my-bookings/?limit=100'))
+            tickets_[count] = self.run_queries(lambda: self.client.get(f'/api/seats/booking/{seat.id}/ticket/'))
+        self.assert_scales('my_bookings', bookings)
+        self.assert_scales('get_ticket', tickets_)
+
+    def test_detects_a_full_scan(self):
+        # Guard the guard: an unindexed filter on the seat table must be reported
+        query = Seat.objects.filter(number__gt=5).values('id').query
+        sql, params = query.sql_with_params()
+        (_, plan), = explain_seat_queries([(sql, params)])
+        self.assertIsNotNone(self.SEQ_SCAN.search(plan))
+        # Also when the scan is a child node of a join or sort
+        self.assertIsNotNone(self.SEQ_SCAN.search(
+            'Sort  (cost=10.1..10.2 rows=5 width=8)\n'
+            '  ->  Nested Loop  (cost=0.1..10.0 rows=5 width=8)\n'
+            '        ->  Seq Scan on seats_seat  (cost=0.0..5.0 rows=5 width=8)\n'
+        ))
+
+
+# Admin pages link static files; the manifest only exists after collectstatic
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class AdminTheatreMapTests(ShowTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.date = timezone.localtime(self.show.start_time).date().isoformat()
+
+    def add_show(self, booked=()):
+        show = ShowTime.objects.create(
+            movie=self.movie, screen=self.screen,
+            start_time=self.show.start_time, end_time=self.show.end_time,
+        )
+        for row, number in booked:
+            self.set_seat(row, number, show=show, status='BOOKED', held_by='someone')
+        reconcile(ShowTime.objects.filter(pk=show.pk))
+        return show
+
+    def test_map_shows_only_the_selected_show(self):
+        other = self.add_show(booked=[('A', 1), ('A', 2)])
+        self.set_seat('B', 3, status='HELD', held_by='someone', hold_expires_at=timezone.now() + timedelta(minutes=5))
+
+        response = self.client.get(f'/admin/seats/seat/map/?date={self.date}')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'<option value="{other.id}"')
+        self.assertEqual(response.context['rows'], [])
+
+        response = self.client.get(f'/admin/seats/seat/map/?date={self.date}&show={self.show.id}')
+        rows = dict(response.context['rows'])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows['A'][0], (1, 'AVAILABLE'))
+        self.assertEqual(rows['B'][2], (3, 'HELD'))
+        self.assertEqual(response.context['stats'], {'available': 49, 'held': 1, 'booked': 0})
+
+    def test_overview_reads_occupancy_counters_in_constant_queries(self):
+        self.set_seat('A', 1, status='BOOKED', held_by='someone')
+        self.set_seat('A', 2, status='HELD', held_by='someone', hold_expires_at=timezone.now() - timedelta(minutes=1))
+        reconcile(ShowTime.objects.filter(pk=self.show.pk))
+
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get(f'/admin/seats/seat/overview/?date={self.date}')
+        row, = response.context['overview']
+        # From the counters: a lapsed hold stays held until the expiry worker frees it
+        self.assertEqual((row['capacity'], row['booked'], row['held'], row['available']), (50, 1, 1, 48))
+        self.assertEqual(row['occupancy'], 2)
+
+        for _ in range(10):
+            self.add_show(booked=[('C', n) for n in range(1, 11)])
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(f'/admin/seats/seat/overview/?date={self.date}')
+        self.assertEqual(len(response.context['overview']), 11)
+        self.assertEqual(response.context['overview'][-1]['occupancy'], 20)
+        self.assertEqual(len(one), len(many))
+
+    def test_seat_changelist_links_to_the_map(self):
+        self.set_seat('A', 1, status='BOOKED', held_by='someone')
+        response = self.client.get('/admin/seats/seat/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/admin/seats/seat/overview/')
+
+    def test_seat_edits_reach_the_seat_list(self):
+        listed = self.client.get(f'/api/seats/?show_id={self.show.id}')
+        form = {'show_time': self.show.id, 'row_id': 'A', 'number': 1, 'status': 'BOOKED', 'held_by': 'someone',
+                'hold_expires_at_0': '', 'hold_expires_at_1': ''}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/admin/seats/seat/add/', form).status_code, 302)
+        response = self.client.get(f'/api/seats/?show_id={self.show.id}', HTTP_IF_NONE_MATCH=listed['ETag'])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['seats'][0]['status'], 'BOOKED')
+        self.assertEqual(data['stats'], {'available': 49, 'held': 0, 'booked': 1})
+
+        seat = Seat.objects.get(show_time=self.show, row_id='A', number=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/admin/seats/seat/{seat.id}/change/', {**form, 'status': 'HELD'})
+        data = self.client.get(f'/api/seats/?show_id={self.show.id}').json()
+        self.assertEqual(data['seats'][0]['status'], 'HELD')
+        self.assertEqual(data['stats'], {'available': 49, 'held': 1, 'booked': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/admin/seats/seat/{seat.id}/delete/', {'post': 'yes'})
+        data = self.client.get(f'/api/seats/?show_id={self.show.id}').json()
+        self.assertEqual(data['seats'][0]['status'], 'AVAILABLE')
+        self.assertEqual(data['stats'], {'available': 50, 'held': 0, 'booked': 0})
+        self.assertGreater(data['version'], listed.json()['version'] + 2)
+
+
+class OccupancyCounterTests(ShowTestCase):
+    def counters(self, show=None):
+        show = show or self.show
+        show.refresh_from_db()
+        return show.seats_available, show.seats_held, show.seats_booked
+
+    def assert_consistent(self):
+        self.assertEqual(reconcile(ShowTime.objects.filter(pk=self.show.pk)), 0)
+
+    def test_every_transition_moves_the_counters(self):
+        self.assertEqual(self.counters(), (50, 0, 0))
+        self.post('/api/seats/hold-batch/', [('A', 1), ('A', 2), ('A', 3)])
+        self.assertEqual(self.counters(), (47, 3, 0))
+        self.post('/api/seats/book-batch/', [('A', 1), ('A', 2)])
+        self.assertEqual(self.counters(), (47, 1, 2))
+        self.post('/api/seats/release-hold-batch/', [('A', 3)])
+        self.assertEqual(self.counters(), (48, 0, 2))
+
+        self.client.post('/api/seats/hold/', data=json.dumps({'show_id': self.show.id, 'row': 'B', 'number': 1}),
+                         content_type='application/json')
+        self.client.post('/api/seats/book/', data=json.dumps({'show_id': self.show.id, 'row': 'B', 'number': 1}),
+                         content_type='application/json')
+        self.client.post('/api/seats/hold-best/', data=json.dumps({'show_id': self.show.id, 'count': 2}),
+                         content_type='application/json')
+        self.assertEqual(self.counters(), (45, 2, 3))
+
+        # Retaking a lapsed hold keeps the seat held; expiry frees the rest
+        Seat.objects.filter(show_time=self.show, status='HELD').update(
+            hold_expires_at=timezone.now() - timedelta(minutes=1))
+        held = Seat.objects.filter(show_time=self.show, status='HELD').first()
+        self.post('/api/seats/hold-batch/', [(held.row_id, held.number)])
+        self.assertEqual(self.counters(), (45, 2, 3))
+        self.assertEqual(expire_holds(), 1)
+        self.assertEqual(self.counters(), (46, 1, 3))
+        self.assert_consistent()
+
+    def test_single_writer_moves_the_counters(self):
+        seats = normalize_seats([{'row': 'C', 'number': n} for n in (1, 2)])
+        batch = [Command('hold', seats, 'testuser'), Command('book', seats[:1], 'testuser')]
+        ShowWriter(self.show.id).process(batch)
+        self.assertEqual(self.counters(), (48, 1, 1))
+        self.assert_consistent()
+
+    def test_reconcile_recounts_from_the_seat_table(self):
+        self.set_seat('A', 1, status='BOOKED', held_by='someone')
+        self.set_seat('Z', 1, status='AVAILABLE')  # a stored seat outside the layout
+        ShowTime.objects.filter(pk=self.show.pk).update(seats_available=0, seats_held=7)
+
+        out = StringIO()
+        call_command('reconcile_occupancy', '--show', str(self.show.pk), stdout=out)
+        self.assertIn('Corrected the occupancy counters of 1 shows', out.getvalue())
+        self.assertEqual(self.counters(), (50, 0, 1))
+        call_command('reconcile_occupancy', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+        self.screen.layout = [{'row': row, 'seats': 12} for row in 'ABCDE']
+        self.screen.save()
+        self.assertEqual(self.counters(), (60, 0, 1))
+
+
+class AsyncReadUrls:
+    # The read endpoints as seat_booking/asgi.py serves them (ASGI_MODE)
+    urlpatterns = [
+        path('api/seats/', views.aseat_list),
+        path('api/seats/shows/', views.alist_shows),
+        path('api/seats/my-bookings/', views.amy_bookings),
+        path('api/seats/booking/<int:booking_id>/ticket/', views.aget_ticket),
+    ]
+
+
+class AsyncReadViewTests(ShowTestCase):
+    def test_middleware_chain_needs_no_thread_under_asgi(self):
+        # Django logs every sync/async adaptation it has to make while loading middleware
+        with self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler()
+
+    def test_async_views_answer_like_the_sync_ones(self):
+        self.client.post('/api/seats/hold-batch/', data=json.dumps(
+            {'show_id': self.show.id, 'seats': [{'row': 'A', 'number': 1}, {'row': 'A', 'number': 2}]}),
+            content_type='application/json')
+        self.client.post('/api/seats/book-batch/', data=json.dumps(
+            {'show_id': self.show.id, 'seats': [{'row': 'A', 'number': 1}]}), content_type='application/json')
+        booking = Seat.objects.get(show_time=self.show, status='BOOKED')
+        urls = [
+            f'/api/seats/?show_id={self.show.id}',
+            f'/api/seats/?show_id={self.show.id}&since=1',
+            '/api/seats/shows/',
+            '/api/seats/my-bookings/?limit=1',
+            f'/api/seats/booking/{booking.id}/ticket/',
+        ]
+        expected = [self.client.get(url) for url in urls]
+
+        forget_users()
+        client = AsyncClient()
+        bearer = {'Authorization': f'Bearer {issue_token(self.user)}'}
+        with override_settings(ROOT_URLCONF=AsyncReadUrls):
+            responses = [async_to_sync(client.get)(url, headers=bearer) for url in urls]
+            etag = responses[0]['ETag']
+            not_modified = async_to_sync(client.get)(urls[0], headers={'If-None-Match': etag})
+            anonymous = async_to_sync(client.get)('/api/seats/my-bookings/')
+        for url, response, sync_response in zip(urls, responses, expected):
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json(), sync_response.json(), url)
+        self.assertEqual(etag, expected[0]['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(anonymous.status_code, 401)
@@ -0,0 +1,28 @@
+from django.core import signing
+
+SALT = 'seats.ticket'
+
+
+def issue(seat_id, show_id, row_id, number, price, username):
+    """Signed, compressed ticket token. Anyone holding SECRET_KEY can verify it offline."""
+    payload = {
+        'k': seat_id,
+        's': show_id,
+        'r': row_id,
+        'n': number,
+        'p': str(price),
+        'u': username,
+    }
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+def verify(token):
+    """Return the ticket carried by `token`, or raise signing.BadSignature. No database access."""
+    payload = signing.loads(token, salt=SALT)
+    return {
+        'ticket_id': payload['k'],
+        'show_id': payload['s'],
+        'seat': f"{payload['r']}{payload['n']}",
+        'price': payload['p'],
+        'booked_by': payload['u'],
+    }
@@ -1,17 +1,29 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under the ASGI server the polling endpoints run on the event loop instead of a thread each
+ASYNC_READS = settings.ASGI_MODE
+
 urlpatterns = [
-    path('', views.seat_list, name='seat_list'),
+    path('', views.aseat_list if ASYNC_READS else views.seat_list, name='seat_list'),
     path('hold/', views.hold_seat, name='hold_seat'),
     path('book/', views.book_seat, name='book_seat'),
     path('register/', views.register_user, name='register'),
     path('login/', views.login_user, name='login'),
     path('logout/', views.logout_user, name='logout'),
+    path('token/', views.issue_api_token, name='api_token'),
     path('hold-batch/', views.hold_multiple_seats, name='hold_batch'),
     path('book-batch/', views.book_multiple_seats, name='book_batch'),
+    path('hold-best/', views.hold_best_seats, name='hold_best'),
     path('release-hold-batch/', views.release_batch_holds, name='release_hold_batch'),
-    path('shows/', views.list_shows, name='list_shows'),
-    path('my-bookings/', views.my_bookings, name='my_bookings'),
-    path('booking/<int:booking_id>/ticket/', views.get_ticket, name='get_ticket'),
+    path('queue/', views.queue_status, name='queue_status'),
+    path('queue/metrics/', views.queue_metrics, name='queue_metrics'),
+    path('metrics/', views.performance_metrics, name='performance_metrics'),
+    path('stream/', views.seat_stream, name='seat_stream'),
+    path('shows/', views.alist_shows if ASYNC_READS else views.list_shows, name='list_shows'),
+    path('my-bookings/', views.amy_bookings if ASYNC_READS else views.my_bookings, name='my_bookings'),
+    path('booking/<int:booking_id>/ticket/', views.aget_ticket if ASYNC_READS else views.get_ticket,
+         name='get_ticket'),
+    path('tickets/verify/', views.verify_ticket, name='verify_ticket'),
 ]
@@ -1,87 +1,210 @@
 import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core import signing
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from .models import Seat, Movie, ShowTime, Screen
+from .engine import (
+    SeatConflict, hold_seats, book_seats, release_seats, record_transition,
+    in_layout, materialize, normalize_seats, show_layout,
+)
+from .seatmap import BINARY_MEDIA_TYPE, aget_payload, aget_seatmap, get_payload, get_seatmap
+from .catalog import aget_shows, get_shows
+from .allocator import hold_best_available
+from .auth import TOKEN_MAX_AGE, issue_token
+from . import events, metrics, tickets, waiting_room, writer
+from .changelog import achanges_since, changes_since, latest_per_seat
 from django.db.models import Q, Count, Sum
 from decimal import Decimal
 
+BOOKINGS_PAGE_SIZE = 20
+BOOKINGS_MAX_PAGE_SIZE = 100
+
+
+def _queue_token(request):
+    # Queued clients retry with the queue_token they were given
+    return request.headers.get('X-Queue-Token') or request.GET.get('queue_token')
+
+
+def _queued_response(request, show_id):
+    # None when the user may pick seats for this show, else where they stand in its waiting room
+    ticket = waiting_room.check(show_id, request.user.username, _queue_token(request))
+    if ticket is None:
+        return None
+    response = JsonResponse({'error': 'Show is busy, you are in the queue', 'admitted': False, **ticket}, status=429)
+    response['Retry-After'] = str(ticket['retry_after'])
+    return response
+
+
+def _conflict_response(conflict, status=400):
+    response = JsonResponse({'error': str(conflict), 'conflicts': conflict.conflicts}, status=status)
+    # Counted as a conflict by the metrics middleware whatever the status code
+    response.seat_conflict = True
+    return response
+
 
 def theatre_dashboard(request):
     return render(request, 'seats/dashboard.html')
 
-def list_shows(request):
+def _listing_date(request):
     date_str = request.GET.get('date') # YYYY-MM-DD
-    shows = ShowTime.objects.filter(end_time__gt=timezone.now()).select_related('movie', 'screen').order_by('start_time')
-    
     if date_str:
         try:
-            target_date = timezone.datetime.strptime(date_str, '%Y-%m-%d').date()
-            shows = shows.filter(start_time__date=target_date)
+            return timezone.datetime.strptime(date_str, '%Y-%m-%d').date()
         except ValueError:
             pass
+    return None
 
-    data = []
-    for show in shows:
-        poster_url = None
-        try:
-            if show.movie.poster:
-                poster_url = show.movie.poster.url
-        except Exception:
-            poster_url = None
-
-        data.append({
-            'id': show.id,
-            'movie': show.movie.title,
-            'screen': show.screen.name,
-            'start_time': show.start_time.isoformat(),
-            'end_time': show.end_time.isoformat(),
-            'price': str(show.base_price),
-            'poster_url': poster_url
-        })
-    return JsonResponse({'shows': data})
 
+def list_shows(request):
+    return JsonResponse({'shows': get_shows(_listing_date(request))})
 
-def get_ticket(request, booking_id):
+
+async def alist_shows(request):
+    return JsonResponse({'shows': await aget_shows(_listing_date(request))})
+
+
+def _ticket_query(booking_id):
     # For now, searching by Seat ID works since we book seats.
     # In a more advanced system, we'd have a Booking model.
-    try:
-        seat = get_object_or_404(Seat, id=booking_id, status='BOOKED')
-        data = {
-            'ticket_id': seat.id,
-            'movie': seat.show_time.movie.title,
-            'screen': seat.show_time.screen.name,
-            'time': seat.show_time.start_time,
-            'seat': f"{seat.row_id}{seat.number}",
-            'price': str(seat.show_time.base_price),
-            'booked_by': seat.held_by,
-            'message': "Thank you for booking with us! Please show this ticket at the entrance."
-        }
-        return JsonResponse({'ticket': data})
-    except Exception as e:
+    return Seat.objects.filter(id=booking_id, status='BOOKED').values(
+        'id', 'row_id', 'number', 'held_by', 'show_time_id', 'show_time__movie__title',
+        'show_time__screen__name', 'show_time__start_time', 'show_time__base_price'
+    )
+
+
+def get_ticket(request, booking_id):
+    seat = _ticket_query(booking_id).first()
+    return _ticket_response(seat, seat is not None and _owns_ticket(request.user, seat))
+
+
+async def aget_ticket(request, booking_id):
+    seat = await _ticket_query(booking_id).afirst()
+    return _ticket_response(seat, seat is not None and _owns_ticket(await request.auser(), seat))
+
+
+def _owns_ticket(user, seat):
+    # The gate token admits whoever presents it: only the booking's holder and staff get it
+    return user.is_authenticated and (user.is_staff or user.get_username() == seat['held_by'])
+
+
+def _ticket_response(seat, with_token):
+    if seat is None:
         return JsonResponse({'error': 'Ticket not found'}, status=404)
+    data = {
+        'ticket_id': seat['id'],
+        'movie': seat['show_time__movie__title'],
+        'screen': seat['show_time__screen__name'],
+        'time': seat['show_time__start_time'],
+        'seat': f"{seat['row_id']}{seat['number']}",
+        'price': str(seat['show_time__base_price']),
+        'booked_by': seat['held_by'],
+        'message': "Thank you for booking with us! Please show this ticket at the entrance."
+    }
+    if with_token:
+        data['token'] = tickets.issue(
+            seat['id'], seat['show_time_id'], seat['row_id'], seat['number'],
+            seat['show_time__base_price'], seat['held_by']
+        )
+    return JsonResponse({'ticket': data})
+
+
+@csrf_exempt
+def verify_ticket(request):
+    # Gate scanners call this at show start; the signature is checked without touching the database
+    token = request.GET.get('token') or request.POST.get('token')
+    if not token:
+        return JsonResponse({'error': 'token is required'}, status=400)
+    try:
+        ticket = tickets.verify(token)
+    except signing.BadSignature:
+        return JsonResponse({'valid': False, 'error': 'Invalid ticket'}, status=400)
+    show_id = request.GET.get('show_id')
+    if show_id and str(ticket['show_id']) != show_id:
+        return JsonResponse({'valid': False, 'error': 'Ticket is for another show'}, status=400)
+    return JsonResponse({'valid': True, 'ticket': ticket})
 
 
 def my_bookings(request):
     if not request.user.is_authenticated:
         return JsonResponse({'error': 'Authentication required'}, status=401)
-    
-    bookings = Seat.objects.filter(status='BOOKED', held_by=request.user.username).order_by('-show_time__start_time')
+    try:
+        limit, after = _bookings_page(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+    rows = list(_bookings_query(request.user.username, limit, after))
+    return _bookings_response(rows, limit)
+
+
+async def amy_bookings(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        limit, after = _bookings_page(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+    rows = [row async for row in _bookings_query(user.username, limit, after)]
+    return _bookings_response(rows, limit)
+
+
+def _bookings_page(request):
+    limit = max(1, min(int(request.GET.get('limit', BOOKINGS_PAGE_SIZE)), BOOKINGS_MAX_PAGE_SIZE))
+    return limit, _decode_booking_cursor(request.GET.get('cursor'))
+
+
+def _bookings_query(username, limit, after):
+    bookings = Seat.objects.filter(status='BOOKED', held_by=username)
+    if after:
+        # Keyset pagination: continue strictly after the last (start_time, id) already returned
+        start_time, seat_id = after
+        bookings = bookings.filter(
+            Q(show_start_time__lt=start_time) | Q(show_start_time=start_time, id__lt=seat_id)
+        )
+    # Ordered on the seat's own copy of the start time, so seat_user_booking_idx
+    # serves both the filter and the order; one row more than the page tells
+    # whether there is a next one
+    return bookings.order_by('-show_start_time', '-id').values(
+        'id', 'row_id', 'number', 'show_start_time', 'show_time__movie__title', 'show_time__base_price'
+    )[:limit + 1]
+
+
+def _bookings_response(rows, limit):
+    page, more = rows[:limit], len(rows) > limit
+
     data = [{
-        'id': b.id,
-        'movie': b.show_time.movie.title if b.show_time else "Unknown",
-        'start_time': b.show_time.start_time if b.show_time else None,
-        'row': b.row_id,
-        'number': b.number,
-        'price': str(b.show_time.base_price)
-    } for b in bookings]
-    return JsonResponse({'bookings': data})
+        'id': b['id'],
+        'movie': b['show_time__movie__title'],
+        'start_time': b['show_start_time'],
+        'row': b['row_id'],
+        'number': b['number'],
+        'price': str(b['show_time__base_price'])
+    } for b in page]
+    next_cursor = None
+    if more:
+        last = page[-1]
+        next_cursor = _encode_booking_cursor(last['show_start_time'], last['id'])
+    return JsonResponse({'bookings': data, 'next_cursor': next_cursor})
+
+
+def _encode_booking_cursor(start_time, seat_id):
+    return urlsafe_b64encode(f"{start_time.isoformat()}|{seat_id}".encode()).decode()
+
+
+def _decode_booking_cursor(cursor):
+    if not cursor:
+        return None
+    # Malformed base64, text or fields all surface as ValueError
+    start_time, seat_id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(start_time), int(seat_id)
 
 @csrf_exempt
 def register_user(request):
@@ -122,6 +245,22 @@ def login_user(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@csrf_exempt
+def issue_api_token(request):
+    # Stateless alternative to the session: send the token as `Authorization: Bearer <token>`
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        user = request.user if request.user.is_authenticated else None
+        if user is None:
+            data = json.loads(request.body or b'{}')
+            user = authenticate(request, username=data.get('username'), password=data.get('password'))
+        if user is None:
+            return JsonResponse({'error': 'Invalid credentials'}, status=401)
+        return JsonResponse({'token': issue_token(user), 'expires_in': TOKEN_MAX_AGE})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 @csrf_exempt
 def logout_user(request):
     logout(request)
@@ -143,41 +282,55 @@ def hold_multiple_seats(request):
             return JsonResponse({'error': 'show_id is required'}, status=400)
         if not seats_data or not isinstance(seats_data, list):
             return JsonResponse({'error': 'A list of seats is required'}, status=400)
+        queued = _queued_response(request, show_id)
+        if queued:
+            return queued
             
-        with transaction.atomic():
-            seats_to_hold = []
-            for item in seats_data:
-                row = item.get('row')
-                number = item.get('number')
-                
-                # Lock and fetch
-                seat = Seat.objects.select_for_update().filter(show_time_id=show_id, row_id=row, number=number).first()
-                
-                if not seat:
-                    raise Exception(f"Seat {row}{number} not found for show {show_id}")
-                
-                # Check status
-                is_available = seat.status == 'AVAILABLE'
-                is_expired_hold = (seat.status == 'HELD' and seat.hold_expires_at and seat.hold_expires_at < timezone.now())
-                is_already_my_hold = (seat.status == 'HELD' and seat.held_by == request.user.username)
-                
-                if is_available or is_expired_hold or is_already_my_hold:
-                    seat.status = 'HELD'
-                    seat.held_by = request.user.username
-                    seat.hold_expires_at = timezone.now() + timedelta(minutes=10)
-                    seats_to_hold.append(seat)
-                else:
-                    raise Exception(f"Seat {row}{number} is already taken by someone else")
-            
-            # Save all if loop finished without exception
-            for seat in seats_to_hold:
-                seat.save()
-                
-            return JsonResponse({
-                'message': f'Successfully held {len(seats_to_hold)} seats',
-                'expires_at': seats_to_hold[0].hold_expires_at
-            })
+        # Hot shows: handed to the show's single writer instead of taking row locks here
+        hold = writer.hold_seats if writer.is_hot(show_id) else hold_seats
+        seats, expires_at = hold(show_id, seats_data, request.user.username)
+        return JsonResponse({
+            'message': f'Successfully held {len(seats)} seats',
+            'expires_at': expires_at
+        })
+
+    except SeatConflict as e:
+        return _conflict_response(e)
+    except TimeoutError:
+        return JsonResponse({'error': 'The show is busy, please try again'}, status=503)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
+@csrf_exempt
+def hold_best_seats(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        show_id = data.get('show_id')
+        count = int(data.get('count', 1))
+        if not show_id:
+            return JsonResponse({'error': 'show_id is required'}, status=400)
+        queued = _queued_response(request, show_id)
+        if queued:
+            return queued
+
+        seats, expires_at = hold_best_available(show_id, count, request.user.username)
+        return JsonResponse({
+            'message': f'Successfully held {len(seats)} seats',
+            'seats': [{'row': s['row_id'], 'number': s['number']} for s in seats],
+            'expires_at': expires_at
+        })
+
+    except ShowTime.DoesNotExist:
+        return JsonResponse({'error': 'Show not found'}, status=404)
+    except SeatConflict as e:
+        return _conflict_response(e, status=409)
+    except TimeoutError:
+        return JsonResponse({'error': 'The show is busy, please try again'}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -193,25 +346,11 @@ def release_batch_holds(request):
         show_id = data.get('show_id')
         seats_data = data.get('seats', [])
         
-        with transaction.atomic():
-            for item in seats_data:
-                row = item.get('row')
-                number = item.get('number')
-                seat = Seat.objects.select_for_update().filter(
-                    show_time_id=show_id, 
-                    row_id=row, 
-                    number=number,
-                    status='HELD',
-                    held_by=request.user.username
-                ).first()
-                
-                if seat:
-                    seat.status = 'AVAILABLE'
-                    seat.held_by = None
-                    seat.hold_expires_at = None
-                    seat.save()
-                    
+        release = writer.release_seats if writer.is_hot(show_id) else release_seats
+        release(show_id, seats_data, request.user.username)
         return JsonResponse({'message': 'Holds released successfully'})
+    except TimeoutError:
+        return JsonResponse({'error': 'The show is busy, please try again'}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -231,40 +370,67 @@ def book_multiple_seats(request):
         if not seats_data or not isinstance(seats_data, list):
             return JsonResponse({'error': 'A list of seats is required'}, status=400)
             
-        with transaction.atomic():
-            seats_to_book = []
-            total_price = Decimal('0')
-            for item in seats_data:
-                row = item.get('row')
-                number = item.get('number')
-                
-                seat = Seat.objects.select_for_update().filter(show_time_id=show_id, row_id=row, number=number).first()
-                if not seat:
-                    raise Exception(f"Seat {row}{number} not found for show {show_id}")
-                
-                if seat.status != 'HELD' or seat.held_by != request.user.username:
-                    raise Exception(f"Seat {row}{number} is not held by you")
-                
-                if seat.hold_expires_at and seat.hold_expires_at < timezone.now():
-                    raise Exception(f"Hold for seat {row}{number} has expired")
-                    
-                seat.status = 'BOOKED'
-                seat.hold_expires_at = None
-                seat.save()
-                
-                seats_to_book.append(seat)
-                total_price += Decimal(str(seat.show_time.base_price))
-                
-
-            return JsonResponse({
-                'message': f'Successfully booked {len(seats_to_book)} seats',
-                'total_paid': str(total_price.quantize(Decimal('0.01')))
-            })
+        book = writer.book_seats if writer.is_hot(show_id) else book_seats
+        seats, total_price = book(show_id, seats_data, request.user.username)
+        # Done choosing: hand the slot to the next client in the waiting room
+        waiting_room.leave(show_id, request.user.username)
+        return JsonResponse({
+            'message': f'Successfully booked {len(seats)} seats',
+            'total_paid': str(total_price.quantize(Decimal('0.01'))),
+            'tickets': [{
+                'id': seat['id'],
+                'seat': f"{seat['row_id']}{seat['number']}",
+                'token': tickets.issue(
+                    seat['id'], int(show_id), seat['row_id'], seat['number'], seat['price'], request.user.username
+                ),
+            } for seat in seats]
+        })
 
+    except SeatConflict as e:
+        return _conflict_response(e)
+    except TimeoutError:
+        return JsonResponse({'error': 'The show is busy, please try again'}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
 
+def queue_status(request):
+    # Waiting room for a show: poll until admitted, then start picking seats
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    show_id = request.GET.get('show_id')
+    if not show_id or not show_id.isdigit():
+        return JsonResponse({'error': 'show_id is required'}, status=400)
+    ticket = waiting_room.check(show_id, request.user.username, _queue_token(request))
+    if ticket is None:
+        return JsonResponse({'admitted': True})
+    return JsonResponse({'admitted': False, **ticket})
+
+
+def queue_metrics(request):
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return JsonResponse({'shows': waiting_room.metrics()})
+
+
+def performance_metrics(request):
+    # Prometheus scrape target; scrapers authenticate with a staff user's bearer token
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff only'}, status=403)
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# The occupancy counters move in the same UPDATE as seat_version
+SHOW_STATE_FIELDS = ('seat_version', 'seats_available', 'seats_held', 'seats_booked')
+
+
+def _show_state(row):
+    # (seat version, stats) of a show from one ShowTime row, zeros for an unknown show.
+    # These are the raw counters: the serialized seat map moves lapsed holds to available
+    version, available, held, booked = row or (0, 0, 0, 0)
+    return version, {'available': available, 'held': held, 'booked': booked}
+
+
 def seat_list(request):
     show_id = request.GET.get('show_id')
     if not show_id:
@@ -274,32 +440,142 @@ def seat_list(request):
             return JsonResponse({'seats': [], 'message': 'No upcoming shows'})
         show_id = first_show.id
 
-    seats = Seat.objects.filter(show_time_id=show_id).select_related('show_time__screen').order_by('row_id', 'number')
-    screen_name = "Main"
-    if seats.exists() and seats[0].show_time and seats[0].show_time.screen:
-        screen_name = seats[0].show_time.screen.name
+    version, stats = _show_state(ShowTime.objects.filter(pk=show_id).values_list(*SHOW_STATE_FIELDS).first())
+    now = timezone.now().timestamp()
+    binary = _wants_binary_map(request)
+    if _etag_still_valid(request.headers.get('If-None-Match'), show_id, version, now, binary):
+        return _not_modified(request.headers['If-None-Match'])
+
+    if request.GET.get('since'):
+        try:
+            since = int(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'error': 'since must be a seat map version'}, status=400)
+        changes = changes_since(show_id, since, version)
+        if changes is not None:
+            seatmap = get_seatmap(show_id, version)
+            body = seatmap.delta_to_json(since, version, latest_per_seat(changes), now, stats)
+            return _seat_map_response(body, etag=_seat_map_etag(show_id, version, seatmap.next_expiry(now)))
+        # The change log was compacted past `since`: fall through to a full snapshot
+
+    body, next_expiry = get_payload(show_id, version, now, stats, binary)
+    return _seat_map_response(body, etag=_seat_map_etag(show_id, version, next_expiry, binary), binary=binary)
+
+
+async def aseat_list(request):
+    # seat_list for the ASGI server: same responses, DB and cache reads awaited on the event loop
+    show_id = request.GET.get('show_id')
+    if not show_id:
+        show_id = await ShowTime.objects.filter(end_time__gt=timezone.now()).order_by(
+            'start_time').values_list('id', flat=True).afirst()
+        if not show_id:
+            return JsonResponse({'seats': [], 'message': 'No upcoming shows'})
 
-    stats = Seat.objects.filter(show_time_id=show_id).aggregate(
-        available=Count('id', filter=Q(status='AVAILABLE') | Q(status='HELD', hold_expires_at__lt=timezone.now())),
-        held=Count('id', filter=Q(status='HELD', hold_expires_at__gt=timezone.now())),
-        booked=Count('id', filter=Q(status='BOOKED'))
+    version, stats = _show_state(await ShowTime.objects.filter(pk=show_id).values_list(*SHOW_STATE_FIELDS).afirst())
+    now = timezone.now().timestamp()
+    binary = _wants_binary_map(request)
+    if _etag_still_valid(request.headers.get('If-None-Match'), show_id, version, now, binary):
+        return _not_modified(request.headers['If-None-Match'])
+
+    if request.GET.get('since'):
+        try:
+            since = int(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'error': 'since must be a seat map version'}, status=400)
+        changes = await achanges_since(show_id, since, version)
+        if changes is not None:
+            seatmap = await aget_seatmap(show_id, version)
+            body = seatmap.delta_to_json(since, version, latest_per_seat(changes), now, stats)
+            return _seat_map_response(body, etag=_seat_map_etag(show_id, version, seatmap.next_expiry(now)))
+
+    body, next_expiry = await aget_payload(show_id, version, now, stats, binary)
+    return _seat_map_response(body, etag=_seat_map_etag(show_id, version, next_expiry, binary), binary=binary)
+
+
+def _wants_binary_map(request):
+    # Only clients naming the compact format get it: browsers and tools sending */* keep JSON.
+    # Deltas (?since=) are small already and always JSON.
+    if request.GET.get('since'):
+        return False
+    for media_range in request.headers.get('Accept', '').split(','):
+        media_type, *params = media_range.split(';')
+        if media_type.strip() == BINARY_MEDIA_TYPE:
+            # q=0 opts out
+            quality = dict(param.strip().partition('=')[::2] for param in params).get('q', '1')
+            try:
+                return float(quality) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def _seat_map_response(body, etag, binary=False):
+    response = HttpResponse(body, content_type=BINARY_MEDIA_TYPE if binary else 'application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    response['Vary'] = 'Accept'
+    return response
+
+
+def _not_modified(etag):
+    response = HttpResponse(status=304)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    response['Vary'] = 'Accept'
+    return response
+
+
+async def seat_stream(request):
+    show_id = request.GET.get('show_id')
+    if not show_id or not show_id.isdigit():
+        return JsonResponse({'error': 'show_id is required'}, status=400)
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker would be pinned for the lifetime of the connection; clients fall back to polling
+        return JsonResponse({'error': 'Seat streaming requires the ASGI server'}, status=501)
+    try:
+        last_version = int(request.headers.get('Last-Event-ID'))
+    except (TypeError, ValueError):
+        last_version = None
+
+    response = StreamingHttpResponse(events.stream(int(show_id), last_version), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _seat_map_etag(show_id, version, next_expiry, binary=False):
+    # The map only changes on a version bump or when the earliest live hold lapses,
+    # so both go into the tag and an unchanged poll can be answered without the Seat table.
+    # The compact representation gets its own tag.
+    return f'"{show_id}-{version}-{int(next_expiry * 1000)}{"-bin" if binary else ""}"'
+
+
+def _etag_still_valid(if_none_match, show_id, version, now, binary=False):
+    if not if_none_match:
+        return False
+    tag = if_none_match.strip().strip('"')
+    if binary:
+        if not tag.endswith('-bin'):
+            return False
+        tag = tag[:-len('-bin')]
+    try:
+        tag_show, tag_version, tag_expiry = tag.split('-')
+        tag_version, tag_expiry = int(tag_version), int(tag_expiry)
+    except ValueError:
+        return False
+    if tag_show != str(show_id) or tag_version != version:
+        return False
+    return tag_expiry == 0 or now * 1000 < tag_expiry
+
+
+def _save_transition(seat):
+    # An UPDATE like the engine's: Seat.save() would count as an edit made outside
+    # the engine (seatmap.touch) on top of the transition recorded next
+    seat.version += 1
+    Seat.objects.filter(pk=seat.pk).update(
+        status=seat.status, held_by=seat.held_by, hold_expires_at=seat.hold_expires_at, version=seat.version
     )
 
-    data = []
-    for seat in seats:
-        data.append({
-            'id': seat.id,
-            'row': seat.row_id,
-            'number': seat.number,
-            'status': seat.status,
-            'is_held_expired': seat.status == 'HELD' and seat.hold_expires_at and seat.hold_expires_at < timezone.now()
-        })
-    return JsonResponse({
-        'show_id': show_id, 
-        'screen': screen_name, 
-        'stats': stats,
-        'seats': data
-    })
 
 @csrf_exempt
 def hold_seat(request):
@@ -318,8 +594,17 @@ def hold_seat(request):
         
         if not all([show_id, row, number, user_id]):
             return JsonResponse({'error': 'Missing required fields'}, status=400)
+        queued = _queued_response(request, show_id)
+        if queued:
+            return queued
+        if writer.is_hot(show_id):
+            # The writer is the only one allowed to change a single-writer show
+            seats, expires_at = writer.hold_seats(show_id, [{'row': row, 'number': number}], user_id)
+            return JsonResponse({'message': 'Seat held successfully', 'expires_at': expires_at})
             
         with transaction.atomic():
+            # Untouched seats of the screen layout get their row on first hold
+            materialize(show_id, normalize_seats([{'row': row, 'number': number}]))
             # Lock the row for update to handle concurrency
             seat = Seat.objects.select_for_update().filter(show_time_id=show_id, row_id=row, number=number).first()
             
@@ -331,7 +616,8 @@ def hold_seat(request):
                 seat.status = 'HELD'
                 seat.held_by = user_id
                 seat.hold_expires_at = timezone.now() + timedelta(minutes=10) # Hold for 10 mins
-                seat.save()
+                _save_transition(seat)
+                record_transition(seat.show_time_id, [seat], 'HELD', seat.hold_expires_at, previous=['AVAILABLE'])
                 return JsonResponse({'message': 'Seat held successfully', 'expires_at': seat.hold_expires_at})
             
             # Check if seat is already held but expired
@@ -341,7 +627,8 @@ def hold_seat(request):
                     seat.status = 'HELD'
                     seat.held_by = user_id
                     seat.hold_expires_at = timezone.now() + timedelta(minutes=10)
-                    seat.save()
+                    _save_transition(seat)
+                    record_transition(seat.show_time_id, [seat], 'HELD', seat.hold_expires_at, previous=['HELD'])
                     return JsonResponse({'message': 'Seat held successfully (previous hold expired)', 'expires_at': seat.hold_expires_at})
                 
                 return JsonResponse({'error': 'Seat is currently held by someone else'}, status=409)
@@ -351,11 +638,29 @@ def hold_seat(request):
 
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except SeatConflict as e:
+        return _conflict_response(e, status=409)
+    except TimeoutError:
+        return JsonResponse({'error': 'The show is busy, please try again'}, status=503)
     except Exception as e:
          return JsonResponse({'error': str(e)}, status=500)
          
     return JsonResponse({'error': 'Unknown error'}, status=500)
 
+def _booked_response(show_id, seat, username):
+    # As for a batch booking: free the waiting-room slot and hand out the gate ticket
+    waiting_room.leave(show_id, username)
+    return JsonResponse({
+        'message': 'Seat booked successfully',
+        'ticket': {
+            'id': seat['id'],
+            'seat': f"{seat['row_id']}{seat['number']}",
+            'token': tickets.issue(
+                seat['id'], int(show_id), seat['row_id'], seat['number'], seat['price'], username
+            ),
+        },
+    })
+
 @csrf_exempt
 def book_seat(request):
     if not request.user.is_authenticated:
@@ -373,11 +678,17 @@ def book_seat(request):
         
         if not all([show_id, row, number, user_id]):
             return JsonResponse({'error': 'Missing required fields'}, status=400)
+        if writer.is_hot(show_id):
+            (seat,), _ = writer.book_seats(show_id, [{'row': row, 'number': number}], user_id)
+            return _booked_response(show_id, seat, user_id)
             
         with transaction.atomic():
             seat = Seat.objects.select_for_update().filter(show_time_id=show_id, row_id=row, number=number).first()
             
             if not seat:
+                key = normalize_seats([{'row': row, 'number': number}])[0]
+                if in_layout(show_layout(show_id), key):
+                    return JsonResponse({'error': 'You must hold the seat before booking'}, status=400)
                 return JsonResponse({'error': 'Seat not found'}, status=404)
                 
             if seat.status == 'BOOKED':
@@ -393,14 +704,22 @@ def book_seat(request):
                 seat.status = 'BOOKED'
                 seat.held_by = user_id # Keep track of who booked it
                 seat.hold_expires_at = None
-                seat.save()
-                return JsonResponse({'message': 'Seat booked successfully'})
+                _save_transition(seat)
+                record_transition(seat.show_time_id, [seat], 'BOOKED', previous=['HELD'])
+                price = ShowTime.objects.values_list('base_price', flat=True).get(pk=show_id)
+                return _booked_response(
+                    show_id, {'id': seat.id, 'row_id': seat.row_id, 'number': seat.number, 'price': price}, user_id
+                )
             
             if seat.status == 'AVAILABLE':
                 return JsonResponse({'error': 'You must hold the seat before booking'}, status=400)
 
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except SeatConflict as e:
+        return _conflict_response(e, status=409)
+    except TimeoutError:
+        return JsonResponse({'error': 'The show is busy, please try again'}, status=503)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -0,0 +1,206 @@
+import itertools
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Clients allowed to pick seats for one show at the same time
+CAPACITY = getattr(settings, 'WAITING_ROOM_CAPACITY', 500)
+# Queued clients let in per second once the show is at capacity
+ADMIT_RATE = getattr(settings, 'WAITING_ROOM_ADMIT_RATE', 10.0)
+# An admitted client that makes no seat request for this long gives up its slot
+ADMITTED_IDLE = getattr(settings, 'WAITING_ROOM_ADMITTED_IDLE', 120.0)
+# A queued client that stops polling for this long loses its place
+QUEUED_IDLE = getattr(settings, 'WAITING_ROOM_QUEUED_IDLE', 30.0)
+
+
+class Ticket:
+    __slots__ = ('token', 'username', 'seq', 'last_seen')
+
+    def __init__(self, token, username, seq, now):
+        self.token = token
+        self.username = username
+        self.seq = seq
+        self.last_seen = now
+
+
+class Room:
+    """Admission state of one show, kept in this process.
+
+    Up to CAPACITY clients are admitted at once. Everyone else waits in FIFO
+    order and is let in at ADMIT_RATE per second (token bucket) as slots free up,
+    so the show's write load stays steady however many clients arrive. A slot
+    freed for a queued client is reserved for their ticket: they take it by
+    presenting its token, or lose it after QUEUED_IDLE.
+    """
+
+    def __init__(self, now):
+        self.admitted = OrderedDict()  # username -> last request, oldest first
+        self.queue = OrderedDict()  # token -> Ticket, in arrival order
+        self.ready = OrderedDict()  # token -> Ticket let out of the queue, oldest first
+        self.by_user = {}  # username -> token, queued or ready
+        self.seq = itertools.count(1)
+        self.tokens = ADMIT_RATE
+        self.refilled_at = now
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.abandoned_total = 0
+        self.last_seen = now
+
+    def _expire(self, now):
+        while self.admitted:
+            username, last_seen = next(iter(self.admitted.items()))
+            if now - last_seen < ADMITTED_IDLE:
+                break
+            del self.admitted[username]
+        while self.ready:
+            ticket = next(iter(self.ready.values()))
+            if now - ticket.last_seen < QUEUED_IDLE:
+                break
+            self._drop(self.ready, ticket)
+
+    def _drop(self, tickets, ticket):
+        del tickets[ticket.token]
+        del self.by_user[ticket.username]
+        self.abandoned_total += 1
+
+    def _occupied(self):
+        return len(self.admitted) + len(self.ready)
+
+    def _admit(self, username, now):
+        self.admitted[username] = now
+        self.admitted.move_to_end(username)
+        self.admitted_total += 1
+
+    def _admit_from_queue(self, now):
+        self.tokens = min(ADMIT_RATE, self.tokens + (now - self.refilled_at) * ADMIT_RATE)
+        self.refilled_at = now
+        while self.queue and self._occupied() < CAPACITY and self.tokens >= 1:
+            ticket = next(iter(self.queue.values()))
+            if now - ticket.last_seen >= QUEUED_IDLE:
+                self._drop(self.queue, ticket)
+                continue
+            del self.queue[ticket.token]
+            self.tokens -= 1
+            # The reservation times out from here, not from the client's last poll
+            ticket.last_seen = now
+            self.ready[ticket.token] = ticket
+
+    def check(self, username, token, now):
+        """Admit `username` or keep them queued. Returns None if admitted, else their Ticket.
+
+        A client with a ticket is only admitted, and only keeps their place, when
+        `token` is that ticket's token.
+        """
+        self.last_seen = now
+        self._expire(now)
+        if username in self.admitted:
+            self.admitted[username] = now
+            self.admitted.move_to_end(username)
+            return None
+        self._admit_from_queue(now)
+        held = self.by_user.get(username)
+        if held is None:
+            if not self.queue and self._occupied() < CAPACITY:
+                self._admit(username, now)
+                return None
+            held = secrets.token_urlsafe(12)
+            self.queue[held] = Ticket(held, username, next(self.seq), now)
+            self.by_user[username] = held
+            self.queued_total += 1
+            return self.queue[held]
+        ticket = self.ready.get(held) or self.queue[held]
+        if not secrets.compare_digest(token or '', held):
+            return ticket
+        if held in self.ready:
+            del self.ready[held]
+            del self.by_user[username]
+            self._admit(username, now)
+            return None
+        ticket.last_seen = now
+        return ticket
+
+    def position(self, ticket):
+        # 0 once a slot is reserved for the ticket. Otherwise places ahead by arrival
+        # number; abandoned tickets still ahead make it an upper bound
+        if ticket.token in self.ready:
+            return 0
+        head = next(iter(self.queue.values()))
+        return ticket.seq - head.seq + 1
+
+    def idle(self, now):
+        # Every admission and reservation has lapsed by then; queued tickets too
+        return now - self.last_seen >= max(ADMITTED_IDLE, QUEUED_IDLE)
+
+    def leave(self, username):
+        self.admitted.pop(username, None)
+
+    def metrics(self):
+        return {
+            'admitted': len(self.admitted),
+            'queued': len(self.queue) + len(self.ready),
+            'admitted_total': self.admitted_total,
+            'queued_total': self.queued_total,
+            'abandoned_total': self.abandoned_total,
+        }
+
+
+_rooms = {}
+_lock = threading.Lock()
+_swept_at = 0.0
+
+
+def _sweep(now):
+    # Drop rooms of shows nobody has asked about for a while, at most once per QUEUED_IDLE
+    global _swept_at
+    if now - _swept_at < QUEUED_IDLE:
+        return
+    _swept_at = now
+    for show_id in [show_id for show_id, room in _rooms.items() if room.idle(now)]:
+        del _rooms[show_id]
+
+
+def check(show_id, username, token=None, now=None):
+    """Gate a seat-selection request. Returns None when admitted, else a dict with the
+    queue token, position and suggested retry delay in seconds.
+
+    Queued clients retry with `token`, the queue token they were given.
+    """
+    now = time.monotonic() if now is None else now
+    with _lock:
+        _sweep(now)
+        room = _rooms.get(int(show_id))
+        if room is None:
+            room = _rooms[int(show_id)] = Room(now)
+        ticket = room.check(username, token, now)
+        if ticket is None:
+            return None
+        position = room.position(ticket)
+    return {
+        'queue_token': ticket.token,
+        'position': position,
+        'retry_after': max(1, round(position / ADMIT_RATE)),
+    }
+
+
+def leave(show_id, username):
+    """Free an admitted client's slot early, e.g. once they have booked."""
+    with _lock:
+        room = _rooms.get(int(show_id))
+        if room is not None:
+            room.leave(username)
+
+
+def metrics():
+    """Admitted/queued counts per show, plus running totals."""
+    with _lock:
+        return {show_id: room.metrics() for show_id, room in _rooms.items()}
+
+
+def reset():
+    global _swept_at
+    with _lock:
+        _rooms.clear()
+        _swept_at = 0.0
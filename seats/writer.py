@@ -0,0 +1,296 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import engine
+from .engine import HOLD_DURATION, SEAT_FIELDS, SeatConflict, seat_label
+from .models import Seat, ShowTime, layout_rows
+
+# Commands applied and committed together at most
+MAX_BATCH = getattr(settings, 'SEAT_WRITER_MAX_BATCH', 200)
+# How long a request waits for its command before giving up
+RESULT_TIMEOUT = getattr(settings, 'SEAT_WRITER_TIMEOUT', 10.0)
+# A writer thread with nothing to do for this long goes away
+IDLE_TIMEOUT = 60.0
+# How often the set of single-writer shows is re-read
+HOT_REFRESH = 5.0
+
+_writers = {}
+_lock = threading.Lock()
+_hot = {'ids': frozenset(), 'loaded_at': None}
+
+
+class Command:
+    __slots__ = ('kind', 'keys', 'username', 'future')
+
+    def __init__(self, kind, keys, username):
+        self.kind = kind
+        self.keys = keys
+        self.username = username
+        self.future = Future()
+
+
+class ShowWriter:
+    """Applies the seat commands of one show in arrival order, on one thread.
+
+    Commands are checked against an in-memory copy of the show's seats, so a
+    request never waits on a row lock, and every batch drained from the queue is
+    persisted in one transaction (group commit). The database stays the final
+    judge: each command's UPDATE keeps the same status/holder predicates as the
+    engine, so a write made elsewhere (another process, the expiry worker) makes
+    that command fail instead of being overwritten, and the copy is reloaded.
+    """
+
+    def __init__(self, show_id):
+        self.show_id = show_id
+        self.queue = queue.Queue()
+        self.seats = {}
+        self.layout = {}
+        self.base_price = None
+        self.version = None
+        self.loaded = False
+
+    def load(self):
+        show = ShowTime.objects.values('base_price', 'seat_version', 'screen__layout').get(pk=self.show_id)
+        self.layout = layout_rows(show['screen__layout'])
+        self.base_price = Decimal(str(show['base_price']))
+        self.version = show['seat_version']
+        self.seats = {
+            (s['row_id'], s['number']): s
+            for s in Seat.objects.filter(show_time_id=self.show_id).values(*SEAT_FIELDS)
+        }
+        self.loaded = True
+
+    def seat(self, key):
+        seat = self.seats.get(key)
+        if seat is None and engine.in_layout(self.layout, key):
+            seat = {'id': None, 'row_id': key[0], 'number': key[1], 'status': 'AVAILABLE',
+                    'held_by': None, 'hold_expires_at': None, 'version': 0}
+            self.seats[key] = seat
+        return seat
+
+    def plan(self, command, now):
+        """Check a command against the in-memory seats and apply it there.
+
+        Returns the seats, the new hold expiry and the seats' previous statuses.
+        Raises SeatConflict.
+        """
+        username = command.username
+        if command.kind == 'release':
+            seats = [self.seats[k] for k in command.keys
+                     if k in self.seats and self.seats[k]['status'] == 'HELD'
+                     and self.seats[k]['held_by'] == username]
+            for seat in seats:
+                seat.update(status='AVAILABLE', held_by=None, hold_expires_at=None)
+            return seats, None, ['HELD'] * len(seats)
+
+        found = {}
+        for key in command.keys:
+            seat = self.seat(key)
+            if seat is not None:
+                found[key] = seat
+
+        if command.kind == 'hold':
+            def check(key, seat):
+                if not engine._is_holdable(seat, username, now):
+                    return f"Seat {seat_label(key)} is already taken by someone else"
+        else:
+            def check(key, seat):
+                if seat['status'] != 'HELD' or seat['held_by'] != username:
+                    return f"Seat {seat_label(key)} is not held by you"
+                if seat['hold_expires_at'] and seat['hold_expires_at'] < now:
+                    return f"Hold for seat {seat_label(key)} has expired"
+
+        engine._raise_first(self.show_id, command.keys, found, check)
+        seats = [found[key] for key in command.keys]
+        previous = [seat['status'] for seat in seats]
+        if command.kind == 'hold':
+            expires_at = now + HOLD_DURATION
+            for seat in seats:
+                seat.update(status='HELD', held_by=username, hold_expires_at=expires_at)
+            return seats, expires_at, previous
+        for seat in seats:
+            seat.update(status='BOOKED', hold_expires_at=None)
+        return seats, None, previous
+
+    def persist(self, command, seats, expires_at, previous, now):
+        """Write one planned command; raises SeatConflict if the database disagrees."""
+        if not seats:
+            return
+        username = command.username
+        ids = [s['id'] for s in seats]
+        rows = Seat.objects.filter(id__in=ids)
+        if command.kind == 'hold':
+            rows = rows.filter(engine.holdable_q(username, now))
+            changes = {'status': 'HELD', 'held_by': username, 'hold_expires_at': expires_at}
+        elif command.kind == 'book':
+            rows = rows.filter(status='HELD', held_by=username).filter(
+                Q(hold_expires_at__isnull=True) | Q(hold_expires_at__gte=now))
+            changes = {'status': 'BOOKED', 'hold_expires_at': None}
+        else:
+            rows = rows.filter(status='HELD', held_by=username)
+            changes = {'status': 'AVAILABLE', 'held_by': None, 'hold_expires_at': None}
+        if rows.update(version=F('version') + 1, **changes) != len(ids):
+            labels = [seat_label(key) for key in command.keys]
+            raise SeatConflict(f"Seat {labels[0]} was changed by another request", labels)
+        self.version = engine.record_transition(
+            self.show_id, seats, changes['status'], changes['hold_expires_at'], previous=previous)
+
+    def materialize(self, planned):
+        # Layout seats touched for the first time in this batch get their rows in one INSERT
+        keys = [(s['row_id'], s['number']) for _, seats, _, _ in planned for s in seats if s['id'] is None]
+        if not keys:
+            return
+        engine.materialize(self.show_id, keys)
+        for row in Seat.objects.filter(show_time_id=self.show_id).filter(engine.seats_q(keys)).values('id', 'row_id', 'number'):
+            self.seats[(row['row_id'], row['number'])]['id'] = row['id']
+
+    def process(self, batch):
+        """Plan every command of a batch in order, then commit them all at once."""
+        # Drop the commands whose request gave up waiting; the others can no longer be withdrawn
+        batch = [command for command in batch if command.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        close_old_connections()
+        try:
+            # Anything written outside this writer (expiry, other processes) bumped the version
+            if not self.loaded or self.version != ShowTime.objects.values_list(
+                    'seat_version', flat=True).get(pk=self.show_id):
+                self.load()
+            now = timezone.now()
+            planned = []
+            for command in batch:
+                try:
+                    seats, expires_at, previous = self.plan(command, now)
+                except SeatConflict as exc:
+                    command.future.set_exception(exc)
+                    continue
+                # Freeze what the command saw; later commands keep mutating the same dicts
+                planned.append((command, [dict(s) for s in seats], expires_at, previous))
+
+            outcomes = []
+            with transaction.atomic():
+                self.materialize(planned)
+                for command, seats, expires_at, previous in planned:
+                    for seat in seats:
+                        seat['id'] = self.seats[(seat['row_id'], seat['number'])]['id']
+                    try:
+                        with transaction.atomic():
+                            self.persist(command, seats, expires_at, previous, now)
+                    except SeatConflict as exc:
+                        # Our copy was out of date; read the seats again after this batch
+                        self.loaded = False
+                        outcomes.append((command, exc))
+                        continue
+                    outcomes.append((command, self.result(command, seats, expires_at)))
+        except Exception as exc:
+            self.loaded = False
+            for command in batch:
+                if not command.future.done():
+                    command.future.set_exception(exc)
+            return
+
+        # Only answer once the batch is durable
+        for command, outcome in outcomes:
+            if isinstance(outcome, Exception):
+                command.future.set_exception(outcome)
+            else:
+                command.future.set_result(outcome)
+
+    def result(self, command, seats, expires_at):
+        if command.kind == 'hold':
+            return seats, expires_at
+        if command.kind == 'book':
+            for seat in seats:
+                seat['price'] = self.base_price
+            return seats, self.base_price * len(seats)
+        return len(seats)
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    first = self.queue.get(timeout=IDLE_TIMEOUT)
+                except queue.Empty:
+                    with _lock:
+                        if self.queue.empty():
+                            _writers.pop(self.show_id, None)
+                            return
+                    continue
+                batch = [first]
+                while len(batch) < MAX_BATCH:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                self.process(batch)
+        finally:
+            connection.close()
+
+
+def submit(show_id, kind, seats_data, username):
+    """Queue a 'hold', 'book' or 'release' command for a show and return its Future."""
+    show_id = int(show_id)
+    command = Command(kind, engine.normalize_seats(seats_data), username)
+    with _lock:
+        # Enqueue under the lock so an idle writer cannot exit in between
+        writer = _writers.get(show_id)
+        if writer is None:
+            writer = _writers[show_id] = ShowWriter(show_id)
+            threading.Thread(target=writer.run, name=f'seat-writer-{show_id}', daemon=True).start()
+        writer.queue.put(command)
+    return command.future
+
+
+def wait(future):
+    """The outcome of a submitted command.
+
+    A command the writer has not started within RESULT_TIMEOUT is withdrawn and
+    TimeoutError raised, so telling the client to retry is safe. A command already
+    being applied is waited for instead: it goes through, and the client must know.
+    """
+    try:
+        return future.result(RESULT_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            raise
+        return future.result()
+
+
+def hold_seats(show_id, seats_data, username):
+    return wait(submit(show_id, 'hold', seats_data, username))
+
+
+def book_seats(show_id, seats_data, username):
+    return wait(submit(show_id, 'book', seats_data, username))
+
+
+def release_seats(show_id, seats_data, username):
+    return wait(submit(show_id, 'release', seats_data, username))
+
+
+def is_hot(show_id):
+    """Whether a show's seat commands go through its single writer. No query on most calls."""
+    loaded_at = _hot['loaded_at']
+    if loaded_at is None or time.monotonic() - loaded_at > HOT_REFRESH:
+        _hot['ids'] = frozenset(ShowTime.objects.filter(single_writer=True).values_list('id', flat=True))
+        _hot['loaded_at'] = time.monotonic()
+    try:
+        return int(show_id) in _hot['ids']
+    except (TypeError, ValueError):
+        return False
+
+
+@receiver(post_save, sender=ShowTime)
+@receiver(post_delete, sender=ShowTime)
+def hot_shows_changed(sender, **kwargs):
+    _hot['loaded_at'] = None
@@ -13,4 +13,9 @@ echo "🌱 Seeding Data..."
 python manage.py seed_data
 
 echo "🔥 Starting Server on port $PORT..."
-gunicorn seat_booking.wsgi:application --bind 0.0.0.0:$PORT
+if [ "$SERVER_MODE" = "asgi" ]; then
+    # Event loop workers: async read endpoints and seat streams without a thread per connection
+    uvicorn seat_booking.asgi:application --host 0.0.0.0 --port $PORT --workers ${WEB_CONCURRENCY:-2}
+else
+    gunicorn seat_booking.wsgi:application --bind 0.0.0.0:$PORT
+fi
@@ -2,6 +2,7 @@ const API_BASE = '/api/seats';
 let currentShowId = null;
 let currentShowPrice = 0;
 let selectedSeats = [];
+let queueTokens = {}; // show id -> waiting room token
 
 let allShows = [];
 
@@ -93,12 +94,53 @@ async function selectShow(showId) {
 
     addLog(`Switched to: ${show.movie}`, 'accent-primary');
     await loadSeats();
+    startLiveUpdates();
+}
+
+// Compact seat map (see SeatMap.to_binary): a 4-byte length, a JSON layout descriptor,
+// then 2-bit seat statuses, packed or run-length encoded
+const SEAT_MAP_TYPE = 'application/vnd.seatmap';
+const SEAT_STATUSES = ['AVAILABLE', 'HELD', 'BOOKED'];
+
+function decodeSeatMap(buffer) {
+    const headerLength = new DataView(buffer).getUint32(0);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    const body = new Uint8Array(buffer, 4 + headerLength);
+
+    const codes = new Uint8Array(header.count);
+    if (header.encoding === 'rle') {
+        let i = 0;
+        body.forEach(byte => {
+            const length = (byte & 63) + 1;
+            codes.fill(byte >> 6, i, i + length);
+            i += length;
+        });
+    } else {
+        for (let i = 0; i < header.count; i++) codes[i] = (body[i >> 2] >> ((i & 3) * 2)) & 3;
+    }
+
+    const seats = [];
+    let i = 0;
+    header.rows.forEach(([row, runs]) => {
+        runs.forEach(([first, last]) => {
+            for (let number = first; number <= last; number++) {
+                seats.push({ row, number, status: SEAT_STATUSES[codes[i++]] });
+            }
+        });
+    });
+    return { ...header, seats };
 }
 
 async function loadSeats() {
     try {
-        const response = await fetch(`${API_BASE}/?show_id=${currentShowId}`);
-        const data = await response.json();
+        // 'no-cache' makes the browser revalidate with If-None-Match, so unchanged maps come back as 304
+        const response = await fetch(`${API_BASE}/?show_id=${currentShowId}`, {
+            cache: 'no-cache',
+            headers: { Accept: `${SEAT_MAP_TYPE}, application/json;q=0.9` }
+        });
+        const data = (response.headers.get('Content-Type') || '').startsWith(SEAT_MAP_TYPE)
+            ? decodeSeatMap(await response.arrayBuffer())
+            : await response.json();
 
         renderStats(data.stats);
         renderSeats(data.seats);
@@ -107,6 +149,58 @@ async function loadSeats() {
     }
 }
 
+// Live updates: prefer the server-sent seat stream, fall back to polling every 5 seconds
+let seatStream = null;
+let pollTimer = null;
+
+function stopLiveUpdates() {
+    if (seatStream) seatStream.close();
+    if (pollTimer) clearInterval(pollTimer);
+    seatStream = null;
+    pollTimer = null;
+}
+
+function startPolling() {
+    stopLiveUpdates();
+    pollTimer = setInterval(loadSeats, 5000);
+}
+
+function startLiveUpdates() {
+    stopLiveUpdates();
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    seatStream = new EventSource(`${API_BASE}/stream/?show_id=${currentShowId}`);
+    ['held', 'released', 'booked', 'expired'].forEach(type => {
+        seatStream.addEventListener(type, e => applySeatEvent(JSON.parse(e.data)));
+    });
+    // The server lost track of some changes (or we reconnected): reload the whole map
+    seatStream.addEventListener('resync', () => loadSeats());
+    seatStream.onerror = () => {
+        // CLOSED means the server refused the stream (e.g. no ASGI server); transient drops reconnect on their own
+        if (seatStream && seatStream.readyState === EventSource.CLOSED) startPolling();
+    };
+}
+
+function applySeatEvent(event) {
+    const grid = document.getElementById('seat-grid');
+    event.seats.forEach(seat => {
+        const seatEl = grid.querySelector(`.seat[data-row="${seat.row}"][data-number="${seat.number}"]`);
+        if (!seatEl) return;
+        const selected = seatEl.classList.contains('selected') && event.status !== 'BOOKED';
+        seatEl.className = `seat ${event.status.toLowerCase()}`;
+        if (selected) seatEl.classList.add('selected');
+    });
+
+    renderStats({
+        available: grid.querySelectorAll('.seat.available').length,
+        held: grid.querySelectorAll('.seat.held').length,
+        booked: grid.querySelectorAll('.seat.booked').length
+    });
+}
+
 function renderStats(stats) {
     document.getElementById('stats-available').textContent = stats.available;
     document.getElementById('stats-held').textContent = stats.held;
@@ -239,7 +333,8 @@ async function handleHold() {
         addLog(`Requesting hold for ${selectedSeats.length} seats...`, 'status-held');
         const holdRes = await fetch(`${API_BASE}/hold-batch/`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
+            // A queued client is only let in while presenting its queue token
+            headers: { 'Content-Type': 'application/json', 'X-Queue-Token': queueTokens[currentShowId] || '' },
             body: JSON.stringify({
                 show_id: currentShowId,
                 seats: selectedSeats.map(s => ({ row: s.row, number: s.number }))
@@ -247,6 +342,11 @@ async function handleHold() {
         });
 
         const holdData = await holdRes.json();
+        if (holdRes.status === 429) {
+            // Waiting room: the show is at capacity, try again once our turn comes
+            queueTokens[currentShowId] = holdData.queue_token;
+            throw new Error(`Show is busy: you are #${holdData.position} in the queue, please retry in ${holdData.retry_after}s`);
+        }
         if (holdData.error) throw new Error(holdData.error);
 
         addLog(`Successfully held! Use 'Confirm Booking' to finalize.`, 'status-held');
@@ -357,7 +457,4 @@ function toggleSeatSelection(el, seat) {
 document.getElementById('btn-hold').onclick = handleHold;
 document.getElementById('btn-book').onclick = handleBook;
 
-// Automatic polling every 5 seconds
-setInterval(loadSeats, 5000);
-
 init();